@@ -1,28 +1,36 @@
+import datetime
 from functools import wraps
 import os
+from pathlib import Path
 import shutil
+import uuid
 from flask import Blueprint, current_app, request, jsonify, send_file
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
+from sqlalchemy import or_
 from sqlalchemy.exc import SQLAlchemyError
+from auth import current_user_is_admin, user_cache
 from database import db
-from models import ProofreadPrompt, SystemSetting, TranscribePrompt, User, Transcription, ErrorLog
+from drive_downloader import remove_partial_downloads
+from models import (ProofreadPrompt, StatsCounter, StatsJobBucket, StatsStatusCount, StatsStatusDuration,
+                    SystemSetting, TranscribePrompt, User, Transcription, ErrorLog)
+from export_service import EXPORT_FORMATS, ExportService
+from pagination import filter_transcriptions, load_fields, paginate_transcriptions, requested_fields
+from pipeline import is_valid_checkpoint, resume_transcription
+from stats import summarize_durations
 from werkzeug.security import generate_password_hash
 
 admin = Blueprint('admin', __name__)
 
-
-def is_admin(username):
-    user = User.query.filter_by(username=username).first()
-    if user:
-        return user.is_admin
-    return False
+# Columns each field of the transcription listing is built from; the username comes from a join
+TRANSCRIPTION_FIELD_COLUMNS = {field: [getattr(Transcription, field)] if field != 'username' else []
+                               for field in Transcription.DICT_FIELDS}
 
 
 def require_admin(func):
     @wraps(func)  # Keeps the original function metadata
     def wrapper(*args, **kwargs):
-        current_user = get_jwt_identity()
-        if not is_admin(current_user):
+        # From the token's claims; revoked admin rights are rejected when the token is verified
+        if not current_user_is_admin():
             return jsonify({"error": "Admin access required"}), 403
         # Call the actual function only if authorized
         return func(*args, **kwargs)
@@ -33,8 +41,14 @@ def require_admin(func):
 @jwt_required()
 @require_admin
 def get_users():
-    users = User.query.all()
-    return jsonify([user.to_dict() for user in users]), 200
+    # One grouped count for all users instead of loading every user's transcriptions
+    transcription_counts = db.session.query(
+        Transcription.user_id, db.func.count(Transcription.id).label('transcription_count')
+    ).filter(Transcription.parent_id.is_(None)).group_by(Transcription.user_id).subquery()
+    users = db.session.query(User, db.func.coalesce(transcription_counts.c.transcription_count, 0)).outerjoin(
+        transcription_counts, transcription_counts.c.user_id == User.id).all()
+    return jsonify([user.to_dict(transcription_count=transcription_count)
+                    for user, transcription_count in users]), 200
 
 
 @admin.route('/users', methods=['POST'])
@@ -89,14 +103,20 @@ def delete_user(user_id):
             os.path.join(current_app.config['MD_FOLDER'], user.username),
             os.path.join(current_app.config['WORD_FOLDER'], user.username)
         ]
+        audio_folder = os.path.join(
+            current_app.config['AUDIO_FOLDER'], user.username)
 
         # Commit database changes first
         db.session.commit()
+        # Reject the deleted user's tokens right away in this process, other processes within the cache TTL
+        user_cache.forget(user.username)
 
         # Then handle file system operations
         for folder in user_folders:
             if os.path.exists(folder):
                 shutil.rmtree(folder)
+        # Audio is kept, but not the partial files of downloads that will never finish
+        remove_partial_downloads(audio_folder)
         return jsonify({"message": "User and all associated data deleted successfully"}), 200
 
     except OSError as e:
@@ -116,8 +136,12 @@ def delete_transcription(transcription_id):
         return jsonify({"error": "Transcription not found"}), 404
 
     try:
-        # Delete associated records from related tables
-        ErrorLog.query.filter_by(transcription_id=transcription_id).delete()
+        # Delete associated records from related tables, including those of the segments that
+        # cascade with the transcription
+        ErrorLog.query.filter(ErrorLog.transcription_id.in_(
+            db.session.query(Transcription.id).filter(or_(Transcription.id == transcription_id,
+                                                          Transcription.parent_id == transcription_id))
+        )).delete(synchronize_session=False)
 
         # Delete the user
         db.session.delete(transcription)
@@ -129,6 +153,8 @@ def delete_transcription(transcription_id):
             os.path.join(current_app.config['MD_FOLDER'], transcription.user.username, transcription_id),
             os.path.join(current_app.config['WORD_FOLDER'], transcription.user.username, transcription_id)
         ]
+        audio_folder = os.path.join(
+            current_app.config['AUDIO_FOLDER'], transcription.user.username, transcription_id)
 
         # Commit database changes first
         db.session.commit()
@@ -137,6 +163,8 @@ def delete_transcription(transcription_id):
         for folder in transcription_folders:
             if os.path.exists(folder):
                 shutil.rmtree(folder)
+        # Audio is kept, but not the partial files of a download that will never finish
+        remove_partial_downloads(audio_folder)
         return jsonify({"message": "Transcription and all associated data deleted successfully"}), 200
 
     except OSError as e:
@@ -147,6 +175,29 @@ def delete_transcription(transcription_id):
         return jsonify({"error": f"""Database error: {str(e)}"""}), 500
 
 
+@admin.route('/transcriptions/<string:transcription_id>/resume', methods=['POST'])
+@jwt_required()
+@require_admin
+def resume_failed_transcription(transcription_id):
+    transcription: Transcription = Transcription.query.get(transcription_id)
+    if not transcription:
+        return jsonify({"error": "Transcription not found"}), 404
+
+    if transcription.status != 'error':
+        return jsonify({"error": "Only failed transcriptions can be resumed"}), 409
+
+    try:
+        stage = resume_transcription(transcription)
+        return jsonify({
+            "message": f"Transcription resumed from the {stage} stage" if stage else "Transcription is already complete",
+            "stage": stage,
+            "status": transcription.status
+        }), 200
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({"error": f"""Database error: {str(e)}"""}), 500
+
+
 @admin.route('/logs', methods=['GET'])
 @jwt_required()
 @require_admin
@@ -159,9 +210,61 @@ def get_logs():
 @jwt_required()
 @require_admin
 def get_all_transcriptions():
-    transcriptions = Transcription.query.order_by(
-        Transcription.created_at.desc()).limit(100).all()
-    return jsonify([transcription.to_dict() for transcription in transcriptions]), 200
+    # The username comes from a join, so serializing a page does not load each user
+    query = db.session.query(Transcription, User.username).outerjoin(
+        User, Transcription.user_id == User.id).filter(Transcription.parent_id.is_(None))
+    if request.args.get('user_id'):
+        if not request.args['user_id'].isdigit():
+            return jsonify({"error": "Invalid user ID"}), 400
+        query = query.filter(Transcription.user_id == int(request.args['user_id']))
+    if request.args.get('username'):
+        query = query.filter(User.username == request.args['username'])
+
+    try:
+        fields = requested_fields(request.args, TRANSCRIPTION_FIELD_COLUMNS)
+        transcriptions, next_cursor = paginate_transcriptions(load_fields(
+            filter_transcriptions(query, request.args), fields, TRANSCRIPTION_FIELD_COLUMNS), request.args)
+        items = [transcription.to_dict(username=username, fields=fields)
+                 for transcription, username in transcriptions]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response = jsonify(items)
+    # Empty on the last page
+    response.headers['X-Next-Cursor'] = next_cursor or ''
+    return response, 200
+
+
+@admin.route('/transcriptions/convert', methods=['POST'])
+@jwt_required()
+@require_admin
+def convert_transcriptions():
+    """Pre-render an export format for many transcriptions in one pandoc batch"""
+    transcription_ids = (request.json or {}).get('transcription_ids') or []
+    file_type = (request.json or {}).get('format') or 'docx'
+    if not transcription_ids:
+        return jsonify({"error": "Transcription IDs are required"}), 400
+    if file_type not in EXPORT_FORMATS:
+        return jsonify({"error": "Invalid export format"}), 400
+    try:
+        transcription_ids = [str(uuid.UUID(str(transcription_id)))
+                             for transcription_id in transcription_ids]
+    except ValueError:
+        return jsonify({"error": "Invalid transcription ID"}), 400
+
+    export_service = ExportService()
+    transcriptions = [transcription for transcription in Transcription.query.filter(
+        Transcription.id.in_(transcription_ids)).all()
+        if is_valid_checkpoint(export_service.source_path(transcription, file_type))]
+    results = export_service.export_many(transcriptions, file_type)
+
+    converted = {}
+    for transcription, (_, _, error) in zip(transcriptions, results):
+        converted[str(transcription.id)] = error or "converted"
+    db.session.commit()
+
+    return jsonify({transcription_id: converted.get(transcription_id, "No source document to convert")
+                    for transcription_id in transcription_ids}), 200
 
 
 @admin.route('/transcribe-prompts', methods=['GET'])
@@ -399,14 +502,38 @@ def delete_setting(setting_id):
 @jwt_required()
 @require_admin
 def get_stats():
-    total_users = User.query.count()
-    total_transcriptions = Transcription.query.count()
-    total_errors = ErrorLog.query.count()
+    # Summary tables are kept up to date by database triggers, so nothing here scans the history.
+    # They hold delta rows until the worker folds them, hence the sums.
+    counters = dict(db.session.query(StatsCounter.name, db.func.sum(StatsCounter.value)).group_by(
+        StatsCounter.name).all())
+    status_counts = db.session.query(StatsStatusCount.status, db.func.sum(StatsStatusCount.count)).group_by(
+        StatsStatusCount.status).order_by(StatsStatusCount.status).all()
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    def job_buckets(granularity: str, since: datetime.datetime) -> list[dict]:
+        return [{
+            'bucket_start': bucket_start.isoformat(),
+            'job_type': job_type,
+            'created': int(created),
+            'done': int(done),
+            'failed': int(failed)
+        } for bucket_start, job_type, created, done, failed in db.session.query(
+            StatsJobBucket.bucket_start, StatsJobBucket.job_type, db.func.sum(StatsJobBucket.created),
+            db.func.sum(StatsJobBucket.done), db.func.sum(StatsJobBucket.failed)).filter(
+            StatsJobBucket.granularity == granularity, StatsJobBucket.bucket_start >= since).group_by(
+            StatsJobBucket.bucket_start, StatsJobBucket.job_type).order_by(
+            StatsJobBucket.bucket_start, StatsJobBucket.job_type)]
 
     return jsonify({
-        "total_users": total_users,
-        "total_transcriptions": total_transcriptions,
-        "total_errors": total_errors
+        "total_users": int(counters.get('users', 0)),
+        "total_transcriptions": int(counters.get('transcriptions', 0)),
+        "total_errors": int(counters.get('error_logs', 0)),
+        "status_counts": {status: int(count) for status, count in status_counts if count},
+        "jobs_per_hour": job_buckets('hour', now - datetime.timedelta(hours=48)),
+        "jobs_per_day": job_buckets('day', now - datetime.timedelta(days=30)),
+        "status_durations": summarize_durations(db.session.query(
+            StatsStatusDuration.status, StatsStatusDuration.bucket, db.func.sum(StatsStatusDuration.count)).group_by(
+            StatsStatusDuration.status, StatsStatusDuration.bucket).all())
     }), 200
 
 @admin.route('/download/<file_type>/<transcription_id>', methods=['GET'])
@@ -417,20 +544,32 @@ def download_file(file_type, transcription_id):
     if not transcription:
         return jsonify({"error": "Transcription not found"}), 404
     
+    if file_type in EXPORT_FORMATS:
+        # Exports are rendered on the first download and cached next to their source
+        export_service = ExportService()
+        source_path = export_service.source_path(transcription, file_type)
+        if not source_path or not os.path.exists(source_path):
+            return jsonify({"error": f"{file_type.upper()} file not found"}), 404
+
+        success, file_path, error = export_service.export(transcription, file_type)
+        if not success:
+            return jsonify({"error": f"{file_type.upper()} export failed: {error}"}), 500
+        db.session.commit()
+        return send_file(file_path, as_attachment=True,
+                         download_name=f"""{Path(source_path).stem}.{EXPORT_FORMATS[file_type]}""")
+
     # Map file types to their corresponding database fields
     file_type_mapping = {
         'txt': transcription.txt_document_path,
-        'md': transcription.md_document_path,
-        'word': transcription.word_document_path,
-        'docx': transcription.word_document_path
+        'md': transcription.md_document_path
     }
-    
+
     if file_type not in file_type_mapping:
         return jsonify({"error": "Invalid file type"}), 400
-    
+
     file_path = file_type_mapping[file_type]
-    
+
     if not file_path or not os.path.exists(file_path):
         return jsonify({"error": f"{file_type.upper()} file not found"}), 404
-    
+
     return send_file(file_path, as_attachment=True)
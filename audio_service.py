@@ -0,0 +1,319 @@
+import bisect
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import subprocess
+from typing import Optional
+
+SILENCE_START = re.compile(r'silence_start: (-?[\d.]+)')
+SILENCE_END = re.compile(r'silence_end: (-?[\d.]+)')
+DURATION = re.compile(r'Duration: (\d+):(\d+):([\d.]+)')
+# [HH:MM:SS], [MM:SS] or with fractional seconds, also inside ranges like [00:01 - 00:05]
+BRACKETED = re.compile(r'\[[^\]\n]*\]')
+TIMESTAMP = re.compile(r'(?<![\d:])(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?:([.,])(\d+))?(?![\d:])')
+
+
+def timemap_path(audio_file_path: str) -> str:
+    """Sidecar recording which parts of the source audio a silence-removed file is made of"""
+    return f"""{audio_file_path}.timemap.json"""
+
+
+def format_timestamp(seconds: float, with_hours: bool, decimal_separator: Optional[str], decimals: int) -> str:
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if decimal_separator:
+        seconds_text = f"""{seconds:0{decimals + 3}.{decimals}f}""".replace('.', decimal_separator)
+    else:
+        seconds_text = f"""{int(seconds):02d}"""
+    if with_hours or hours:
+        return f"""{int(hours):02d}:{int(minutes):02d}:{seconds_text}"""
+    return f"""{int(minutes):02d}:{seconds_text}"""
+
+
+class AudioService:
+    def __init__(self):
+        # Native sample rate of the inference model; anything above it is wasted upload
+        self.sample_rate = int(os.environ.get('TRANSCRIBE_SAMPLE_RATE', 16000))
+        self.bitrate = os.environ.get('SPEECH_AUDIO_BITRATE', '32k')
+        self.silence_noise_db = float(os.environ.get('SILENCE_NOISE_DB', -35))
+        self.silence_min_seconds = float(
+            os.environ.get('SILENCE_MIN_SECONDS', 2.0))
+        self.silence_padding_seconds = float(
+            os.environ.get('SILENCE_PADDING_SECONDS', 0.3))
+        # 'vad' drops everything that is not speech, music included; 'silencedetect' only finds quiet parts
+        self.silence_detector = os.environ.get('SILENCE_DETECTOR', 'vad')
+        self.vad_aggressiveness = int(os.environ.get('VAD_AGGRESSIVENESS', 3))
+
+    @staticmethod
+    def is_speech_optimized(audio_file_path: str) -> bool:
+        return Path(audio_file_path).name.startswith('[SPEECH_')
+
+    def to_speech(self, input_file: str) -> tuple[bool, str, Optional[str]]:
+        """Strips video, downmixes to mono, resamples to the model rate and encodes Opus.
+        Returns (success, output_path, error_message)"""
+        try:
+            input_path = Path(input_file)
+            output_path = input_path.parent / \
+                f"""[SPEECH_{self.sample_rate}] {input_path.stem}.ogg"""
+            partial_path = f"""{output_path}.part"""
+
+            ffmpeg_cmd = [
+                'ffmpeg', '-y', '-i', input_file,
+                '-vn',  # Drop video, cover art and subtitle streams
+                '-map', '0:a:0',
+                '-ac', '1',
+                '-ar', str(self.sample_rate),
+                '-c:a', 'libopus',
+                '-b:a', self.bitrate,
+                '-application', 'voip',  # Tunes Opus for speech
+                '-f', 'ogg',
+                partial_path
+            ]
+            result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise Exception(f"""FFmpeg failed: {result.stderr}""")
+
+            os.replace(partial_path, output_path)
+            # Timestamps still refer to the same cut of the source audio
+            if os.path.exists(timemap_path(input_file)):
+                shutil.copyfile(timemap_path(input_file),
+                                timemap_path(str(output_path)))
+            return True, str(output_path), None
+
+        except Exception as e:
+            return False, None, str(e)
+
+    @staticmethod
+    def is_silence_removed(audio_file_path: str) -> bool:
+        return os.path.exists(timemap_path(audio_file_path))
+
+    def _quiet_regions(self, input_file: str) -> tuple[list[tuple[float, float]], float]:
+        """(start, end) regions between the quiet parts ffmpeg's silencedetect finds, and the duration"""
+        ffmpeg_cmd = [
+            'ffmpeg', '-i', input_file, '-vn',
+            '-af', f"""silencedetect=noise={self.silence_noise_db}dB:d={self.silence_min_seconds}""",
+            '-f', 'null', '-'
+        ]
+        result = subprocess.run(ffmpeg_cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"""FFmpeg silence detection failed: {result.stderr}""")
+
+        duration_match = DURATION.search(result.stderr)
+        if not duration_match:
+            raise Exception("Could not read the audio duration")
+        hours, minutes, seconds = duration_match.groups()
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+        regions = []
+        cursor = 0.0
+        for line in result.stderr.splitlines():
+            start_match = SILENCE_START.search(line)
+            if start_match:
+                silence_start = max(0.0, float(start_match.group(1)))
+                if silence_start > cursor:
+                    regions.append((cursor, silence_start))
+                cursor = duration
+            end_match = SILENCE_END.search(line)
+            if end_match:
+                cursor = float(end_match.group(1))
+        if cursor < duration:
+            regions.append((cursor, duration))
+        return regions, duration
+
+    def _voice_regions(self, input_file: str) -> tuple[list[tuple[float, float]], float]:
+        """(start, end) regions the WebRTC voice activity detector classifies as speech, joined
+        across gaps shorter than silence_min_seconds, and the duration"""
+        import webrtcvad
+
+        vad = webrtcvad.Vad(self.vad_aggressiveness)
+        # The detector takes 10, 20 or 30 ms frames of 16-bit mono PCM
+        sample_rate = 16000
+        frame_seconds = 0.03
+        frame_bytes = int(sample_rate * frame_seconds) * 2
+        process = subprocess.Popen([
+            'ffmpeg', '-nostdin', '-loglevel', 'error', '-i', input_file, '-vn',
+            '-ac', '1', '-ar', str(sample_rate), '-f', 's16le', '-'
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        regions = []
+        frames = 0
+        while True:
+            frame = process.stdout.read(frame_bytes)
+            if len(frame) < frame_bytes:
+                break
+            start = frames * frame_seconds
+            frames += 1
+            if not vad.is_speech(frame, sample_rate):
+                continue
+            if regions and start - regions[-1][1] < self.silence_min_seconds:
+                regions[-1] = (regions[-1][0], start + frame_seconds)
+            else:
+                regions.append((start, start + frame_seconds))
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        if process.wait() != 0:
+            raise Exception(f"""FFmpeg decoding for voice detection failed: {stderr}""")
+        return regions, frames * frame_seconds
+
+    def detect_speech(self, input_file: str) -> tuple[list[tuple[float, float]], float]:
+        """Returns the (start, end) speech regions, padded and merged, and the duration"""
+        if self.silence_detector == 'silencedetect':
+            regions, duration = self._quiet_regions(input_file)
+        else:
+            regions, duration = self._voice_regions(input_file)
+
+        # Keep a little context around speech so words at the edges are not clipped
+        merged = []
+        for start, end in regions:
+            start = max(0.0, start - self.silence_padding_seconds)
+            end = min(duration, end + self.silence_padding_seconds)
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged, duration
+
+    def remove_silence(self, input_file: str) -> tuple[bool, str, Optional[str]]:
+        """Drops silent regions and writes a timemap sidecar next to the output.
+        Returns (success, output_path, error_message)"""
+        try:
+            regions, duration = self.detect_speech(input_file)
+            speech_seconds = sum(end - start for start, end in regions)
+
+            if not regions or speech_seconds >= duration - self.silence_min_seconds:
+                # Nothing worth cutting; an identity timemap marks the file as processed
+                output_file = input_file
+                regions = []
+            else:
+                input_path = Path(input_file)
+                output_file = str(input_path.parent /
+                                  f"""[NOSILENCE] {input_path.stem}.mp3""")
+                selection = '+'.join(
+                    f"""between(t,{start:.3f},{end:.3f})""" for start, end in regions)
+                ffmpeg_cmd = [
+                    'ffmpeg', '-y', '-i', input_file, '-vn',
+                    '-af', f"""aselect='{selection}',asetpts=N/SR/TB""",
+                    '-c:a', 'libmp3lame',
+                    '-b:a', '192k',
+                    '-f', 'mp3',
+                    f"""{output_file}.part"""
+                ]
+                result = subprocess.run(
+                    ffmpeg_cmd, capture_output=True, text=True)
+                if result.returncode != 0:
+                    raise Exception(f"""FFmpeg failed: {result.stderr}""")
+                os.replace(f"""{output_file}.part""", output_file)
+
+            # Each segment maps a start in the output to a start in the source
+            segments = []
+            output_offset = 0.0
+            for start, end in regions or [(0.0, duration)]:
+                segments.append({"output_start": round(output_offset, 3),
+                                 "source_start": round(start, 3),
+                                 "duration": round(end - start, 3)})
+                output_offset += end - start
+            with open(f"""{timemap_path(output_file)}.part""", 'w', encoding='utf-8') as f:
+                json.dump({"source": input_file, "segments": segments}, f)
+            os.replace(f"""{timemap_path(output_file)}.part""",
+                       timemap_path(output_file))
+
+            return True, output_file, None
+
+        except Exception as e:
+            return False, None, str(e)
+
+    def remap_transcript(self, txt_file: str, audio_file_path: str) -> tuple[bool, str, Optional[str]]:
+        """Rewrites bracketed timestamps in the transcript from silence-removed audio time to
+        source audio time. Returns (success, txt_path, error_message)"""
+        try:
+            if not os.path.exists(timemap_path(audio_file_path)):
+                return True, txt_file, None
+
+            with open(timemap_path(audio_file_path), 'r', encoding='utf-8') as f:
+                segments = json.load(f)["segments"]
+            output_starts = [segment["output_start"] for segment in segments]
+
+            def to_source(match: re.Match) -> str:
+                hours, minutes, seconds, decimal_separator, fraction = match.groups()
+                output_seconds = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + \
+                    (float(f"""0.{fraction}""") if fraction else 0.0)
+                segment = segments[max(
+                    0, bisect.bisect_right(output_starts, output_seconds) - 1)]
+                source_seconds = segment["source_start"] + \
+                    min(output_seconds - segment["output_start"], segment["duration"])
+                return format_timestamp(source_seconds, hours is not None, decimal_separator, len(fraction or ''))
+
+            # Write a new file instead of editing in place: the transcript may be a hard link into the cache
+            partial_path = f"""{txt_file}.part"""
+            with open(txt_file, 'r', encoding='utf-8') as source, open(partial_path, 'w', encoding='utf-8') as output:
+                for line in source:
+                    output.write(BRACKETED.sub(
+                        lambda bracket: TIMESTAMP.sub(to_source, bracket.group(0)), line))
+            os.replace(partial_path, txt_file)
+            return True, txt_file, None
+
+        except Exception as e:
+            return False, None, str(e)
+
+    def split(self, input_file: str, segment_seconds: float, overlap_seconds: float, output_folder: str) -> tuple[bool, list[tuple[str, float, float]], Optional[str]]:
+        """Cuts the audio into segments of about segment_seconds, preferring the middle of a silence
+        near each boundary, with overlap_seconds of shared audio on both sides of every cut. Each
+        segment gets a timemap so its transcript maps back onto the input's timeline.
+        Returns (success, [(segment_path, start, end)], error_message)"""
+        try:
+            regions, duration = self.detect_speech(input_file)
+            if duration <= segment_seconds:
+                return True, [], None
+
+            silences = [(regions[i][1] + regions[i + 1][0]) / 2
+                        for i in range(len(regions) - 1)]
+            cuts = []
+            previous_cut = 0.0
+            while duration - previous_cut > segment_seconds:
+                target = previous_cut + segment_seconds
+                window = segment_seconds / 5
+                nearby = [silence for silence in silences
+                          if abs(silence - target) <= window and silence - previous_cut > segment_seconds / 2]
+                cut = min(nearby, key=lambda silence: abs(
+                    silence - target)) if nearby else target
+                cuts.append(cut)
+                previous_cut = cut
+
+            os.makedirs(output_folder, exist_ok=True)
+            input_path = Path(input_file)
+            boundaries = [0.0] + cuts + [duration]
+            segments = []
+            for index in range(len(boundaries) - 1):
+                start = max(0.0, boundaries[index] - overlap_seconds)
+                end = min(duration, boundaries[index + 1] + overlap_seconds)
+                segment_path = os.path.join(
+                    output_folder, f"""[SEGMENT_{index + 1:03d}] {input_path.name}""")
+
+                ffmpeg_cmd = ['ffmpeg', '-y', '-ss', f"""{start:.3f}""", '-i', input_file,
+                              '-t', f"""{end - start:.3f}""", '-vn', '-c', 'copy',
+                              '-avoid_negative_ts', 'make_zero', segment_path]
+                result = subprocess.run(
+                    ffmpeg_cmd, capture_output=True, text=True)
+                if result.returncode != 0:
+                    # Fallback: re-encode if the container cannot be cut by stream copy
+                    segment_path = os.path.join(
+                        output_folder, f"""[SEGMENT_{index + 1:03d}] {input_path.stem}.mp3""")
+                    ffmpeg_cmd = ['ffmpeg', '-y', '-ss', f"""{start:.3f}""", '-i', input_file,
+                                  '-t', f"""{end - start:.3f}""", '-vn',
+                                  '-c:a', 'libmp3lame', '-b:a', '192k', segment_path]
+                    result = subprocess.run(
+                        ffmpeg_cmd, capture_output=True, text=True)
+                    if result.returncode != 0:
+                        raise Exception(
+                            f"""FFmpeg splitting failed: {result.stderr}""")
+
+                with open(timemap_path(segment_path), 'w', encoding='utf-8') as f:
+                    json.dump({"source": input_file, "segments": [
+                        {"output_start": 0.0, "source_start": round(start, 3), "duration": round(end - start, 3)}]}, f)
+                segments.append((segment_path, start, end))
+
+            return True, segments, None
+
+        except Exception as e:
+            return False, [], str(e)
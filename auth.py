@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from typing import Optional
+
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+from models import User
+
+
+class UserCache:
+    """(user id, is_admin) by username, read from the database at most once per TTL. Deleted users
+    and revoked admin rights take effect on existing tokens within the TTL."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.next_sweep = time.monotonic() + ttl_seconds
+
+    def get(self, username: str) -> Optional[tuple[int, bool]]:
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(username)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        user = User.query.filter_by(username=username).first()
+        record = (user.id, bool(user.is_admin)) if user else None
+        with self.lock:
+            self.entries[username] = (now + self.ttl_seconds, record)
+            if now >= self.next_sweep:
+                # Drop users who stopped sending requests, so the cache only holds recent ones
+                self.entries = {name: entry for name, entry in self.entries.items() if entry[0] > now}
+                self.next_sweep = now + self.ttl_seconds
+        return record
+
+    def forget(self, username: str):
+        with self.lock:
+            self.entries.pop(username, None)
+
+
+user_cache = UserCache(float(os.environ.get('AUTH_CACHE_TTL_SECONDS', 60)))
+
+
+def user_claims(user: User) -> dict:
+    """Claims added to access tokens, so authorizing a request needs no user lookup"""
+    return {'uid': user.id, 'is_admin': bool(user.is_admin)}
+
+
+def is_token_revoked(jwt_header: dict, jwt_payload: dict) -> bool:
+    """token_in_blocklist_loader: rejects tokens of deleted users, of a user recreated under the same
+    name, and admin tokens of users who are no longer admins"""
+    record = user_cache.get(jwt_payload['sub'])
+    if record is None:
+        return True
+    user_id, is_admin = record
+    if 'uid' in jwt_payload and jwt_payload['uid'] != user_id:
+        return True
+    return bool(jwt_payload.get('is_admin')) and not is_admin
+
+
+def current_user_id() -> int:
+    claims = get_jwt()
+    if 'uid' in claims:
+        return claims['uid']
+    # Tokens issued before the claims existed
+    return user_cache.get(get_jwt_identity())[0]
+
+
+def current_user_is_admin() -> bool:
+    # A true claim is trusted, since is_token_revoked rejects it once admin rights are revoked. A
+    # false one is checked against the cache, so a promotion applies without logging in again.
+    if get_jwt().get('is_admin'):
+        return True
+    return user_cache.get(get_jwt_identity())[1]
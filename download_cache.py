@@ -0,0 +1,133 @@
+import hashlib
+import os
+import re
+import threading
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlsplit, urlunsplit
+
+from flask import current_app
+
+from file_cache import FileCache
+
+GOOGLE_DRIVE_ID_PATTERNS = [
+    re.compile(r'/file/d/([\w-]+)'),
+    re.compile(r'/d/([\w-]+)'),
+    re.compile(r'[?&]id=([\w-]+)')
+]
+YOUTUBE_ID_PATTERNS = [
+    re.compile(r'youtu\.be/([\w-]{11})'),
+    re.compile(r'[?&]v=([\w-]{11})'),
+    re.compile(r'/(?:shorts|live|embed|v)/([\w-]{11})')
+]
+
+
+def sha256_file(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadCache:
+    """Cache of downloaded sources. Files are stored once per content hash (blobs/<sha256>/<name>)
+    and a normalized-URL index (urls/<url hash>) points at the blob, so resubmitting the same Drive
+    file or YouTube video skips the download. A revision (e.g. of a Drive file replaced under the same
+    ID) is part of the index key, so a changed file misses. Index entries are removed together with
+    the blob they point at."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.blobs = FileCache(os.path.join(root, 'blobs'), max_bytes,
+                               on_evict=self._remove_stale_urls)
+        self.urls_folder = os.path.join(root, 'urls')
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """Maps the many URL shapes of one Drive file or YouTube video to a single key"""
+        url = url.strip()
+        if 'drive.google.com' in url or 'docs.google.com' in url:
+            for pattern in GOOGLE_DRIVE_ID_PATTERNS:
+                match = pattern.search(url)
+                if match:
+                    return f"""gdrive:{match.group(1)}"""
+        if 'youtube.com' in url or 'youtu.be' in url:
+            for pattern in YOUTUBE_ID_PATTERNS:
+                match = pattern.search(url)
+                if match:
+                    return f"""youtube:{match.group(1)}"""
+
+        parts = urlsplit(url)
+        query = urlencode(sorted(parse_qs(parts.query).items()), doseq=True)
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, query, ''))
+
+    def _url_index_path(self, url: str, revision: Optional[str] = None) -> str:
+        key = self.normalize_url(url)
+        if revision is not None:
+            key = f"""{key}@{revision}"""
+        url_key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.urls_folder, url_key)
+
+    def lookup(self, url: str, revision: Optional[str] = None) -> Optional[str]:
+        """Returns the cached file for the URL at that revision, or None on a miss"""
+        if not self.blobs.enabled:
+            return None
+        try:
+            with open(self._url_index_path(url, revision), 'r', encoding='utf-8') as f:
+                content_hash = f.read().strip()
+        except FileNotFoundError:
+            return None
+        cached_path = self.blobs.get(content_hash)
+        if not cached_path:
+            self._remove_stale_urls([content_hash])
+        return cached_path
+
+    def store(self, url: str, file_path: str, revision: Optional[str] = None) -> Optional[str]:
+        """Adds a finished download to the cache and returns the cached path"""
+        if not self.blobs.enabled:
+            return None
+
+        content_hash = sha256_file(file_path)
+        cached_path = self.blobs.put_file(content_hash, file_path)
+
+        os.makedirs(self.urls_folder, exist_ok=True)
+        index_path = self._url_index_path(url, revision)
+        partial_path = f"""{index_path}.{os.getpid()}.{threading.get_ident()}.part"""
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            f.write(content_hash)
+        os.replace(partial_path, index_path)
+        return cached_path
+
+    def link_to(self, cached_path: str, folder_path: str) -> str:
+        return self.blobs.link_to(cached_path, folder_path)
+
+    def _remove_stale_urls(self, evicted_hashes: list[str]):
+        """Drops the index entries pointing at evicted blobs, or at blobs that are gone for any other reason"""
+        evicted_hashes = set(evicted_hashes)
+        try:
+            index_entries = list(os.scandir(self.urls_folder))
+        except FileNotFoundError:
+            return
+        for index_entry in index_entries:
+            if index_entry.name.endswith('.part'):
+                continue
+            try:
+                with open(index_entry.path, 'r', encoding='utf-8') as f:
+                    content_hash = f.read().strip()
+                if content_hash in evicted_hashes or not os.path.isdir(os.path.join(self.blobs.root, content_hash)):
+                    os.remove(index_entry.path)
+            except FileNotFoundError:
+                continue
+
+
+_download_cache = None
+_download_cache_lock = threading.Lock()
+
+
+def get_download_cache() -> DownloadCache:
+    global _download_cache
+    with _download_cache_lock:
+        if _download_cache is None:
+            _download_cache = DownloadCache(
+                os.path.join(current_app.config['CACHE_FOLDER'], 'downloads'),
+                int(os.environ.get('DOWNLOAD_CACHE_MAX_BYTES', 20 * 1024 ** 3)))
+        return _download_cache
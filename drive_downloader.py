@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Optional
+from urllib.parse import unquote
+
+import requests
+
+from download_cache import GOOGLE_DRIVE_ID_PATTERNS
+
+DRIVE_DOWNLOAD_URL = 'https://drive.usercontent.google.com/download'
+FILENAME_STAR = re.compile(r"""filename\*\s*=\s*[^']*'[^']*'([^;]+)""", re.IGNORECASE)
+FILENAME = re.compile(r'filename\s*=\s*"?([^";]+)"?', re.IGNORECASE)
+
+
+class RangeNotSupported(Exception):
+    pass
+
+
+def remove_partial_downloads(folder_path: str):
+    """Deletes the `.part` files and checkpoints of unfinished downloads under folder_path, once
+    no job will retry them"""
+    for root, _, file_names in os.walk(folder_path):
+        for file_name in file_names:
+            if file_name.endswith(('.part', '.part.json', '.part.json.tmp')):
+                try:
+                    os.remove(os.path.join(root, file_name))
+                except FileNotFoundError:
+                    pass
+
+
+class DriveDownloader:
+    """Downloads Google Drive files over several HTTP Range connections into `<name>.part`.
+    Progress of every range is checkpointed in `<name>.part.json`, so a retried job continues
+    where the previous attempt stopped instead of starting over."""
+
+    def __init__(self):
+        self.connections = int(os.environ.get('DRIVE_DOWNLOAD_CONNECTIONS', 4))
+        self.min_range_bytes = int(os.environ.get(
+            'DRIVE_DOWNLOAD_MIN_RANGE_BYTES', 16 * 1024 ** 2))
+        self.max_retries = int(os.environ.get('DRIVE_DOWNLOAD_RETRIES', 5))
+        self.chunk_size = 1024 * 1024
+        self.checkpoint_bytes = 8 * 1024 ** 2
+        self.timeout = 60
+
+    @staticmethod
+    def file_id(url: str) -> Optional[str]:
+        for pattern in GOOGLE_DRIVE_ID_PATTERNS:
+            match = pattern.search(url)
+            if match:
+                return match.group(1)
+        return None
+
+    def _probe(self, download_url: str) -> tuple[int, str, str]:
+        """Returns (size, file name, revision), or raises RangeNotSupported when the server cannot do
+        ranges. The revision changes when the file is replaced under the same ID."""
+        response = requests.get(download_url, headers={'Range': 'bytes=0-0'},
+                                stream=True, timeout=self.timeout)
+        with response:
+            content_range = response.headers.get('Content-Range', '')
+            if response.status_code != 206 or '/' not in content_range or content_range.endswith('/*'):
+                raise RangeNotSupported(
+                    f"""Drive answered {response.status_code} {response.headers.get('Content-Type')} to a range request""")
+            size = int(content_range.rsplit('/', 1)[1])
+            validators = [response.headers.get('ETag'), response.headers.get('Last-Modified')]
+
+            disposition = response.headers.get('Content-Disposition', '')
+            match = FILENAME_STAR.search(disposition)
+            file_name = unquote(match.group(1).strip()) if match else None
+            if not file_name:
+                match = FILENAME.search(disposition)
+                file_name = match.group(1).strip() if match else None
+        if not file_name:
+            raise RangeNotSupported("Drive did not send a file name")
+        file_name = os.path.basename(file_name.replace('\\', '/'))
+        return size, file_name, json.dumps([size, file_name, *validators])
+
+    def revision(self, url: str) -> Optional[str]:
+        """Identifies the current content of the Drive file, or None when Drive does not tell"""
+        file_id = self.file_id(url)
+        if not file_id:
+            return None
+        try:
+            return self._probe(f"""{DRIVE_DOWNLOAD_URL}?id={file_id}&export=download&confirm=t""")[2]
+        except (RangeNotSupported, requests.RequestException) as e:
+            logging.info(f"""Could not read the revision of {url}: {e}""")
+            return None
+
+    def _load_state(self, state_path: str, partial_path: str, download_url: str, size: int) -> list[list[int]]:
+        """Returns [start, end, downloaded bytes] per range, reusing a previous attempt's checkpoint"""
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state['url'] == download_url and state['size'] == size and os.path.getsize(partial_path) == size:
+                logging.info(
+                    f"""Resuming {partial_path} at {sum(downloaded for _, _, downloaded in state['ranges'])} of {size} bytes""")
+                return state['ranges']
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+        with open(partial_path, 'wb') as f:
+            f.truncate(size)
+        range_count = max(1, min(self.connections, size // self.min_range_bytes))
+        range_size = -(-size // range_count)
+        return [[start, min(size, start + range_size) - 1, 0] for start in range(0, size, range_size)]
+
+    def _save_state(self, state_path: str, download_url: str, size: int, ranges: list[list[int]]):
+        with open(f"""{state_path}.tmp""", 'w', encoding='utf-8') as f:
+            json.dump({'url': download_url, 'size': size, 'ranges': ranges}, f)
+        os.replace(f"""{state_path}.tmp""", state_path)
+
+    def _download_range(self, download_url: str, partial_path: str, byte_range: list[int], checkpoint, stop_event: threading.Event):
+        attempt = 0
+        while byte_range[2] < byte_range[1] - byte_range[0] + 1 and not stop_event.is_set():
+            try:
+                offset = byte_range[0] + byte_range[2]
+                response = requests.get(download_url, headers={'Range': f"""bytes={offset}-{byte_range[1]}"""},
+                                        stream=True, timeout=self.timeout)
+                downloaded_before = byte_range[2]
+                # Unbuffered, so bytes counted in a checkpoint are already in the file
+                with response, open(partial_path, 'r+b', buffering=0) as f:
+                    if response.status_code != 206:
+                        raise IOError(
+                            f"""Expected 206 for bytes {offset}-{byte_range[1]}, got {response.status_code}""")
+                    f.seek(offset)
+                    unsaved_bytes = 0
+                    for chunk in response.iter_content(self.chunk_size):
+                        if stop_event.is_set():
+                            break
+                        chunk = chunk[:byte_range[1] - byte_range[0] + 1 - byte_range[2]]
+                        while chunk:
+                            written = f.write(chunk)
+                            chunk = chunk[written:]
+                            byte_range[2] += written
+                            unsaved_bytes += written
+                        if unsaved_bytes >= self.checkpoint_bytes:
+                            checkpoint()
+                            unsaved_bytes = 0
+                checkpoint()
+                if byte_range[2] == downloaded_before and not stop_event.is_set():
+                    raise IOError(
+                        f"""Connection closed at byte {offset} before the range finished""")
+                if byte_range[2] > downloaded_before:
+                    attempt = 0
+            except (requests.RequestException, IOError) as e:
+                checkpoint()
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = random.uniform(0, min(60, 2 ** attempt))
+                logging.warning(
+                    f"""Range {byte_range[0]}-{byte_range[1]} of {partial_path} failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f} seconds""")
+                time.sleep(delay)
+
+    def download(self, url: str, folder_path: str) -> tuple[bool, str, Optional[str]]:
+        """Returns (success, output_path, error_message). Raises RangeNotSupported before anything
+        is written when the file has to be fetched another way (e.g. Drive sent an HTML page)."""
+        file_id = self.file_id(url)
+        if not file_id:
+            raise RangeNotSupported(f"""No Drive file ID in {url}""")
+        download_url = f"""{DRIVE_DOWNLOAD_URL}?id={file_id}&export=download&confirm=t"""
+        try:
+            size, file_name, _ = self._probe(download_url)
+        except requests.RequestException as e:
+            return False, None, str(e)
+
+        try:
+            output_path = os.path.join(folder_path, file_name)
+            partial_path = f"""{output_path}.part"""
+            state_path = f"""{partial_path}.json"""
+
+            state_lock = threading.Lock()
+            ranges = self._load_state(
+                state_path, partial_path, download_url, size)
+
+            def checkpoint():
+                with state_lock:
+                    self._save_state(state_path, download_url, size, ranges)
+
+            checkpoint()
+            stop_event = threading.Event()
+            errors = []
+
+            def run(byte_range: list[int]):
+                try:
+                    self._download_range(
+                        download_url, partial_path, byte_range, checkpoint, stop_event)
+                except Exception as e:
+                    errors.append(e)
+                    # One range gave up; stop the others, the checkpoint keeps their progress
+                    stop_event.set()
+
+            threads = [threading.Thread(target=run, args=(byte_range,), name=f"""drive-range-{index}""")
+                       for index, byte_range in enumerate(ranges)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if errors:
+                raise errors[0]
+
+            os.replace(partial_path, output_path)
+            os.remove(state_path)
+            return True, output_path, None
+
+        except Exception as e:
+            return False, None, str(e)
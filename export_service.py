@@ -0,0 +1,172 @@
+from contextlib import ExitStack
+import fcntl
+import hashlib
+import logging
+import os
+from pathlib import Path
+import re
+import uuid
+from typing import Optional
+
+from audio_service import TIMESTAMP, format_timestamp
+from models import Transcription
+from pandoc_service import PandocService
+
+REFERENCE_DOC = 'reference_pandoc.docx'
+
+# Download file type -> extension of the rendered export
+EXPORT_FORMATS = {
+    'word': 'docx',
+    'docx': 'docx',
+    'html': 'html',
+    'pdf': 'pdf',
+    'srt': 'srt'
+}
+# A transcript line starting with a bracketed timestamp or range, e.g. [00:01:02] or [00:01 - 00:05]
+CUE = re.compile(r'^\s*\[([^\]\n]*)\]\s*(.*)$')
+
+
+class ExportService:
+    """Renders download formats on first request and caches them in an `exports` folder next to
+    their source: the markdown, or the transcript for subtitles. Export names carry a hash of the
+    source, so an edited document is rendered again and its stale exports are removed."""
+
+    def __init__(self):
+        self.max_cue_seconds = float(os.environ.get('SRT_MAX_CUE_SECONDS', 5))
+
+    @staticmethod
+    def source_path(transcription: Transcription, file_type: str) -> Optional[str]:
+        return transcription.txt_document_path if EXPORT_FORMATS[file_type] == 'srt' else transcription.md_document_path
+
+    @staticmethod
+    def _digest(file_paths: list[str]) -> str:
+        digest = hashlib.sha256()
+        for file_path in file_paths:
+            with open(file_path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+        return digest.hexdigest()[:16]
+
+    def export_path(self, source: str, extension: str) -> str:
+        # The Word layout comes from the reference doc, so a new template renders again too
+        inputs = [source, REFERENCE_DOC] if extension == 'docx' else [source]
+        return os.path.join(os.path.dirname(source), 'exports',
+                            f"""{Path(source).stem}.{self._digest(inputs)}.{extension}""")
+
+    @staticmethod
+    def _remove_stale(export_path: str):
+        folder, name = os.path.split(export_path)
+        stem, _, extension = name.rsplit('.', 2)
+        stale = re.compile(
+            rf"""{re.escape(stem)}\.[0-9a-f]{{16}}\.{re.escape(extension)}""")
+        for file_name in os.listdir(folder):
+            if file_name != name and stale.fullmatch(file_name):
+                try:
+                    os.remove(os.path.join(folder, file_name))
+                except FileNotFoundError:
+                    pass
+
+    def _build_srt(self, txt_file: str, output_file: str):
+        cues = []
+        with open(txt_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = CUE.match(line)
+                times = TIMESTAMP.findall(match.group(1)) if match else []
+                if times:
+                    seconds = [int(hours or 0) * 3600 + int(minutes) * 60 + int(whole) +
+                               (float(f"""0.{fraction}""") if fraction else 0.0)
+                               for hours, minutes, whole, _, fraction in times]
+                    cues.append([seconds[0], seconds[1] if len(seconds) > 1 else None,
+                                 [match.group(2).strip()]])
+                elif cues and line.strip():
+                    cues[-1][2].append(line.strip())
+        if not cues:
+            raise Exception("Transcript has no timestamps to build subtitles from")
+
+        with open(output_file, 'w', encoding='utf-8') as f:
+            for index, (start, end, lines) in enumerate(cues):
+                if end is None:
+                    # Without an end time a cue lasts until the next one starts
+                    next_start = cues[index + 1][0] if index + 1 < len(cues) else None
+                    end = min(start + self.max_cue_seconds,
+                              next_start) if next_start and next_start > start else start + self.max_cue_seconds
+                text = '\n'.join(line for line in lines if line)
+                f.write(f"""{index + 1}\n{format_timestamp(start, True, ',', 3)} --> {format_timestamp(end, True, ',', 3)}\n{text}\n\n""")
+
+    @staticmethod
+    def _lock_path(export_path: str) -> str:
+        # One lock per source and format rather than per export, so lock files do not pile up
+        folder, name = os.path.split(export_path)
+        stem, _, extension = name.rsplit('.', 2)
+        return os.path.join(folder, f""".{stem}.{extension}.lock""")
+
+    def export_many(self, transcriptions: list[Transcription], file_type: str) -> list[tuple[bool, str, Optional[str]]]:
+        """Returns (success, export_path, error_message) per transcription, rendering the exports
+        that are not cached yet in one pandoc batch. Updates word_document_path for Word exports;
+        the caller commits."""
+        extension = EXPORT_FORMATS[file_type]
+        results = [None] * len(transcriptions)
+        missing = []
+        for index, transcription in enumerate(transcriptions):
+            source = self.source_path(transcription, file_type)
+            if not source or not os.path.exists(source):
+                results[index] = (False, None, f"""No {'transcript' if extension == 'srt' else 'proofread document'} to export""")
+                continue
+            export_path = self.export_path(source, extension)
+            if os.path.exists(export_path):
+                results[index] = (True, export_path, None)
+                continue
+            os.makedirs(os.path.dirname(export_path), exist_ok=True)
+            missing.append((index, source, export_path))
+
+        with ExitStack() as locks:
+            # Concurrent requests for the same export wait for the first one to render it instead
+            # of rendering it again; locks are taken in path order so batches cannot deadlock
+            for lock_path in sorted({self._lock_path(export_path) for _, _, export_path in missing}):
+                lock_file = locks.enter_context(open(lock_path, 'a'))
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            pending = []
+            for index, source, export_path in missing:
+                if os.path.exists(export_path):
+                    results[index] = (True, export_path, None)
+                    continue
+                # Render under a temporary name, so a concurrent download never sees half a file
+                partial_path = os.path.join(os.path.dirname(export_path),
+                                            f""".{uuid.uuid4().hex}.{extension}""")
+                pending.append((index, source, partial_path, export_path))
+
+            if extension == 'srt':
+                rendered = []
+                for _, source, partial_path, _ in pending:
+                    try:
+                        self._build_srt(source, partial_path)
+                        rendered.append((True, partial_path, None))
+                    except Exception as e:
+                        rendered.append((False, None, str(e)))
+            else:
+                # Bounded by the pandoc server and process timeouts (see pandoc_service.py)
+                rendered = PandocService().convert_batch(
+                    [(source, partial_path) for _, source, partial_path, _ in pending], extension,
+                    reference_doc=REFERENCE_DOC if extension == 'docx' else None,
+                    standalone=extension == 'html')
+
+            for (index, _, partial_path, export_path), (success, _, error) in zip(pending, rendered):
+                if not success:
+                    if os.path.exists(partial_path):
+                        os.remove(partial_path)
+                    results[index] = (False, None, error)
+                    continue
+                os.replace(partial_path, export_path)
+                self._remove_stale(export_path)
+                logging.info(f"""Rendered {Path(export_path).name}""")
+                results[index] = (True, export_path, None)
+
+        for transcription, (success, export_path, _) in zip(transcriptions, results):
+            if success and extension == 'docx':
+                transcription.word_document_path = export_path
+        return results
+
+    def export(self, transcription: Transcription, file_type: str) -> tuple[bool, str, Optional[str]]:
+        """Returns (success, export_path, error_message), rendering the export on first request"""
+        return self.export_many([transcription], file_type)[0]
@@ -0,0 +1,156 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+
+class FileCache:
+    """Directory-backed cache shared by every process on the host. Each entry is a folder named
+    after its key holding a single file, so the original file name survives. Reads refresh the
+    entry's mtime and the least recently used entries are evicted once the byte budget is exceeded.
+
+    Job folders hard-link cached files, and removing a file that is still linked elsewhere frees no
+    disk, so only files the cache alone holds (link count 1) count against the budget and get evicted.
+    on_evict is called with the keys of the evicted entries."""
+
+    def __init__(self, root: str, max_bytes: int, evict_interval_seconds: int = 60,
+                 on_evict: Optional[Callable[[list[str]], None]] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.evict_interval_seconds = evict_interval_seconds
+        self.on_evict = on_evict
+        self._last_evicted = 0.0
+        self._evict_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_folder(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the path of the cached file, or None on a miss"""
+        if not self.enabled:
+            return None
+
+        entry_folder = self._entry_folder(key)
+        try:
+            file_names = os.listdir(entry_folder)
+        except FileNotFoundError:
+            return None
+        if len(file_names) != 1:
+            return None
+
+        file_path = os.path.join(entry_folder, file_names[0])
+        try:
+            # Mark as recently used for LRU eviction
+            os.utime(file_path)
+        except FileNotFoundError:
+            return None
+        return file_path
+
+    def put_file(self, key: str, source_path: str, file_name: Optional[str] = None) -> Optional[str]:
+        """Copies (or hard-links) source_path into the cache and returns the cached path"""
+        if not self.enabled:
+            return None
+
+        def write(destination: str):
+            try:
+                os.link(source_path, destination)
+            except OSError:
+                shutil.copyfile(source_path, destination)
+
+        return self._put(key, file_name or os.path.basename(source_path), write)
+
+    def put_bytes(self, key: str, data: bytes, file_name: str = 'data') -> Optional[str]:
+        if not self.enabled:
+            return None
+
+        def write(destination: str):
+            with open(destination, 'wb') as f:
+                f.write(data)
+
+        return self._put(key, file_name, write)
+
+    def _put(self, key: str, file_name: str, write) -> Optional[str]:
+        os.makedirs(self.root, exist_ok=True)
+        # Build the entry in a temporary folder and rename it into place, so readers in other
+        # processes never see a half-written file
+        temporary_folder = os.path.join(
+            self.root, f""".tmp-{uuid.uuid4().hex}""")
+        os.makedirs(temporary_folder)
+        try:
+            write(os.path.join(temporary_folder, file_name))
+            try:
+                os.rename(temporary_folder, self._entry_folder(key))
+            except OSError:
+                # Another process stored the same key first
+                shutil.rmtree(temporary_folder, ignore_errors=True)
+        except Exception:
+            shutil.rmtree(temporary_folder, ignore_errors=True)
+            raise
+
+        self.evict()
+        return self.get(key)
+
+    def link_to(self, cached_path: str, folder_path: str, file_name: Optional[str] = None) -> str:
+        """Places a cached file into a job folder without duplicating it on disk when possible.
+        A hard link also keeps the job's copy alive if the cache entry is evicted later."""
+        os.makedirs(folder_path, exist_ok=True)
+        destination = os.path.join(
+            folder_path, file_name or os.path.basename(cached_path))
+        if os.path.exists(destination):
+            os.remove(destination)
+        try:
+            os.link(cached_path, destination)
+        except OSError:
+            shutil.copyfile(cached_path, destination)
+        return destination
+
+    def evict(self, force: bool = False):
+        """Removes least recently used entries until the files only the cache holds fit in max_bytes"""
+        if not self.enabled or not os.path.isdir(self.root):
+            return
+        with self._evict_lock:
+            if not force and time.time() - self._last_evicted < self.evict_interval_seconds:
+                return
+            self._last_evicted = time.time()
+
+            entries = []
+            total_bytes = 0
+            for entry in os.scandir(self.root):
+                if not entry.is_dir() or entry.name.startswith('.tmp-'):
+                    continue
+                size = 0
+                last_used = 0.0
+                shared = False
+                for cached_file in os.scandir(entry.path):
+                    stat = cached_file.stat()
+                    size += stat.st_size
+                    last_used = max(last_used, stat.st_mtime)
+                    shared = shared or stat.st_nlink > 1
+                # A file a job folder still links stays on disk after eviction, so it costs the cache nothing
+                if shared:
+                    continue
+                entries.append((last_used, size, entry.name))
+                total_bytes += size
+
+            if total_bytes <= self.max_bytes:
+                return
+
+            evicted = []
+            for last_used, size, key in sorted(entries):
+                shutil.rmtree(self._entry_folder(key), ignore_errors=True)
+                evicted.append(key)
+                total_bytes -= size
+                logging.info(
+                    f"""Evicted cache entry {self._entry_folder(key)} ({size} bytes)""")
+                if total_bytes <= self.max_bytes:
+                    break
+
+        if self.on_evict:
+            self.on_evict(evicted)
@@ -0,0 +1,95 @@
+from functools import wraps
+import hmac
+import logging
+import os
+import traceback
+import uuid
+from flask import Blueprint, request, jsonify
+from database import db
+from models import Transcription
+from pipeline import AWAITING_RESULT_STATUSES, complete_stage, fail_transcription, get_output_folder, on_transcript_ready
+from transcription_service import TranscriptionService
+
+inference = Blueprint('inference', __name__)
+
+
+def require_inference_api_key(func):
+    @wraps(func)  # Keeps the original function metadata
+    def wrapper(*args, **kwargs):
+        api_key = os.environ.get(
+            'INFERENCE_CALLBACK_API_KEY') or os.environ.get('TRANSCRIBE_API_KEY')
+        authorization = request.headers.get('Authorization', '')
+        if not api_key or not hmac.compare_digest(authorization, f"""Bearer {api_key}"""):
+            return jsonify({"error": "Unauthorized"}), 401
+        # Call the actual function only if authorized
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def iter_request_body(chunk_size: int = 1024 * 1024):
+    """Yields the uploaded transcript in chunks, either a multipart `file` field or the raw body"""
+    stream = request.files['file'].stream if 'file' in request.files else request.stream
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+@inference.route('/transcriptions/<transcription_id>/result', methods=['POST', 'PUT'])
+@require_inference_api_key
+def receive_transcription_result(transcription_id):
+    try:
+        uuid.UUID(transcription_id)
+    except ValueError:
+        return jsonify({"error": "Transcription not found"}), 404
+
+    transcription: Transcription = Transcription.query.get(transcription_id)
+    if not transcription:
+        return jsonify({"error": "Transcription not found"}), 404
+
+    if transcription.status not in AWAITING_RESULT_STATUSES:
+        return jsonify({"error": f"""Transcription is not waiting for a result (status: {transcription.status})"""}), 409
+
+    transcription_service = TranscriptionService()
+    txt_path = transcription_service.result_path(
+        get_output_folder('TXT_FOLDER', transcription), transcription)
+    success, partial_path, error = transcription_service.write_partial_result(
+        txt_path, iter_request_body())
+    if not success:
+        logging.error(
+            f"""Saving pushed result for transcription {transcription_id} failed: {error}""")
+        return jsonify({"error": f"""Saving transcription result failed: {error}"""}), 500
+
+    # Re-check under a row lock before the transcript replaces anything, so a repeated or late
+    # delivery can neither overwrite an accepted transcript nor queue proofreading twice
+    transcription = Transcription.query.filter_by(
+        id=transcription_id).with_for_update().populate_existing().first()
+    if not transcription or transcription.status not in AWAITING_RESULT_STATUSES:
+        db.session.rollback()
+        os.remove(partial_path)
+        if not transcription:
+            return jsonify({"error": "Transcription not found"}), 404
+        return jsonify({"error": f"""Transcription is not waiting for a result (status: {transcription.status})"""}), 409
+
+    try:
+        transcription_service.publish_result(transcription, partial_path, txt_path)
+        on_transcript_ready(transcription, txt_path)
+    except Exception as e:
+        db.session.rollback()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        logging.error(
+            f"""Finishing pushed result for transcription {transcription_id} failed: {e}""")
+        return jsonify({"error": str(e)}), 500
+    try:
+        complete_stage(transcription, 'transcribe')
+    except Exception as e:
+        # No job is left to retry a stage finished by the callback, e.g. stitching the last segment
+        db.session.rollback()
+        logging.error(
+            f"""Completing transcription {transcription_id} after its pushed result failed: {e}""")
+        fail_transcription(transcription, str(e), traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"message": "Transcription result received"}), 200
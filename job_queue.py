@@ -0,0 +1,99 @@
+import datetime
+import logging
+import os
+import socket
+from typing import Optional
+
+from database import db
+from models import Job
+
+
+class JobQueue:
+    """Postgres-backed job queue. Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+    so any number of worker processes can share the table without handing out a job twice."""
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"""{socket.gethostname()}:{os.getpid()}"""
+        self.stale_after_seconds = int(
+            os.environ.get('JOB_STALE_SECONDS', 300))
+
+    def enqueue(self, job_type: str, transcription_id, payload: Optional[dict] = None, commit: bool = True) -> Job:
+        job = Job(
+            transcription_id=transcription_id,
+            job_type=job_type,
+            payload=payload or {},
+            status='queued'
+        )
+        db.session.add(job)
+        if commit:
+            db.session.commit()
+        return job
+
+    def claim(self, job_types: list[str]) -> Optional[Job]:
+        """Claim the oldest runnable job of the given types, or return None if there is none."""
+        job = Job.query.filter(
+            Job.status == 'queued',
+            Job.job_type.in_(job_types),
+            Job.run_after <= db.func.now()
+        ).order_by(Job.id).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.session.rollback()
+            return None
+
+        job.status = 'running'
+        job.attempts = (job.attempts or 0) + 1
+        job.locked_by = self.worker_id
+        job.locked_at = db.func.now()
+        job.heartbeat_at = db.func.now()
+        db.session.commit()
+        return job
+
+    def complete(self, job: Job):
+        job.status = 'done'
+        job.locked_by = None
+        job.last_error = None
+        db.session.commit()
+
+    def fail(self, job: Job, error: str, retry_delay_seconds: int = 30):
+        """Put the job back in the queue, or mark it failed once it is out of attempts."""
+        job.last_error = error
+        job.locked_by = None
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = db.func.now() + datetime.timedelta(seconds=retry_delay_seconds)
+        else:
+            job.status = 'failed'
+        db.session.commit()
+
+    def heartbeat(self, job_ids: list[int]):
+        if not job_ids:
+            return
+        Job.query.filter(
+            Job.id.in_(job_ids),
+            Job.locked_by == self.worker_id
+        ).update({Job.heartbeat_at: db.func.now()}, synchronize_session=False)
+        db.session.commit()
+
+    def requeue_stale(self) -> list[Job]:
+        """Release jobs whose worker stopped sending heartbeats (crash, restart, deploy).
+        Returns the jobs that ran out of attempts so the caller can mark their transcriptions."""
+        stale_jobs = Job.query.filter(
+            Job.status == 'running',
+            Job.heartbeat_at < db.func.now() -
+            datetime.timedelta(seconds=self.stale_after_seconds)
+        ).with_for_update(skip_locked=True).all()
+
+        failed_jobs = []
+        for job in stale_jobs:
+            logging.warning(
+                f"""Job {job.id} ({job.job_type}) held by {job.locked_by} stopped sending heartbeats""")
+            job.locked_by = None
+            job.last_error = 'Worker stopped sending heartbeats'
+            if job.attempts < job.max_attempts:
+                job.status = 'queued'
+            else:
+                job.status = 'failed'
+                failed_jobs.append(job)
+        db.session.commit()
+        return failed_jobs
@@ -0,0 +1,53 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+
+class LLMRuntime:
+    """Process-wide event loop on a dedicated thread with one pooled, keep-alive LLM client. Jobs
+    submit coroutines from their own threads, so connections and TLS sessions are reused across
+    chunks and jobs instead of being rebuilt by every `asyncio.run`."""
+
+    def __init__(self, api_key: str, base_url: str, max_connections: int, keepalive_seconds: float):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name='llm-runtime', daemon=True)
+        self.thread.start()
+
+        # Build the HTTP client on the loop it will be used from
+        self.client = self.submit(self._create_client(
+            api_key, base_url, max_connections, keepalive_seconds)).result()
+
+    @staticmethod
+    async def _create_client(api_key: str, base_url: str, max_connections: int, keepalive_seconds: float) -> AsyncOpenAI:
+        http_client = DefaultAsyncHttpxClient(limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_seconds))
+        # Retries are done by the scheduler, which also backs off the other jobs on a 429
+        return AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0, http_client=http_client)
+
+    def submit(self, coroutine) -> concurrent.futures.Future:
+        """Schedules the coroutine on the runtime loop; safe to call from any thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+_llm_runtime = None
+_llm_runtime_lock = threading.Lock()
+
+
+def get_llm_runtime() -> LLMRuntime:
+    global _llm_runtime
+    with _llm_runtime_lock:
+        if _llm_runtime is None:
+            _llm_runtime = LLMRuntime(
+                api_key=os.environ.get('DEEPSEEK_API_KEY'),
+                base_url=os.environ.get('DEEPSEEK_BASE_URL'),
+                max_connections=int(
+                    os.environ.get('PROOFREAD_MAX_CONNECTIONS', 20)),
+                keepalive_seconds=float(os.environ.get('PROOFREAD_KEEPALIVE_SECONDS', 60)))
+        return _llm_runtime
@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Optional
+
+import openai
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count without a tokenizer: about four characters or three quarters of a word per token"""
+    return max(math.ceil(len(text) / 4), math.ceil(len(text.split()) * 4 / 3))
+
+
+class LLMScheduler:
+    """Process-wide limiter for LLM calls shared by every proofreading job. It caps concurrent
+    requests and tokens per minute, splits the concurrency fairly across jobs, and retries rate
+    limits and server errors with jittered exponential backoff. It is thread-safe, so jobs running
+    on different threads and event loops share the same budget."""
+
+    def __init__(self, max_concurrency: int, tokens_per_minute: int, max_retries: int,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.lock = threading.Lock()
+        self.in_flight = defaultdict(int)
+        self.waiting = defaultdict(int)
+        # [timestamp, tokens] of every request started in the last minute
+        self.token_window = deque()
+        self.paused_until = 0.0
+
+    def _try_acquire(self, job_id: str, tokens: int):
+        """Returns (reservation, 0) when the request may start, else (None, seconds to wait)"""
+        now = time.monotonic()
+        with self.lock:
+            if now < self.paused_until:
+                return None, self.paused_until - now
+
+            if sum(self.in_flight.values()) >= self.max_concurrency:
+                return None, 0.1
+
+            # Every job with requests running or waiting gets an equal share of the slots
+            active_jobs = {job for job, count in self.in_flight.items() if count} | \
+                {job for job, count in self.waiting.items() if count}
+            fair_share = max(1, math.ceil(
+                self.max_concurrency / max(1, len(active_jobs))))
+            if self.in_flight[job_id] >= fair_share:
+                return None, 0.1
+
+            if self.tokens_per_minute:
+                while self.token_window and now - self.token_window[0][0] >= 60:
+                    self.token_window.popleft()
+                used_tokens = sum(entry[1] for entry in self.token_window)
+                # A single request bigger than the budget may still run once the window is empty
+                if self.token_window and used_tokens + tokens > self.tokens_per_minute:
+                    return None, max(0.1, 60 - (now - self.token_window[0][0]))
+
+            reservation = [now, tokens]
+            self.token_window.append(reservation)
+            self.in_flight[job_id] += 1
+            self.waiting[job_id] -= 1
+            return reservation, 0
+
+    async def acquire(self, job_id: str, tokens: int) -> list:
+        with self.lock:
+            self.waiting[job_id] += 1
+        try:
+            while True:
+                reservation, wait_seconds = self._try_acquire(job_id, tokens)
+                if reservation is not None:
+                    return reservation
+                await asyncio.sleep(min(wait_seconds, 1.0))
+        except BaseException:
+            with self.lock:
+                self.waiting[job_id] -= 1
+            raise
+
+    def release(self, job_id: str, reservation: list, used_tokens: Optional[int] = None):
+        with self.lock:
+            self.in_flight[job_id] -= 1
+            if not self.in_flight[job_id]:
+                del self.in_flight[job_id]
+            if not self.waiting.get(job_id):
+                self.waiting.pop(job_id, None)
+            if used_tokens is not None:
+                # Replace the estimate with what the API actually billed
+                reservation[1] = used_tokens
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the error is not worth retrying"""
+        backoff = random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+        if isinstance(error, openai.RateLimitError):
+            retry_after = error.response.headers.get('retry-after')
+            try:
+                delay = float(retry_after) if retry_after else backoff
+            except ValueError:
+                delay = backoff
+            # Everyone backs off together, otherwise the other jobs keep hitting the limit
+            with self.lock:
+                self.paused_until = max(
+                    self.paused_until, time.monotonic() + delay)
+            return delay
+        if isinstance(error, openai.APIStatusError) and error.status_code >= 500:
+            return backoff
+        if isinstance(error, openai.APIConnectionError):
+            return backoff
+        return None
+
+    async def run(self, job_id: str, estimated_tokens: int, request):
+        """Runs `await request()` once capacity is available, retrying transient failures"""
+        attempt = 0
+        while True:
+            reservation = await self.acquire(job_id, estimated_tokens)
+            try:
+                response = await request()
+            except Exception as e:
+                self.release(job_id, reservation)
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logging.warning(
+                    f"""LLM request for {job_id} failed ({e}), retry {attempt}/{self.max_retries} in {delay:.1f} seconds""")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, 'usage', None)
+            self.release(job_id, reservation,
+                         usage.total_tokens if usage else None)
+            return response
+
+
+_llm_scheduler = None
+_llm_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    global _llm_scheduler
+    with _llm_scheduler_lock:
+        if _llm_scheduler is None:
+            _llm_scheduler = LLMScheduler(
+                max_concurrency=int(
+                    os.environ.get('PROOFREAD_MAX_CONCURRENCY', 8)),
+                tokens_per_minute=int(
+                    os.environ.get('PROOFREAD_TOKENS_PER_MINUTE', 0)),
+                max_retries=int(os.environ.get('PROOFREAD_MAX_RETRIES', 5)))
+        return _llm_scheduler
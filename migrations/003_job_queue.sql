@@ -0,0 +1,52 @@
+-- Migration 003: Job queue
+-- Version: 003_job_queue
+-- Description: Add jobs table claimed by worker processes with SELECT ... FOR UPDATE SKIP LOCKED
+
+-- Check if migration already applied
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM migrations WHERE version = '003_job_queue') THEN
+        RAISE NOTICE 'Migration 003_job_queue already applied, skipping...';
+        RETURN;
+    END IF;
+
+    -- Start migration
+    RAISE NOTICE 'Applying migration 003_job_queue...';
+
+    CREATE TABLE jobs (
+        id SERIAL PRIMARY KEY,
+        transcription_id UUID REFERENCES transcriptions(id) ON DELETE CASCADE,
+        job_type TEXT NOT NULL,
+        payload JSONB DEFAULT '{}'::jsonb,
+        status TEXT DEFAULT 'queued',
+        attempts INTEGER DEFAULT 0,
+        max_attempts INTEGER DEFAULT 3,
+        run_after TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        locked_by TEXT,
+        locked_at TIMESTAMP WITH TIME ZONE,
+        heartbeat_at TIMESTAMP WITH TIME ZONE,
+        last_error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+
+    -- Partial index so claiming only scans runnable jobs
+    CREATE INDEX idx_jobs_queued ON jobs(job_type, run_after, id) WHERE status = 'queued';
+    CREATE INDEX idx_jobs_running_heartbeat ON jobs(heartbeat_at) WHERE status = 'running';
+    CREATE INDEX idx_jobs_transcription_id ON jobs(transcription_id);
+
+    CREATE TRIGGER update_jobs_modtime
+    BEFORE UPDATE ON jobs
+    FOR EACH ROW
+    EXECUTE FUNCTION update_modified_column();
+
+    -- Record migration as applied
+    INSERT INTO migrations (version, description, checksum) 
+    VALUES ('003_job_queue', 'Add jobs table for the durable job queue', MD5('003_job_queue_content'));
+
+    RAISE NOTICE 'Migration 003_job_queue completed successfully.';
+
+EXCEPTION 
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Migration 003_job_queue failed: %', SQLERRM;
+END $$;
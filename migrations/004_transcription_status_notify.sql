@@ -0,0 +1,39 @@
+-- Migration 004: Transcription status notifications
+-- Version: 004_transcription_status_notify
+-- Description: NOTIFY on the transcription_status channel whenever transcriptions.status changes
+
+-- Check if migration already applied
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM migrations WHERE version = '004_transcription_status_notify') THEN
+        RAISE NOTICE 'Migration 004_transcription_status_notify already applied, skipping...';
+        RETURN;
+    END IF;
+
+    -- Start migration
+    RAISE NOTICE 'Applying migration 004_transcription_status_notify...';
+
+    CREATE OR REPLACE FUNCTION notify_transcription_status()
+    RETURNS TRIGGER AS $fn$
+    BEGIN
+        PERFORM pg_notify('transcription_status', NEW.id::text || ':' || COALESCE(NEW.status, ''));
+        RETURN NEW;
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER notify_transcriptions_status
+    AFTER UPDATE OF status ON transcriptions
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status)
+    EXECUTE FUNCTION notify_transcription_status();
+
+    -- Record migration as applied
+    INSERT INTO migrations (version, description, checksum) 
+    VALUES ('004_transcription_status_notify', 'Notify listeners when a transcription status changes', MD5('004_transcription_status_notify_content'));
+
+    RAISE NOTICE 'Migration 004_transcription_status_notify completed successfully.';
+
+EXCEPTION 
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Migration 004_transcription_status_notify failed: %', SQLERRM;
+END $$;
@@ -0,0 +1,28 @@
+-- Migration 005: Proofread progress
+-- Version: 005_proofread_progress
+-- Description: Track how many proofreading chunks of a transcription are done out of the total
+
+-- Check if migration already applied
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM migrations WHERE version = '005_proofread_progress') THEN
+        RAISE NOTICE 'Migration 005_proofread_progress already applied, skipping...';
+        RETURN;
+    END IF;
+
+    -- Start migration
+    RAISE NOTICE 'Applying migration 005_proofread_progress...';
+
+    ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS proofread_chunks_done INTEGER;
+    ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS proofread_chunks_total INTEGER;
+
+    -- Record migration as applied
+    INSERT INTO migrations (version, description, checksum) 
+    VALUES ('005_proofread_progress', 'Add proofread chunk progress columns to transcriptions', MD5('005_proofread_progress_content'));
+
+    RAISE NOTICE 'Migration 005_proofread_progress completed successfully.';
+
+EXCEPTION 
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Migration 005_proofread_progress failed: %', SQLERRM;
+END $$;
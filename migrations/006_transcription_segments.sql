@@ -0,0 +1,30 @@
+-- Migration 006: Transcription segments
+-- Version: 006_transcription_segments
+-- Description: Let a transcription be split into child segment transcriptions that are transcribed in parallel
+
+-- Check if migration already applied
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM migrations WHERE version = '006_transcription_segments') THEN
+        RAISE NOTICE 'Migration 006_transcription_segments already applied, skipping...';
+        RETURN;
+    END IF;
+
+    -- Start migration
+    RAISE NOTICE 'Applying migration 006_transcription_segments...';
+
+    ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS parent_id UUID REFERENCES transcriptions(id) ON DELETE CASCADE;
+    ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS segment_index INTEGER;
+
+    CREATE INDEX IF NOT EXISTS idx_transcriptions_parent_id ON transcriptions(parent_id, segment_index) WHERE parent_id IS NOT NULL;
+
+    -- Record migration as applied
+    INSERT INTO migrations (version, description, checksum) 
+    VALUES ('006_transcription_segments', 'Add parent_id and segment_index to transcriptions for segmented transcription', MD5('006_transcription_segments_content'));
+
+    RAISE NOTICE 'Migration 006_transcription_segments completed successfully.';
+
+EXCEPTION 
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Migration 006_transcription_segments failed: %', SQLERRM;
+END $$;
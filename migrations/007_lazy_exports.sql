@@ -0,0 +1,33 @@
+-- Migration 007: Lazy exports
+-- Version: 007_lazy_exports
+-- Description: Retire the convert stage; Word and other exports are rendered on first download
+
+-- Check if migration already applied
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM migrations WHERE version = '007_lazy_exports') THEN
+        RAISE NOTICE 'Migration 007_lazy_exports already applied, skipping...';
+        RETURN;
+    END IF;
+
+    -- Start migration
+    RAISE NOTICE 'Applying migration 007_lazy_exports...';
+
+    -- No worker claims convert jobs anymore
+    UPDATE jobs SET status = 'done', updated_at = CURRENT_TIMESTAMP
+    WHERE job_type = 'convert' AND status IN ('queued', 'running');
+
+    -- Proofread transcriptions waiting on conversion are complete
+    UPDATE transcriptions SET status = 'completed'
+    WHERE status = 'converting' AND md_document_path IS NOT NULL;
+
+    -- Record migration as applied
+    INSERT INTO migrations (version, description, checksum) 
+    VALUES ('007_lazy_exports', 'Finish pending convert jobs now that exports are rendered on demand', MD5('007_lazy_exports_content'));
+
+    RAISE NOTICE 'Migration 007_lazy_exports completed successfully.';
+
+EXCEPTION 
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Migration 007_lazy_exports failed: %', SQLERRM;
+END $$;
@@ -0,0 +1,30 @@
+-- Migration 008: Transcription listing indexes
+-- Version: 008_transcription_listing_indexes
+-- Description: Indexes for keyset pagination of transcription listings on (created_at, id)
+
+-- Check if migration already applied
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM migrations WHERE version = '008_transcription_listing_indexes') THEN
+        RAISE NOTICE 'Migration 008_transcription_listing_indexes already applied, skipping...';
+        RETURN;
+    END IF;
+
+    -- Start migration
+    RAISE NOTICE 'Applying migration 008_transcription_listing_indexes...';
+
+    -- Listings only show top-level transcriptions, never segments
+    CREATE INDEX IF NOT EXISTS idx_transcriptions_listing ON transcriptions(created_at DESC, id DESC) WHERE parent_id IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_transcriptions_user_listing ON transcriptions(user_id, created_at DESC, id DESC) WHERE parent_id IS NULL;
+    CREATE INDEX IF NOT EXISTS idx_transcriptions_status_listing ON transcriptions(status, created_at DESC, id DESC) WHERE parent_id IS NULL;
+
+    -- Record migration as applied
+    INSERT INTO migrations (version, description, checksum) 
+    VALUES ('008_transcription_listing_indexes', 'Add (created_at, id) keyset indexes for transcription listings', MD5('008_transcription_listing_indexes_content'));
+
+    RAISE NOTICE 'Migration 008_transcription_listing_indexes completed successfully.';
+
+EXCEPTION 
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Migration 008_transcription_listing_indexes failed: %', SQLERRM;
+END $$;
@@ -0,0 +1,253 @@
+-- Migration 009: Stats summary tables
+-- Version: 009_stats_summary
+-- Description: Counters, per-status counts, job buckets and status duration histograms appended to by triggers and folded by the worker
+
+-- Check if migration already applied
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM migrations WHERE version = '009_stats_summary') THEN
+        RAISE NOTICE 'Migration 009_stats_summary already applied, skipping...';
+        RETURN;
+    END IF;
+
+    -- Start migration
+    RAISE NOTICE 'Applying migration 009_stats_summary...';
+
+    ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP WITH TIME ZONE;
+    ALTER TABLE transcriptions ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP WITH TIME ZONE;
+
+    -- Stats summary tables read by GET /admin/stats, kept up to date by the triggers below.
+    -- The triggers only append delta rows and never update one, so concurrent transactions never wait
+    -- on each other's counters (nor deadlock taking them in different orders). fold_stats(), run by the
+    -- worker, periodically sums the deltas back into one row per key; readers sum whatever is there.
+
+    -- Totals (users, transcriptions, error_logs)
+    CREATE TABLE IF NOT EXISTS stats_counters (
+        id BIGSERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        value BIGINT NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_stats_counters_name ON stats_counters(name);
+
+    -- Number of transcriptions currently in each status
+    CREATE TABLE IF NOT EXISTS stats_status_counts (
+        id BIGSERIAL PRIMARY KEY,
+        status TEXT NOT NULL,
+        count BIGINT NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_stats_status_counts_status ON stats_status_counts(status);
+
+    -- Jobs created, done and failed per stage and hour/day (UTC)
+    CREATE TABLE IF NOT EXISTS stats_job_buckets (
+        id BIGSERIAL PRIMARY KEY,
+        granularity TEXT NOT NULL,
+        bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+        job_type TEXT NOT NULL,
+        created BIGINT NOT NULL DEFAULT 0,
+        done BIGINT NOT NULL DEFAULT 0,
+        failed BIGINT NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_stats_job_buckets_bucket ON stats_job_buckets(granularity, bucket_start, job_type);
+
+    -- Histogram of the time transcriptions spent in each status ('total' is submission to first completion).
+    -- Bucket b holds durations from 2^(b/4) up to 2^((b+1)/4) seconds, see stats.py
+    CREATE TABLE IF NOT EXISTS stats_status_durations (
+        id BIGSERIAL PRIMARY KEY,
+        status TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        count BIGINT NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_stats_status_durations_status ON stats_status_durations(status, bucket);
+
+    CREATE OR REPLACE FUNCTION bump_stats_counter(counter_name TEXT, delta BIGINT)
+    RETURNS VOID AS $fn$
+    BEGIN
+        INSERT INTO stats_counters (name, value) VALUES (counter_name, delta);
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION bump_stats_status_count(counted_status TEXT, delta BIGINT)
+    RETURNS VOID AS $fn$
+    BEGIN
+        INSERT INTO stats_status_counts (status, count) VALUES (COALESCE(counted_status, 'unknown'), delta);
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION record_stats_duration(counted_status TEXT, duration INTERVAL)
+    RETURNS VOID AS $fn$
+    BEGIN
+        INSERT INTO stats_status_durations (status, bucket, count)
+        VALUES (COALESCE(counted_status, 'unknown'),
+                FLOOR(LN(GREATEST(EXTRACT(EPOCH FROM duration)::DOUBLE PRECISION, 1.0)) / LN(2.0) * 4)::INTEGER, 1);
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    -- Sums the delta rows into one row per key. Returns false without waiting when another session is
+    -- already folding. Rows appended while it runs are not visible to it and are left for the next fold.
+    CREATE OR REPLACE FUNCTION fold_stats()
+    RETURNS BOOLEAN AS $fn$
+    BEGIN
+        IF NOT pg_try_advisory_xact_lock(hashtext('fold_stats')) THEN
+            RETURN FALSE;
+        END IF;
+
+        WITH folded AS (DELETE FROM stats_counters RETURNING name, value)
+        INSERT INTO stats_counters (name, value)
+        SELECT name, SUM(value) FROM folded GROUP BY name;
+
+        WITH folded AS (DELETE FROM stats_status_counts RETURNING status, count)
+        INSERT INTO stats_status_counts (status, count)
+        SELECT status, SUM(count) FROM folded GROUP BY status HAVING SUM(count) <> 0;
+
+        WITH folded AS (DELETE FROM stats_job_buckets RETURNING granularity, bucket_start, job_type, created, done, failed)
+        INSERT INTO stats_job_buckets (granularity, bucket_start, job_type, created, done, failed)
+        SELECT granularity, bucket_start, job_type, SUM(created), SUM(done), SUM(failed)
+        FROM folded GROUP BY granularity, bucket_start, job_type;
+
+        WITH folded AS (DELETE FROM stats_status_durations RETURNING status, bucket, count)
+        INSERT INTO stats_status_durations (status, bucket, count)
+        SELECT status, bucket, SUM(count) FROM folded GROUP BY status, bucket;
+
+        RETURN TRUE;
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    -- Counts inserted and deleted rows in the stats counter named by the trigger argument
+    CREATE OR REPLACE FUNCTION count_stats_rows()
+    RETURNS TRIGGER AS $fn$
+    BEGIN
+        PERFORM bump_stats_counter(TG_ARGV[0], CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END);
+        RETURN NULL;
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION set_transcription_status_changed_at()
+    RETURNS TRIGGER AS $fn$
+    BEGIN
+        IF TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status THEN
+            -- Wall clock rather than transaction start, so long transactions do not skew durations
+            NEW.status_changed_at = clock_timestamp();
+        END IF;
+        -- Kept when a resumed transcription completes again, so it is only timed once
+        IF NEW.status = 'completed' AND NEW.completed_at IS NULL THEN
+            NEW.completed_at = NEW.status_changed_at;
+        END IF;
+        RETURN NEW;
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    -- Segments of a split recording are internal and not counted
+    CREATE OR REPLACE FUNCTION count_transcription_stats()
+    RETURNS TRIGGER AS $fn$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+            RETURN NULL;
+        END IF;
+
+        IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.parent_id IS NULL THEN
+            PERFORM bump_stats_status_count(OLD.status, -1);
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.parent_id IS NULL THEN
+            PERFORM bump_stats_status_count(NEW.status, 1);
+        END IF;
+
+        IF TG_OP = 'INSERT' AND NEW.parent_id IS NULL THEN
+            PERFORM bump_stats_counter('transcriptions', 1);
+        ELSIF TG_OP = 'DELETE' AND OLD.parent_id IS NULL THEN
+            PERFORM bump_stats_counter('transcriptions', -1);
+        ELSIF TG_OP = 'UPDATE' AND NEW.parent_id IS NULL THEN
+            IF OLD.status_changed_at IS NOT NULL THEN
+                PERFORM record_stats_duration(OLD.status, NEW.status_changed_at - OLD.status_changed_at);
+            END IF;
+            IF OLD.completed_at IS NULL AND NEW.completed_at IS NOT NULL AND NEW.created_at IS NOT NULL THEN
+                PERFORM record_stats_duration('total', NEW.completed_at - NEW.created_at);
+            END IF;
+        END IF;
+        RETURN NULL;
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION count_job_stats()
+    RETURNS TRIGGER AS $fn$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND (OLD.status IS NOT DISTINCT FROM NEW.status OR NEW.status NOT IN ('done', 'failed')) THEN
+            RETURN NULL;
+        END IF;
+
+        INSERT INTO stats_job_buckets (granularity, bucket_start, job_type, created, done, failed)
+        SELECT g.granularity, date_trunc(g.granularity, clock_timestamp(), 'UTC'), NEW.job_type,
+               CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE 0 END,
+               CASE WHEN TG_OP = 'UPDATE' AND NEW.status = 'done' THEN 1 ELSE 0 END,
+               CASE WHEN TG_OP = 'UPDATE' AND NEW.status = 'failed' THEN 1 ELSE 0 END
+        FROM (VALUES ('hour'), ('day')) AS g(granularity);
+        RETURN NULL;
+    END;
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER count_users_stats
+    AFTER INSERT OR DELETE ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION count_stats_rows('users');
+
+    CREATE TRIGGER count_error_logs_stats
+    AFTER INSERT OR DELETE ON error_logs
+    FOR EACH ROW
+    EXECUTE FUNCTION count_stats_rows('error_logs');
+
+    CREATE TRIGGER set_transcriptions_status_changed_at
+    BEFORE INSERT OR UPDATE OF status ON transcriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION set_transcription_status_changed_at();
+
+    CREATE TRIGGER count_transcriptions_stats
+    AFTER INSERT OR DELETE OR UPDATE OF status ON transcriptions
+    FOR EACH ROW
+    EXECUTE FUNCTION count_transcription_stats();
+
+    CREATE TRIGGER count_jobs_stats
+    AFTER INSERT OR UPDATE OF status ON jobs
+    FOR EACH ROW
+    EXECUTE FUNCTION count_job_stats();
+
+    -- Keep writers out while the counters are seeded from the current rows
+    LOCK TABLE users, transcriptions, error_logs, jobs IN SHARE ROW EXCLUSIVE MODE;
+
+    INSERT INTO stats_counters (name, value)
+    SELECT 'users', COUNT(*) FROM users
+    UNION ALL SELECT 'transcriptions', COUNT(*) FROM transcriptions WHERE parent_id IS NULL
+    UNION ALL SELECT 'error_logs', COUNT(*) FROM error_logs;
+
+    INSERT INTO stats_status_counts (status, count)
+    SELECT COALESCE(status, 'unknown'), COUNT(*) FROM transcriptions WHERE parent_id IS NULL GROUP BY 1;
+
+    -- Past jobs count as created when queued and as finished at their last update
+    INSERT INTO stats_job_buckets (granularity, bucket_start, job_type, created, done, failed)
+    SELECT granularity, bucket_start, job_type, SUM(created), SUM(done), SUM(failed)
+    FROM (
+        SELECT g.granularity, date_trunc(g.granularity, j.created_at, 'UTC') AS bucket_start, j.job_type,
+               1 AS created, 0 AS done, 0 AS failed
+        FROM jobs j CROSS JOIN (VALUES ('hour'), ('day')) AS g(granularity)
+        UNION ALL
+        SELECT g.granularity, date_trunc(g.granularity, j.updated_at, 'UTC'), j.job_type,
+               0, CASE WHEN j.status = 'done' THEN 1 ELSE 0 END, CASE WHEN j.status = 'failed' THEN 1 ELSE 0 END
+        FROM jobs j CROSS JOIN (VALUES ('hour'), ('day')) AS g(granularity)
+        WHERE j.status IN ('done', 'failed')
+    ) AS job_events
+    GROUP BY granularity, bucket_start, job_type;
+
+    -- Transcriptions completed before this migration are not timed again when resumed. Backfilling
+    -- must not touch updated_at.
+    ALTER TABLE transcriptions DISABLE TRIGGER update_transcriptions_modtime;
+    UPDATE transcriptions SET completed_at = updated_at WHERE status = 'completed' AND completed_at IS NULL;
+    ALTER TABLE transcriptions ENABLE TRIGGER update_transcriptions_modtime;
+
+    -- Record migration as applied
+    INSERT INTO migrations (version, description, checksum) 
+    VALUES ('009_stats_summary', 'Add trigger-maintained stats summary tables and transcriptions.status_changed_at/completed_at', MD5('009_stats_summary_content'));
+
+    RAISE NOTICE 'Migration 009_stats_summary completed successfully.';
+
+EXCEPTION 
+    WHEN OTHERS THEN
+        RAISE EXCEPTION 'Migration 009_stats_summary failed: %', SQLERRM;
+END $$;
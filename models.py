@@ -1,5 +1,8 @@
+import datetime
+from typing import Optional
 from uuid import uuid4
 from sqlalchemy import UUID
+from sqlalchemy.dialects.postgresql import JSONB
 from database import db
 
 class User(db.Model):
@@ -12,13 +15,17 @@ class User(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp())
     transcriptions = db.relationship('Transcription', back_populates='user')
 
-    def to_dict(self):
+    def to_dict(self, transcription_count: Optional[int] = None):
+        """Listings pass transcription_count from one grouped query instead of counting per user"""
+        if transcription_count is None:
+            transcription_count = Transcription.query.filter_by(
+                user_id=self.id, parent_id=None).count()
         return {
             'id': self.id,
             'username': self.username,
             'is_admin': self.is_admin,
             'created_at': self.created_at.isoformat(),
-            'transcription_count': len(self.transcriptions)
+            'transcription_count': transcription_count
         }
 
 class Transcription(db.Model):
@@ -26,6 +33,9 @@ class Transcription(db.Model):
 
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid4)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    # Set on the segments a long recording is split into for parallel transcription
+    parent_id = db.Column(UUID(as_uuid=True), db.ForeignKey('transcriptions.id', ondelete='CASCADE'))
+    segment_index = db.Column(db.Integer)
     audio_file_path = db.Column(db.Text)
     google_drive_url = db.Column(db.Text)
     txt_document_path = db.Column(db.Text)
@@ -35,27 +45,35 @@ class Transcription(db.Model):
     transcribe_prompt = db.Column(db.Text)
     proofread_prompt = db.Column(db.Text)
     inference_duration = db.Column(db.Integer)
+    proofread_chunks_done = db.Column(db.Integer)
+    proofread_chunks_total = db.Column(db.Integer)
+    # Set by a database trigger whenever the status changes
+    status_changed_at = db.Column(db.DateTime(timezone=True))
+    completed_at = db.Column(db.DateTime(timezone=True))
     created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp())
     updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
     user = db.relationship('User', back_populates='transcriptions')
-
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'audio_file_path': self.audio_file_path,
-            'google_drive_url': self.google_drive_url,
-            'txt_document_path': self.txt_document_path,
-            'md_document_path': self.md_document_path,
-            'word_document_path': self.word_document_path,
-            'status': self.status,
-            'transcribe_prompt': self.transcribe_prompt,
-            'proofread_prompt': self.proofread_prompt,
-            'inference_duration': self.inference_duration,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'username': self.user.username
-        }
+    parent = db.relationship('Transcription', remote_side=[id], backref=db.backref(
+        'segments', order_by=segment_index, passive_deletes=True))
+
+    # Keys of to_dict, in order; all but the username are columns
+    DICT_FIELDS = ('id', 'user_id', 'parent_id', 'segment_index', 'audio_file_path', 'google_drive_url',
+                   'txt_document_path', 'md_document_path', 'word_document_path', 'status',
+                   'transcribe_prompt', 'proofread_prompt', 'inference_duration', 'proofread_chunks_done',
+                   'proofread_chunks_total', 'status_changed_at', 'completed_at', 'created_at', 'updated_at',
+                   'username')
+
+    def to_dict(self, username: Optional[str] = None, fields: Optional[list[str]] = None):
+        """Listings pass the username they joined in, so serializing does not load each user, and
+        may limit the keys to `fields`, so columns they did not load are not fetched row by row"""
+        result = {}
+        for field in fields or self.DICT_FIELDS:
+            if field == 'username':
+                result[field] = username if username is not None else (self.user.username if self.user else None)
+                continue
+            value = getattr(self, field)
+            result[field] = value.isoformat() if isinstance(value, datetime.datetime) else value
+        return result
 
 class ErrorLog(db.Model):
     __tablename__ = 'error_logs'
@@ -130,3 +148,75 @@ class SystemSetting(db.Model):
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    transcription_id = db.Column(UUID(as_uuid=True), db.ForeignKey('transcriptions.id', ondelete='CASCADE'))
+    job_type = db.Column(db.Text, nullable=False)
+    payload = db.Column(JSONB, default=dict)
+    status = db.Column(db.Text, default='queued')
+    attempts = db.Column(db.Integer, default=0)
+    max_attempts = db.Column(db.Integer, default=3)
+    run_after = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp())
+    locked_by = db.Column(db.Text)
+    locked_at = db.Column(db.DateTime(timezone=True))
+    heartbeat_at = db.Column(db.DateTime(timezone=True))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp())
+    updated_at = db.Column(db.DateTime(timezone=True), server_default=db.func.current_timestamp(), onupdate=db.func.current_timestamp())
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'transcription_id': self.transcription_id,
+            'job_type': self.job_type,
+            'payload': self.payload,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.isoformat() if self.run_after else None,
+            'locked_by': self.locked_by,
+            'locked_at': self.locked_at.isoformat() if self.locked_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat(),
+            'updated_at': self.updated_at.isoformat()
+        }
+
+
+# Stats summary tables. Database triggers append delta rows and the worker folds them (see
+# migrations/009_stats_summary.sql), so a key can have several rows that readers sum.
+class StatsCounter(db.Model):
+    __tablename__ = 'stats_counters'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    name = db.Column(db.Text, nullable=False)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+
+class StatsStatusCount(db.Model):
+    __tablename__ = 'stats_status_counts'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    status = db.Column(db.Text, nullable=False)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+
+class StatsJobBucket(db.Model):
+    __tablename__ = 'stats_job_buckets'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    granularity = db.Column(db.Text, nullable=False)
+    bucket_start = db.Column(db.DateTime(timezone=True), nullable=False)
+    job_type = db.Column(db.Text, nullable=False)
+    created = db.Column(db.BigInteger, nullable=False, default=0)
+    done = db.Column(db.BigInteger, nullable=False, default=0)
+    failed = db.Column(db.BigInteger, nullable=False, default=0)
+
+class StatsStatusDuration(db.Model):
+    __tablename__ = 'stats_status_durations'
+
+    id = db.Column(db.BigInteger, primary_key=True)
+    status = db.Column(db.Text, nullable=False)
+    bucket = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
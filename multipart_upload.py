@@ -0,0 +1,82 @@
+import io
+import os
+import uuid
+from typing import Optional
+
+
+class MultipartFileBody(io.RawIOBase):
+    """multipart/form-data body that reads the file from disk as it is sent. It knows its total
+    length, so requests sends a Content-Length header and streams the body in small blocks instead
+    of building the whole payload in memory the way `files=` does."""
+
+    def __init__(self, fields: dict, file_field: str, file_path: str, content_type: str,
+                 file_name: Optional[str] = None):
+        self.file_path = file_path
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"""multipart/form-data; boundary={self.boundary}"""
+
+        preamble = b''.join(
+            f"""--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n""".encode('utf-8')
+            for name, value in fields.items())
+        preamble += (f"""--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; """
+                     f"""filename="{file_name or os.path.basename(file_path)}"\r\n"""
+                     f"""Content-Type: {content_type}\r\n\r\n""").encode('utf-8')
+        self.preamble = preamble
+        self.epilogue = f"""\r\n--{self.boundary}--\r\n""".encode('utf-8')
+        self.file_size = os.path.getsize(file_path)
+
+        self.file = None
+        self.position = 0
+
+    def __len__(self) -> int:
+        return len(self.preamble) + self.file_size + len(self.epilogue)
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = len(self) - self.position
+
+        chunks = []
+        while size > 0 and self.position < len(self):
+            if self.position < len(self.preamble):
+                chunk = self.preamble[self.position:self.position + size]
+            elif self.position < len(self.preamble) + self.file_size:
+                if self.file is None:
+                    self.file = open(self.file_path, 'rb')
+                self.file.seek(self.position - len(self.preamble))
+                chunk = self.file.read(
+                    min(size, len(self.preamble) + self.file_size - self.position))
+                if not chunk:
+                    raise IOError(
+                        f"""{self.file_path} shrank while it was being uploaded""")
+            else:
+                offset = self.position - len(self.preamble) - self.file_size
+                chunk = self.epilogue[offset:offset + size]
+            chunks.append(chunk)
+            self.position += len(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # requests rewinds the body on redirects and reads the remaining length with tell()
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        else:
+            self.position = len(self) + offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        super().close()
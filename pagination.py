@@ -0,0 +1,104 @@
+import base64
+import datetime
+import json
+import os
+import uuid
+from typing import Optional
+
+from sqlalchemy import tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import load_only
+
+from models import Transcription
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('LISTING_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('LISTING_MAX_PAGE_SIZE', 500))
+
+
+def encode_cursor(transcription: Transcription) -> str:
+    """Opaque cursor pointing just past the given row in (created_at, id) order"""
+    position = json.dumps([transcription.created_at.isoformat(), str(transcription.id)])
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime.datetime, uuid.UUID]:
+    try:
+        created_at, transcription_id = json.loads(
+            base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(transcription_id)
+    except (ValueError, TypeError, AttributeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_timestamp(value: str, name: str) -> datetime.datetime:
+    """ISO 8601 date or date-time; without a timezone it is taken as UTC"""
+    try:
+        timestamp = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"""Invalid {name}, expected an ISO 8601 date or date-time""")
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
+
+
+def filter_transcriptions(query, args):
+    """Applies the `status` (comma separated), `created_after` (inclusive) and `created_before`
+    (exclusive) query string filters"""
+    if args.get('status'):
+        query = query.filter(Transcription.status.in_(
+            [status.strip() for status in args['status'].split(',') if status.strip()]))
+    if args.get('created_after'):
+        query = query.filter(Transcription.created_at >= parse_timestamp(
+            args['created_after'], 'created_after'))
+    if args.get('created_before'):
+        query = query.filter(Transcription.created_at < parse_timestamp(
+            args['created_before'], 'created_before'))
+    return query
+
+
+def paginate_transcriptions(query, args, allow_all: bool = False) -> tuple[list, Optional[str]]:
+    """Returns a page of rows newest first, `limit` (default LISTING_PAGE_SIZE) long, and the cursor
+    of the next page (None on the last page). Where allow_all is set, `limit=all` opts out of paging
+    and returns every row. Pages are found by keyset on (created_at, id), so deep pages cost as little
+    as the first one. The query may select columns next to the transcription, e.g. a joined username."""
+    query = query.order_by(Transcription.created_at.desc(), Transcription.id.desc())
+    if allow_all and args.get('limit') == 'all' and not args.get('cursor'):
+        return query.all(), None
+
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("Invalid limit")
+    if limit < 1:
+        raise ValueError("Invalid limit")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    if args.get('cursor'):
+        query = query.filter(tuple_(Transcription.created_at, Transcription.id) < tuple_(
+            *decode_cursor(args['cursor'])))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        return rows[:limit], encode_cursor(last[0] if isinstance(last, Row) else last)
+    return rows, None
+
+
+def requested_fields(args, field_columns: dict) -> list[str]:
+    """The comma separated `fields` of the query string, or every field when it is not given.
+    Unknown fields are rejected whether or not there are rows to return."""
+    if not args.get('fields'):
+        return list(field_columns)
+    fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+    unknown_fields = [field for field in fields if field not in field_columns]
+    if unknown_fields:
+        raise ValueError(f"""Unknown fields: {', '.join(unknown_fields)}""")
+    return fields
+
+
+def load_fields(query, fields: list[str], field_columns: dict):
+    """Loads only the transcription columns the fields are built from, plus the keyset columns"""
+    columns = {column.key: column for column in [Transcription.id, Transcription.created_at]}
+    for field in fields:
+        columns.update({column.key: column for column in field_columns[field]})
+    return query.options(load_only(*columns.values()))
@@ -1,23 +1,235 @@
+import atexit
+import base64
 import logging
+import os
+import signal
+import socket
+import subprocess
+import threading
+import time
 from typing import Optional
+
 import pypandoc
+import requests
+
+
+# Formats the server cannot produce (PDF needs an external engine), always run as a pandoc process
+PROCESS_ONLY_FORMATS = {'pdf'}
+
+
+class PandocServer:
+    """A long-running `pandoc server` shared by the whole process. It converts over HTTP with a
+    keep-alive session, so documents do not pay pandoc's process startup one by one. Uses
+    PANDOC_SERVER_URL when set, otherwise starts `pandoc server` on a free local port."""
+
+    def __init__(self, url: Optional[str], autostart: bool, request_timeout: float = 120.0, startup_timeout: float = 10.0,
+                 retry_seconds: float = 60.0):
+        self.url = url.rstrip('/') if url else None
+        self.autostart = autostart and not url
+        # pandoc server aborts conversions after 2 seconds unless told otherwise
+        self.request_timeout = request_timeout
+        self.startup_timeout = startup_timeout
+        self.retry_seconds = retry_seconds
+        self.session = requests.Session()
+        self.process = None
+        self.lock = threading.Lock()
+        # When starting the server may be tried again after a failed start, so conversions in
+        # between do not each retry it
+        self.retry_after = 0.0
+        self.resources = {}
+
+    def _healthy(self) -> bool:
+        try:
+            return self.session.get(f"""{self.url}/version""", timeout=2).ok
+        except requests.RequestException:
+            return False
+
+    def _start(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        self.process = subprocess.Popen([pypandoc.get_pandoc_path(), 'server', '--port', str(port),
+                                         '--timeout', str(int(self.request_timeout))],
+                                        stdout=subprocess.DEVNULL)
+        self.url = f"""http://127.0.0.1:{port}"""
+
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                break
+            if self._healthy():
+                logging.info(f"""Started pandoc server on port {port}""")
+                return
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError("pandoc server did not start")
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+        self.process = None
+
+    def ensure_running(self) -> bool:
+        """Returns True when the server can take requests, (re)starting it if needed"""
+        with self.lock:
+            if time.monotonic() < self.retry_after:
+                return False
+            if not self.autostart:
+                return bool(self.url)
+            if self.process and self.process.poll() is None:
+                return True
+            try:
+                self._start()
+                return True
+            except Exception as e:
+                logging.warning(
+                    f"""pandoc server unavailable, converting with a pandoc process per document for {self.retry_seconds:.0f} seconds: {e}""")
+                self.retry_after = time.monotonic() + self.retry_seconds
+                return False
+
+    def resource(self, file_path: str) -> str:
+        """Base64 contents of a resource such as the reference doc, read once per modification"""
+        key = (file_path, os.path.getmtime(file_path))
+        if key not in self.resources:
+            with open(file_path, 'rb') as f:
+                self.resources = {key: base64.b64encode(
+                    f.read()).decode('ascii'), **self.resources}
+        return self.resources[key]
+
+    def post(self, path: str, body) -> requests.Response:
+        # A little longer than the server's own timeout, so its error response arrives first
+        response = self.session.post(f"""{self.url}{path}""", json=body,
+                                     headers={'Accept': 'application/json'}, timeout=self.request_timeout + 10)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"""pandoc server error {response.status_code}: {response.text}""")
+        return response
+
+
+_pandoc_server = None
+_pandoc_server_lock = threading.Lock()
+
+
+def get_pandoc_server() -> PandocServer:
+    global _pandoc_server
+    with _pandoc_server_lock:
+        if _pandoc_server is None:
+            _pandoc_server = PandocServer(
+                url=os.environ.get('PANDOC_SERVER_URL'),
+                autostart=os.environ.get('PANDOC_SERVER_AUTOSTART', 'true').lower() == 'true',
+                request_timeout=float(os.environ.get('PANDOC_SERVER_TIMEOUT_SECONDS', 120)),
+                retry_seconds=float(os.environ.get('PANDOC_SERVER_RETRY_SECONDS', 60)))
+            atexit.register(_pandoc_server.stop)
+        return _pandoc_server
 
 
 class PandocService:
-    def convert_to_docx(self, input_file: str, output_file: str, reference_doc: str) -> tuple[bool, str, Optional[str]]:
-        """Returns (success, output_path, error_message)"""
+    def __init__(self):
+        self.server = get_pandoc_server()
+        self.process_timeout = float(
+            os.environ.get('PANDOC_PROCESS_TIMEOUT_SECONDS', 120))
+
+    def _request(self, input_file: str, to: str, reference_doc: Optional[str], standalone: bool = False) -> dict:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            options = {'text': f.read(), 'from': 'markdown',
+                       'to': to, 'standalone': standalone}
+        if reference_doc:
+            # The server has no file system access; resources travel with the request
+            options['files'] = {os.path.basename(
+                reference_doc): self.server.resource(reference_doc)}
+            options['reference-doc'] = os.path.basename(reference_doc)
+        return options
+
+    @staticmethod
+    def _write_result(result: dict, output_file: str):
+        if result.get('error'):
+            raise RuntimeError(f"""pandoc server error: {result['error']}""")
+        output = result['output']
+        partial_path = f"""{output_file}.part"""
+        if result.get('base64'):
+            with open(partial_path, 'wb') as f:
+                f.write(base64.b64decode(output))
+        else:
+            with open(partial_path, 'w', encoding='utf-8') as f:
+                f.write(output)
+        os.replace(partial_path, output_file)
+
+    def _convert_with_process(self, input_file: str, output_file: str, to: str, reference_doc: Optional[str], standalone: bool = False):
+        extra_args = ['--reference-doc=' + reference_doc] if reference_doc else []
+        if standalone:
+            extra_args.append('--standalone')
+        if to == 'pdf' and os.environ.get('PANDOC_PDF_ENGINE'):
+            extra_args.append(
+                '--pdf-engine=' + os.environ.get('PANDOC_PDF_ENGINE'))
+        # Own process group, so a timeout also stops the PDF engine pandoc started
+        process = subprocess.Popen([pypandoc.get_pandoc_path(), '--from=markdown', '--to=' + to, input_file,
+                                    '--output=' + output_file, *extra_args],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True)
         try:
-            with open(input_file, 'r', encoding='utf-8') as f:
-                input_text = f.read()
-            
-            pypandoc.convert_text(
-                input_text,
-                'docx',
-                format='markdown',
-                outputfile=output_file,
-                extra_args=['--reference-doc=' + reference_doc]
-            )
-            return True, output_file, None
+            _, stderr = process.communicate(timeout=self.process_timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            # Reaps the process and closes its stderr pipe
+            process.communicate()
+            raise RuntimeError(
+                f"""pandoc did not finish within {self.process_timeout:.0f} seconds""")
+        if process.returncode != 0:
+            raise RuntimeError(
+                f"""pandoc exited with code {process.returncode}: {stderr.decode('utf-8', errors='replace').strip()}""")
 
+    def _convert_process_result(self, input_file: str, output_file: str, to: str, reference_doc: Optional[str],
+                                standalone: bool) -> tuple[bool, str, Optional[str]]:
+        try:
+            self._convert_with_process(
+                input_file, output_file, to, reference_doc, standalone)
+            return True, output_file, None
         except Exception as e:
             return False, None, str(e)
+
+    def convert(self, input_file: str, output_file: str, to: str, reference_doc: Optional[str] = None,
+                standalone: bool = False) -> tuple[bool, str, Optional[str]]:
+        """Converts a markdown file to output_file in the `to` format.
+        Returns (success, output_path, error_message)"""
+        if to not in PROCESS_ONLY_FORMATS and self.server.ensure_running():
+            try:
+                response = self.server.post(
+                    '/', self._request(input_file, to, reference_doc, standalone))
+                self._write_result(response.json(), output_file)
+                return True, output_file, None
+            except Exception as e:
+                # Unreachable, timed out or failed: a pandoc process may still manage the document
+                logging.warning(
+                    f"""pandoc server could not convert {input_file}, using a pandoc process: {e}""")
+
+        return self._convert_process_result(input_file, output_file, to, reference_doc, standalone)
+
+    def convert_batch(self, conversions: list[tuple[str, str]], to: str, reference_doc: Optional[str] = None,
+                      standalone: bool = False) -> list[tuple[bool, str, Optional[str]]]:
+        """Converts many (input_file, output_file) pairs with one server request.
+        Returns (success, output_path, error_message) per pair"""
+        if not conversions:
+            return []
+        if to not in PROCESS_ONLY_FORMATS and self.server.ensure_running():
+            try:
+                response = self.server.post(
+                    '/batch', [self._request(input_file, to, reference_doc, standalone) for input_file, _ in conversions])
+                results = []
+                for (input_file, output_file), result in zip(conversions, response.json()):
+                    try:
+                        self._write_result(result, output_file)
+                        results.append((True, output_file, None))
+                    except Exception as e:
+                        logging.warning(
+                            f"""pandoc server could not convert {input_file}, using a pandoc process: {e}""")
+                        results.append(self._convert_process_result(
+                            input_file, output_file, to, reference_doc, standalone))
+                return results
+            except Exception as e:
+                # One bad document fails the whole batch; convert one by one to isolate it
+                logging.warning(
+                    f"""Batch conversion failed, converting documents one by one: {e}""")
+        return [self.convert(input_file, output_file, to, reference_doc, standalone) for input_file, output_file in conversions]
+
+    def convert_to_docx(self, input_file: str, output_file: str, reference_doc: str) -> tuple[bool, str, Optional[str]]:
+        """Returns (success, output_path, error_message)"""
+        return self.convert(input_file, output_file, 'docx', reference_doc)
@@ -0,0 +1,620 @@
+import datetime
+import logging
+import os
+from pathlib import Path
+import subprocess
+from typing import Optional
+
+from flask import current_app
+import gdown
+
+from audio_service import AudioService
+from database import db
+from download_cache import get_download_cache
+from drive_downloader import DriveDownloader, RangeNotSupported, remove_partial_downloads
+from job_queue import JobQueue
+from models import ErrorLog, Job, SystemSetting, Transcription
+from proofreading_service import ProofreadingService
+from transcription_service import TranscriptionService
+from youtube_downloader import YoutubeDownloader
+
+# YouTube cookie content
+YOUTUBE_COOKIES = """# Netscape HTTP Cookie File
+# http://curl.haxx.se/rfc/cookie_spec.html
+# This is a generated file!  Do not edit.
+
+.youtube.com	TRUE	/	TRUE	1748017868	GPS	1
+.youtube.com	TRUE	/	TRUE	1782576107	PREF	f6=40000000&tz=Asia.Bangkok
+.youtube.com	TRUE	/	TRUE	1779552105	__Secure-1PSIDTS	sidts-CjIBjplskLpWZbVTb2AwbA3PKv9068JsrIKIQITu-a-GLb8mlE66AzcTGrO3wsfhW7xJqRAA
+.youtube.com	TRUE	/	TRUE	1779552105	__Secure-3PSIDTS	sidts-CjIBjplskLpWZbVTb2AwbA3PKv9068JsrIKIQITu-a-GLb8mlE66AzcTGrO3wsfhW7xJqRAA
+.youtube.com	TRUE	/	FALSE	1782576105	HSID	AWe4V53nudcq29S4H
+.youtube.com	TRUE	/	TRUE	1782576105	SSID	AA2-ZQBDGCw8Pi8Hh
+.youtube.com	TRUE	/	FALSE	1782576105	APISID	IcR07fZgTNiKOmM8/AoDVFZehUNIyVaPvb
+.youtube.com	TRUE	/	TRUE	1782576105	SAPISID	Kuk8NC7snSSbd_Ir/ALoQbRMdRO7zPU0PN
+.youtube.com	TRUE	/	TRUE	1782576105	__Secure-1PAPISID	Kuk8NC7snSSbd_Ir/ALoQbRMdRO7zPU0PN
+.youtube.com	TRUE	/	TRUE	1782576105	__Secure-3PAPISID	Kuk8NC7snSSbd_Ir/ALoQbRMdRO7zPU0PN
+.youtube.com	TRUE	/	FALSE	1782576105	SID	g.a000xQiPZx6VsKV7bJFHiHtoSG-vpR6kpLaTSfQ2cfjOoDbjQebghoMiQ64UZc1BIo_J5W4yuwACgYKAfYSARESFQHGX2MiOFi6gQeymGWq5Q0MDXT8ZxoVAUF8yKrE9dAMX4tiD_McqkxIuBE_0076
+.youtube.com	TRUE	/	TRUE	1782576105	__Secure-1PSID	g.a000xQiPZx6VsKV7bJFHiHtoSG-vpR6kpLaTSfQ2cfjOoDbjQebgJgBtTvZcK6zhr55rA-x5GwACgYKAX8SARESFQHGX2MiSZQEc1jMSh8p8bPCx2KieBoVAUF8yKpL-G5-rQXRqTzlLpPqLqeN0076
+.youtube.com	TRUE	/	TRUE	1782576105	__Secure-3PSID	g.a000xQiPZx6VsKV7bJFHiHtoSG-vpR6kpLaTSfQ2cfjOoDbjQebg87VEgoR0gPNvbpLyO8mikgACgYKAV8SARESFQHGX2MiWKdMabKDggbL5VMO3fFwjxoVAUF8yKq6CRorOoIwhICIybAVLNLp0076
+.youtube.com	TRUE	/	TRUE	1782576105	LOGIN_INFO	AFmmF2swRAIgSUh4HA1nXpx1XmLwznZWh6-ef8ZMmNn0yxsad0tJC9wCIDILWmnkJPGbZ91OBXz3WpDN5r0mr2ODttsBjypLM6jV:QUQ3MjNmd1g1eHVibGpVNFdFSHF3bm1BdE9PQ0RUQWxGd2JlOS00R1REZFh3MHVJR1Z6WERWMlFLSmJnRHF3NEVQWUwwNWdEVUd1THB0NGpWN1RPcjVhZFAzTzdHMEZiTHRjOHFGQ3ZhSDR6TG9ETlA3cjlPVUI0ZnJNeXIxdUZRdGZCUUpEZFV0c3otNEFpbHpEMXgtMUtPX1pXZ3Q3UmRR
+.youtube.com	TRUE	/	FALSE	1779552180	SIDCC	AKEyXzWYiWyz903ojmyKvlVtYa3YriM0eSaCBEpHNFioxQ3g0xXgjTPBvDI_Ezdgh0RB0ZJ9
+.youtube.com	TRUE	/	TRUE	1779552180	__Secure-1PSIDCC	AKEyXzXmS3fSeTKhO3h9fno59AeUPbYQ8fmaPZkPf0FsNqbN4sausEQoW3RFVtwJdo8DapTxKQ
+.youtube.com	TRUE	/	TRUE	1779552180	__Secure-3PSIDCC	AKEyXzX2WzVuSZtcFnqoZHT2qdrXTlOtW_lygpLvi59AexnsxL0CUee2CY2bmvS2dy6QOZa5Ng
+.youtube.com	TRUE	/	TRUE	0	YSC	Y8XiqMqbGiY
+.youtube.com	TRUE	/	TRUE	1763568110	VISITOR_INFO1_LIVE	zTNhRm4ZWK8
+.youtube.com	TRUE	/	TRUE	1763568110	VISITOR_PRIVACY_METADATA	CgJJRBIEGgAgJg%3D%3D
+.youtube.com	TRUE	/	TRUE	1763568070	__Secure-ROLLOUT_TOKEN	CNXy_9L766DYARDH5P2m-7mNAxjwvaSo-7mNAw%3D%3D
+"""
+
+
+def parse_time_to_seconds(time_str):
+    """Convert time string in format 'hour:minute:second' to total seconds"""
+    if not time_str:
+        return None
+    try:
+        parts = time_str.split(':')
+        if len(parts) == 3:
+            hours, minutes, seconds = map(int, parts)
+            return hours * 3600 + minutes * 60 + seconds
+        elif len(parts) == 2:
+            minutes, seconds = map(int, parts)
+            return minutes * 60 + seconds
+        elif len(parts) == 1:
+            return int(parts[0])  # Just seconds
+        else:
+            return None
+    except (ValueError, IndexError):
+        return None
+
+
+def is_valid_checkpoint(file_path: Optional[str]) -> bool:
+    """A stage's output path is only recorded once the stage succeeded, so a recorded,
+    non-empty file means the stage does not have to run again"""
+    return bool(file_path) and os.path.isfile(file_path) and os.path.getsize(file_path) > 0
+
+
+def trimmed_file_name(start_time_str: Optional[str], end_time_str: Optional[str], file_name: str) -> str:
+    # Use original time strings, default to "00-00-00" if None
+    start_time_display = start_time_str if start_time_str else "00-00-00"
+    end_time_display = end_time_str if end_time_str else "end"
+
+    # Replace colons with dashes for Windows compatibility
+    start_time_safe = start_time_display.replace(":", "-")
+    end_time_safe = end_time_display.replace(":", "-")
+
+    return f"[TRIMMED_{start_time_safe}_{end_time_safe}] {file_name}"
+
+
+def download_audio(transcription: Transcription, start_time_str: Optional[str] = None, end_time_str: Optional[str] = None):
+    """Downloads the source audio. For YouTube, only the requested time range is fetched when
+    one is given and the full source is not cached; the result is then already trimmed."""
+    transcription.status = 'uploading'
+    db.session.commit()
+
+    # Create user-specific directory in volume
+    folder_path = os.path.join(
+        current_app.config['AUDIO_FOLDER'], transcription.user.username, str(transcription.id), "")
+    os.makedirs(folder_path, exist_ok=True)
+
+    gdrive_or_youtube_url = transcription.google_drive_url
+
+    # Resubmissions of the same Drive file or YouTube video skip the download. A Drive file can be
+    # replaced under the same ID, so it is cached per revision, and not at all when Drive hides it.
+    download_cache = get_download_cache()
+    section_downloaded = False
+    revision = None
+    if 'drive.google.com' in gdrive_or_youtube_url:
+        revision = DriveDownloader().revision(gdrive_or_youtube_url)
+    cacheable = revision is not None or 'drive.google.com' not in gdrive_or_youtube_url
+    cached_path = download_cache.lookup(gdrive_or_youtube_url, revision) if cacheable else None
+    if cached_path:
+        file_path = download_cache.link_to(cached_path, folder_path)
+        logging.info(
+            f"""Download cache hit for {gdrive_or_youtube_url}: {cached_path}""")
+        transcription.audio_file_path = file_path
+        db.session.commit()
+        return file_path
+
+    try:
+        if 'drive.google.com' in gdrive_or_youtube_url:
+            try:
+                success, file_path, error = DriveDownloader().download(
+                    gdrive_or_youtube_url, folder_path)
+            except RangeNotSupported as e:
+                logging.info(
+                    f"""Ranged download unavailable for {gdrive_or_youtube_url} ({e}), using gdown""")
+                file_path = gdown.download(
+                    gdrive_or_youtube_url, folder_path, fuzzy=True)
+            else:
+                if not success:
+                    # The partial file and its checkpoint stay in the folder, which is the same on
+                    # every attempt, so the job retry resumes the download where this one stopped
+                    raise Exception(f"""Drive download failed: {error}""")
+        elif 'youtube.com' in gdrive_or_youtube_url or 'youtu.be' in gdrive_or_youtube_url:
+            # Create cookie.txt if it doesn't exist
+            cookie_path = os.path.join(
+                current_app.config['ROOT_FOLDER'], 'cookie.txt')
+            if not os.path.exists(cookie_path):
+                with open(cookie_path, 'w', encoding='utf-8') as f:
+                    f.write(YOUTUBE_COOKIES)
+            output_template = '%(title)s.%(ext)s'
+            start_seconds = end_seconds = None
+            if start_time_str or end_time_str:
+                start_seconds = parse_time_to_seconds(start_time_str)
+                end_seconds = parse_time_to_seconds(end_time_str)
+                output_template = trimmed_file_name(
+                    start_time_str, end_time_str, output_template)
+                section_downloaded = True
+
+            # yt-dlp itself is kept up to date by the worker (see worker.py), not per job
+            success, file_path, error = YoutubeDownloader(cookie_path).download(
+                gdrive_or_youtube_url, folder_path + output_template, start_seconds, end_seconds)
+            if not success:
+                raise Exception(f"""yt-dlp download failed: {error}""")
+
+        if file_path is None:
+            raise Exception(
+                "Download failed. Please check if the Google Drive link or YouTube URL is valid and publicly accessible.")
+
+    except Exception as e:
+        raise Exception(f"Download failed: {e}")
+
+    if not file_path or not os.path.exists(file_path):
+        raise Exception("No audio data provided or download failed")
+
+    # Only complete sources are cached; a section is specific to this request's time range
+    if cacheable and not section_downloaded:
+        try:
+            download_cache.store(gdrive_or_youtube_url, file_path, revision)
+        except OSError as e:
+            # The cache is an optimisation; a full disk or permission problem must not fail the job
+            logging.warning(f"""Could not cache download {file_path}: {e}""")
+
+    transcription.audio_file_path = file_path
+    db.session.commit()
+
+    return file_path
+
+
+def is_trimmed(audio_file_path: str) -> bool:
+    # Speech preprocessing prefixes the trimmed file name again, so look anywhere in the name
+    return '[TRIMMED_' in Path(audio_file_path).name
+
+
+def trim_audio(transcription: Transcription, start_time_str: str, end_time_str: str):
+    file_path = transcription.audio_file_path
+
+    transcription.status = 'trimming'
+    db.session.commit()
+
+    # Parse time strings to seconds
+    start_seconds = parse_time_to_seconds(start_time_str)
+    end_seconds = parse_time_to_seconds(end_time_str)
+
+    # Use FFmpeg directly for memory-efficient audio trimming
+    try:
+        # Create trimmed file path with time range format
+        original_path = Path(file_path)
+        trimmed_path = original_path.parent / \
+            trimmed_file_name(start_time_str, end_time_str, original_path.name)
+
+        # -ss before -i seeks the input instead of decoding everything up to the start
+        seek_args = []
+        if start_seconds is not None:
+            seek_args = ['-ss', str(start_seconds)]
+
+        duration_args = []
+        if end_seconds is not None and start_seconds is not None:
+            duration = end_seconds - start_seconds
+            duration_args = ['-t', str(duration)]
+        elif end_seconds is not None:
+            duration_args = ['-t', str(end_seconds)]
+
+        # Build FFmpeg command for trimming
+        ffmpeg_cmd = ['ffmpeg', '-y', *seek_args, '-i', file_path, *duration_args,
+                      '-c', 'copy',  # Copy without re-encoding for speed
+                      '-avoid_negative_ts', 'make_zero',
+                      str(trimmed_path)]
+
+        # Execute FFmpeg command
+        result = subprocess.run(
+            ffmpeg_cmd, capture_output=True, text=True)
+
+        if result.returncode != 0:
+            # Fallback: try with re-encoding if copy fails
+            ffmpeg_cmd_reencode = ['ffmpeg', '-y', *seek_args, '-i', file_path, *duration_args,
+                                   '-c:a', 'libmp3lame',
+                                   '-b:a', '192k',
+                                   str(trimmed_path)]
+
+            result = subprocess.run(
+                ffmpeg_cmd_reencode, capture_output=True, text=True)
+            if result.returncode != 0:
+                raise Exception(
+                    f"FFmpeg trimming failed: {result.stderr}")
+
+        # Update transcription with trimmed file path
+        transcription.audio_file_path = str(trimmed_path)
+        db.session.commit()
+
+        logging.info(
+            f"Audio trimmed successfully using FFmpeg: {start_time_str} to {end_time_str}")
+
+    except Exception as trim_error:
+        raise Exception(f"Audio trimming failed: {trim_error}")
+
+
+def download_and_trim_audio(transcription: Transcription, start_time_str: str, end_time_str: str):
+    # A previous attempt's download is a checkpoint; only fetch the source again if it is gone
+    if is_valid_checkpoint(transcription.audio_file_path):
+        logging.info(
+            f"""Reusing downloaded audio {transcription.audio_file_path}""")
+    else:
+        download_audio(transcription, start_time_str, end_time_str)
+
+    # Trim audio if start_time or end_time is provided
+    if (start_time_str or end_time_str) and not is_trimmed(transcription.audio_file_path):
+        trim_audio(transcription, start_time_str, end_time_str)
+
+    if is_setting_enabled('silence_removal_enabled') and not AudioService.is_silence_removed(transcription.audio_file_path):
+        remove_silence(transcription)
+
+    if is_setting_enabled('speech_preprocessing_enabled') and not AudioService.is_speech_optimized(transcription.audio_file_path):
+        preprocess_audio(transcription)
+
+    return transcription.audio_file_path
+
+
+def is_setting_enabled(setting_key: str) -> bool:
+    setting = SystemSetting.query.filter_by(setting_key=setting_key).first()
+    return bool(setting) and setting.setting_value.strip().lower() in ('true', '1', 'yes')
+
+
+def remove_silence(transcription: Transcription):
+    """Cut silent and non-speech regions; the timemap sidecar maps transcript timestamps back"""
+    transcription.status = 'removing_silence'
+    db.session.commit()
+
+    success, audio_path, error = AudioService().remove_silence(
+        transcription.audio_file_path)
+    if not success:
+        raise Exception(f"""Silence removal failed: {error}""")
+
+    transcription.audio_file_path = audio_path
+    db.session.commit()
+    logging.info(f"""Silence removed: {Path(audio_path).name}""")
+
+
+def preprocess_audio(transcription: Transcription):
+    """Re-encode the audio as compact mono speech before it is uploaded for transcription"""
+    transcription.status = 'preprocessing'
+    db.session.commit()
+
+    success, speech_path, error = AudioService().to_speech(
+        transcription.audio_file_path)
+    if not success:
+        raise Exception(f"""Audio preprocessing failed: {error}""")
+
+    transcription.audio_file_path = speech_path
+    db.session.commit()
+    logging.info(
+        f"""Audio preprocessed for speech: {Path(speech_path).name}""")
+
+
+def get_output_folder(folder_key: str, transcription: Transcription) -> str:
+    """Returns (and creates) the per-user, per-transcription folder under the configured folder"""
+    folder_path = os.path.join(
+        current_app.config[folder_key], transcription.user.username, str(transcription.id))
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+def transcribe_audio(transcription: Transcription):
+    output_path = get_output_folder('TXT_FOLDER', transcription)
+
+    # Transcribe only
+    success, txt_path, error = TranscriptionService(
+    ).transcribe(output_path, transcription)
+
+    if not success:
+        raise Exception(f"""Transcription failed: {error}""")
+    return txt_path
+
+
+def proofread_text(transcription: Transcription):
+    os.makedirs(os.path.join(
+        current_app.config['MD_FOLDER'], transcription.user.username, str(transcription.id)), exist_ok=True)
+    output_path = os.path.join(current_app.config['MD_FOLDER'], transcription.user.username, str(transcription.id), f"""{
+                               Path(transcription.txt_document_path).stem}.md""")
+    # Proofread the transcribed text
+    success, md_path, error = ProofreadingService().proofread(transcription, output_path)
+    if not success:
+        raise Exception(f"""Proofreading failed: {error}""")
+
+    return md_path
+
+
+# Stages run in order, each in its own worker pool (see worker.py).
+# The transcription status is set when the stage is queued.
+# A stage handler returns False when the stage is finished outside the worker (see complete_stage).
+# Export formats (Word, HTML, PDF, SRT) are rendered on first download, see export_service.py.
+STAGES = ['download', 'transcribe', 'proofread']
+STAGE_STATUSES = {
+    'download': 'submitted',
+    'transcribe': 'waiting',
+    'proofread': 'proofreading'
+}
+# Statuses in which the inference API may still deliver a transcript
+AWAITING_RESULT_STATUSES = ('waiting', 'transcribing', 'waiting_for_proofreading')
+
+
+def run_download_stage(transcription: Transcription, payload: dict) -> bool:
+    download_and_trim_audio(
+        transcription, payload.get('start_time'), payload.get('end_time'))
+    return True
+
+
+def on_transcript_ready(transcription: Transcription, txt_path: str):
+    """Final touches once the transcript for the uploaded audio exists, wherever it came from"""
+    success, txt_path, error = AudioService().remap_transcript(
+        txt_path, transcription.audio_file_path)
+    if not success:
+        raise Exception(f"""Timestamp remapping failed: {error}""")
+    transcription.txt_document_path = txt_path
+
+
+def get_or_create_segments(transcription: Transcription) -> list[Transcription]:
+    """Returns the segment transcriptions of a long recording, splitting the audio on first use.
+    Returns an empty list when the audio fits in one segment."""
+    if transcription.segments:
+        return transcription.segments
+
+    transcription.status = 'splitting'
+    db.session.commit()
+
+    success, segment_files, error = AudioService().split(
+        transcription.audio_file_path,
+        float(os.environ.get('TRANSCRIBE_SEGMENT_SECONDS', 900)),
+        float(os.environ.get('TRANSCRIBE_SEGMENT_OVERLAP_SECONDS', 3)),
+        os.path.join(get_output_folder('AUDIO_FOLDER', transcription), 'segments'))
+    if not success:
+        raise Exception(f"""Audio splitting failed: {error}""")
+
+    segments = [Transcription(user_id=transcription.user_id,
+                              parent_id=transcription.id,
+                              segment_index=index,
+                              google_drive_url=transcription.google_drive_url,
+                              audio_file_path=segment_path)
+                for index, (segment_path, _, _) in enumerate(segment_files)]
+    db.session.add_all(segments)
+    db.session.flush()
+    logging.info(
+        f"""Split transcription {transcription.id} into {len(segments)} segments""")
+    return segments
+
+
+def stitch_segments(transcription: Transcription, segments: list[Transcription]) -> str:
+    # Segment transcripts are already remapped onto this transcription's audio timeline
+    transcription.transcribe_prompt = segments[0].transcribe_prompt
+    success, txt_path, error = TranscriptionService().stitch_segments(
+        get_output_folder('TXT_FOLDER', transcription), transcription,
+        [segment.txt_document_path for segment in segments])
+    if not success:
+        raise Exception(f"""Stitching segments failed: {error}""")
+    return txt_path
+
+
+def has_pending_job(transcription: Transcription) -> bool:
+    return Job.query.filter(Job.transcription_id == transcription.id,
+                            Job.status.in_(('queued', 'running'))).first() is not None
+
+
+def complete_segment(parent_id):
+    """Stitch the segments and move the parent on once the last segment transcript is in"""
+    # The row lock serializes segments finishing at the same time, so only one of them stitches
+    transcription = Transcription.query.filter_by(
+        id=parent_id).with_for_update().populate_existing().first()
+    if not transcription or transcription.status != 'transcribing':
+        db.session.rollback()
+        return
+
+    segments = transcription.segments
+    if not all(is_valid_checkpoint(segment.txt_document_path) for segment in segments):
+        db.session.commit()
+        return
+
+    # Errors propagate to the caller: the segment's job is retried by the worker
+    on_transcript_ready(transcription, stitch_segments(
+        transcription, segments))
+    complete_stage(transcription, 'transcribe')
+
+
+def run_transcribe_stage(transcription: Transcription, payload: dict) -> bool:
+    transcription_service = TranscriptionService()
+
+    # Same audio under the same prompt and model was transcribed before
+    cached_txt_path = transcription_service.get_cached_result(
+        get_output_folder('TXT_FOLDER', transcription), transcription)
+    if cached_txt_path:
+        on_transcript_ready(transcription, cached_txt_path)
+        return True
+
+    if transcription.parent_id is None and is_setting_enabled('segmented_transcription_enabled'):
+        segments = get_or_create_segments(transcription)
+        if segments:
+            if all(is_valid_checkpoint(segment.txt_document_path) for segment in segments):
+                on_transcript_ready(
+                    transcription, stitch_segments(transcription, segments))
+                return True
+
+            # Segments are transcribed in parallel by the transcribe workers; the last one to
+            # finish stitches the transcript and completes this stage (see complete_segment)
+            for segment in segments:
+                if not is_valid_checkpoint(segment.txt_document_path) and not has_pending_job(segment):
+                    enqueue_stage(segment, 'transcribe')
+            transcription.status = 'transcribing'
+            return False
+
+    if transcription_service.callback_enabled:
+        # The inference API pushes the transcript to the callback endpoint, which completes the stage
+        success, error = transcription_service.submit(transcription)
+        if not success:
+            raise Exception(f"""Transcription failed: {error}""")
+        return False
+
+    on_transcript_ready(transcription, transcribe_audio(transcription))
+    return True
+
+
+def run_proofread_stage(transcription: Transcription, payload: dict) -> bool:
+    transcription.md_document_path = proofread_text(transcription)
+    return True
+
+
+# Output of each stage, treated as a checkpoint when resuming
+STAGE_CHECKPOINTS = {
+    'download': 'audio_file_path',
+    'transcribe': 'txt_document_path',
+    'proofread': 'md_document_path'
+}
+
+
+def is_stage_done(transcription: Transcription, stage: str, payload: dict) -> bool:
+    if not is_valid_checkpoint(getattr(transcription, STAGE_CHECKPOINTS[stage])):
+        return False
+    if stage == 'download':
+        if (payload.get('start_time') or payload.get('end_time')) and not is_trimmed(transcription.audio_file_path):
+            return False
+        if is_setting_enabled('silence_removal_enabled') and not AudioService.is_silence_removed(transcription.audio_file_path):
+            return False
+        if is_setting_enabled('speech_preprocessing_enabled') and not AudioService.is_speech_optimized(transcription.audio_file_path):
+            return False
+    return True
+
+
+STAGE_HANDLERS = {
+    'download': run_download_stage,
+    'transcribe': run_transcribe_stage,
+    'proofread': run_proofread_stage
+}
+
+
+def enqueue_stage(transcription: Transcription, stage: str, payload: dict = None):
+    """Queue a stage for the transcription. The caller commits."""
+    transcription.status = STAGE_STATUSES[stage]
+    JobQueue().enqueue(stage, transcription.id, payload, commit=False)
+
+
+def complete_stage(transcription: Transcription, stage: str, payload: dict = None):
+    """Queue the stage after `stage`, or mark the transcription completed after the last one"""
+    if transcription.parent_id is not None:
+        # A segment is only transcribed; its parent carries on once every segment is done
+        transcription.status = 'completed'
+        db.session.commit()
+        complete_segment(transcription.parent_id)
+        return
+
+    next_stage_index = STAGES.index(stage) + 1
+    if next_stage_index < len(STAGES):
+        enqueue_stage(transcription, STAGES[next_stage_index], payload)
+        db.session.commit()
+        return
+
+    # Final update to transcription record
+    transcription.status = 'completed'
+    db.session.commit()
+    logging.info(
+        f"""Transcription {f"""{Path(transcription.audio_file_path).stem}""" if transcription.audio_file_path else transcription.google_drive_url} completed successfully""")
+
+
+def run_stage(stage: str, transcription_id: str, payload: dict):
+    transcription: Transcription = Transcription.query.get(transcription_id)
+    if not transcription:
+        logging.warning(
+            f"""Transcription {transcription_id} no longer exists, skipping {stage}""")
+        return
+
+    try:
+        if is_stage_done(transcription, stage, payload):
+            logging.info(
+                f"""Skipping {stage} for transcription {transcription.id}, its checkpoint is still valid""")
+            complete_stage(transcription, stage, payload)
+        elif STAGE_HANDLERS[stage](transcription, payload):
+            complete_stage(transcription, stage, payload)
+        else:
+            db.session.commit()
+
+    except Exception as e:
+        logging.error(f"""An error occurred: {e}""")
+        db.session.rollback()
+        # The worker retries the job and fails the transcription once it is out of attempts
+        raise
+
+
+def fail_transcription(transcription: Transcription, error_message: str, stack_trace: Optional[str] = None):
+    """Mark the transcription (and the recording it is a segment of) as failed and log the error"""
+    for failed in filter(None, [transcription, transcription.parent]):
+        # Log error
+        db.session.add(ErrorLog(
+            user_id=failed.user_id,
+            transcription_id=failed.id,
+            error_message=error_message,
+            stack_trace=stack_trace
+        ))
+        failed.status = 'error'
+    db.session.commit()
+
+    if transcription.parent_id is None and transcription.user:
+        # No job retries the download any more; a manual resume starts it over
+        remove_partial_downloads(os.path.join(
+            current_app.config['AUDIO_FOLDER'], transcription.user.username, str(transcription.id)))
+
+
+def fail_overdue_callbacks() -> list[Transcription]:
+    """Fails the transcriptions whose audio was submitted for a pushed result that has not arrived
+    within INFERENCE_CALLBACK_TIMEOUT_SECONDS. A late delivery is then refused by the callback
+    endpoint, and a manual resume submits the audio again."""
+    deadline = db.func.now() - datetime.timedelta(
+        seconds=float(os.environ.get('INFERENCE_CALLBACK_TIMEOUT_SECONDS', 21600)))
+    submitted = db.session.query(Job.id).filter(
+        Job.transcription_id == Transcription.id, Job.job_type == 'transcribe',
+        Job.status == 'done').exists()
+    # A queued or running job still moves the transcription on, and a recent one started the clock
+    active = db.session.query(Job.id).filter(
+        Job.transcription_id == Transcription.id,
+        db.or_(Job.status.in_(('queued', 'running')), Job.updated_at >= deadline)).exists()
+    # Recordings split into segments wait on their segments, which have deadlines of their own
+    overdue = Transcription.query.filter(
+        Transcription.status.in_(AWAITING_RESULT_STATUSES), ~Transcription.segments.any(),
+        submitted, ~active).with_for_update(skip_locked=True).all()
+
+    for transcription in overdue:
+        logging.warning(
+            f"""No transcription result was pushed for transcription {transcription.id} in time""")
+        fail_transcription(
+            transcription, "The inference API did not deliver the transcription result in time")
+    db.session.commit()
+    return overdue
+
+
+def resume_transcription(transcription: Transcription) -> Optional[str]:
+    """Queue the first stage whose checkpoint is missing or invalid and return it.
+    Returns None (and marks the transcription completed) when every stage is done."""
+    if transcription.parent_id is not None:
+        # Segments are driven by their parent's transcribe stage
+        return resume_transcription(transcription.parent)
+
+    # Only the download stage needs the submitted trim range, which lives in its job payload
+    download_job = Job.query.filter_by(
+        transcription_id=transcription.id, job_type='download').order_by(Job.id.desc()).first()
+    payload = download_job.payload if download_job and download_job.payload else {}
+
+    for stage in STAGES:
+        if not is_stage_done(transcription, stage, payload):
+            enqueue_stage(transcription, stage, payload)
+            db.session.commit()
+            return stage
+
+    transcription.status = 'completed'
+    db.session.commit()
+    return None
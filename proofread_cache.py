@@ -0,0 +1,55 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+from flask import current_app
+
+from file_cache import FileCache
+
+
+class ProofreadCache:
+    """Proofread output per chunk, keyed by (chunk hash, prompt hash, model, temperature), so reruns
+    and overlapping trims only pay for chunks that were never sent to the LLM."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.files = FileCache(root, max_bytes)
+
+    @property
+    def enabled(self) -> bool:
+        return self.files.enabled
+
+    @staticmethod
+    def key_for(part: str, prompt: str, model: str, temperature: float) -> str:
+        part_hash = hashlib.sha256(part.encode('utf-8')).hexdigest()
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return hashlib.sha256(
+            f"""{part_hash}:{prompt_hash}:{model}:{temperature}""".encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        cached_path = self.files.get(key)
+        if not cached_path:
+            return None
+        try:
+            with open(cached_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            # Evicted between lookup and read
+            return None
+
+    def store(self, key: str, text: str):
+        self.files.put_bytes(key, text.encode('utf-8'), 'part.md')
+
+
+_proofread_cache = None
+_proofread_cache_lock = threading.Lock()
+
+
+def get_proofread_cache() -> ProofreadCache:
+    global _proofread_cache
+    with _proofread_cache_lock:
+        if _proofread_cache is None:
+            _proofread_cache = ProofreadCache(
+                os.path.join(current_app.config['CACHE_FOLDER'], 'proofread'),
+                int(os.environ.get('PROOFREAD_CACHE_MAX_BYTES', 512 * 1024 ** 2)))
+        return _proofread_cache
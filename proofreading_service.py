@@ -1,11 +1,15 @@
 import logging
 import os
-from typing import Optional
+from typing import Iterator, Optional, TextIO
 import anthropic
-import asyncio
+import concurrent.futures
 from models import ProofreadPrompt, SystemSetting, Transcription
 from database import db
-from openai import AsyncOpenAI, OpenAI
+from llm_runtime import get_llm_runtime
+from llm_scheduler import estimate_tokens, get_llm_scheduler
+from proofread_cache import get_proofread_cache
+from text_chunker import iter_chunks
+from openai import OpenAI
 
 
 class ProofreadingService:
@@ -16,9 +20,19 @@ class ProofreadingService:
 
         # Initialize Anthropic
         # self.claude = anthropic.Anthropic(api_key=self.anthropic_api_key)
-        self.async_deepseek = AsyncOpenAI(api_key=self.deepseek_api_key, base_url=self.deepseek_base_url)
-
-    async def process_part(self, part: str, prompt: str) -> str:
+        # The client and its connection pool live on the shared runtime loop and outlive this job
+        self.llm_runtime = get_llm_runtime()
+        self.async_deepseek = self.llm_runtime.client
+        self.model = "deepseek-reasoner"
+        self.max_tokens = 8192
+        self.temperature = 0
+        self.chunk_tokens = int(os.environ.get('PROOFREAD_CHUNK_TOKENS', 700))
+        self.window_size = int(os.environ.get('PROOFREAD_WINDOW_SIZE', 32))
+        # Resolved here because process_part runs on the runtime thread, outside the app context
+        self.proofread_cache = get_proofread_cache()
+        self.llm_scheduler = get_llm_scheduler()
+
+    async def process_part(self, part: str, prompt: str, job_id: str) -> str:
         # response = self.claude.messages.create(
         #     model="claude-3-5-sonnet-20241022",
         #     max_tokens=8192,
@@ -28,48 +42,84 @@ class ProofreadingService:
         # )
         # processed_parts.append(response.content[0].text)
         """Process a single part of text asynchronously"""
-        response = await self.async_deepseek.chat.completions.create(
-            model="deepseek-reasoner",
-            max_tokens=8192,
-            temperature=0,
+        cache_key = self.proofread_cache.key_for(
+            part, prompt, self.model, self.temperature)
+        cached_output = self.proofread_cache.lookup(cache_key)
+        if cached_output is not None:
+            return cached_output
+
+        # Proofread output is about as long as its input, so reserve the input twice
+        estimated_tokens = 2 * estimate_tokens(prompt + part)
+        response = await self.llm_scheduler.run(job_id, estimated_tokens, lambda: self.async_deepseek.chat.completions.create(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
             messages=[
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": part}
             ],
             stream=False
-        )
-        return response.choices[0].message.content
+        ))
+        output = response.choices[0].message.content
+
+        try:
+            self.proofread_cache.store(cache_key, output)
+        except OSError as e:
+            # The cache is an optimisation; a full disk or permission problem must not fail the job
+            logging.warning(f"""Could not cache proofread part: {e}""")
+        return output
+
+    def process_all_parts(self, parts: Iterator[tuple[str, str]], prompt: str, job_id: str, output_file: TextIO, on_progress) -> int:
+        """Process parts concurrently on the shared LLM runtime and write each one to output_file as
+        soon as every earlier part is written, so results are not held in memory until the end. At
+        most `window_size` parts are in flight or waiting to be written. Output and progress are
+        handled on the calling job thread. Returns the number of parts processed."""
+        parts = enumerate(parts)
+        in_flight = {}
+        finished = {}
+        separators = {}
+        next_to_write = 0
+        done_count = 0
+        previous_separator = None
+        exhausted = False
 
-    async def process_all_parts(self, parts: list[str], prompt: str) -> list[str]:
-        """Process all parts concurrently while maintaining order"""
-        tasks = [self.process_part(part, prompt) for part in parts]
-        results = await asyncio.gather(*tasks)
-        return results
+        try:
+            while True:
+                while not exhausted and len(in_flight) + len(finished) < self.window_size:
+                    try:
+                        index, (part, separator) = next(parts)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    separators[index] = separator
+                    in_flight[self.llm_runtime.submit(
+                        self.process_part(part, prompt, job_id))] = index
+
+                if not in_flight:
+                    return done_count
+
+                done, _ = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    finished[in_flight.pop(future)] = future.result()
+                    done_count += 1
+
+                # Flush the contiguous run of finished parts, keeping the original order
+                while next_to_write in finished:
+                    if previous_separator is not None:
+                        output_file.write(previous_separator)
+                    output_file.write(finished.pop(next_to_write))
+                    previous_separator = separators.pop(next_to_write)
+                    next_to_write += 1
+                output_file.flush()
+                on_progress(done_count)
+        finally:
+            for future in in_flight:
+                future.cancel()
 
     def proofread(self, transcription: Transcription, output_path: str) -> tuple[bool, str, Optional[str]]:
         """Returns (success, output_path, error_message)"""
         try:
-            with open(transcription.txt_document_path, "r", encoding='utf-8') as f:
-                content = f.read()
-
-            # Split content into parts with maximum 500 words each
-            words = content.split()
-            parts = []
-            current_part = []
-            word_count = 0
-
-            for word in words:
-                current_part.append(word)
-                word_count += 1
-
-                if word_count >= 500:
-                    parts.append(' '.join(current_part))
-                    current_part = []
-                    word_count = 0
-
-            if current_part:
-                parts.append(' '.join(current_part))
-
             setting = SystemSetting.query.filter_by(
                 setting_key='active_proofread_prompt_id').first()
             if not setting:
@@ -78,18 +128,27 @@ class ProofreadingService:
             proofread_prompt = ProofreadPrompt.query.get(setting.setting_value)
             if not proofread_prompt:
                 raise ValueError("Active proofread prompt not found")
-            
+
+            # Parts are sentence-aligned and at most chunk_tokens tokens each; counting them is a
+            # cheap streaming pass that lets the UI show chunks done out of chunks total
             transcription.proofread_prompt = proofread_prompt.prompt
+            transcription.proofread_chunks_total = sum(
+                1 for _ in iter_chunks(transcription.txt_document_path, self.chunk_tokens))
+            transcription.proofread_chunks_done = 0
             db.session.commit()
 
-            # Process all parts asynchronously
-            processed_parts = asyncio.run(self.process_all_parts(parts, proofread_prompt.prompt))
-
-            # Combine all processed parts
-            combined_output = " ".join(processed_parts)
-
-            with open(output_path, 'w', encoding='utf-8') as file:
-                file.write(combined_output)
+            def on_progress(chunks_done: int):
+                transcription.proofread_chunks_done = chunks_done
+                db.session.commit()
+
+            # Write to a temporary file so an interrupted run never leaves a truncated .md behind
+            partial_path = output_path + '.part'
+            with open(partial_path, 'w', encoding='utf-8') as file:
+                self.process_all_parts(
+                    iter_chunks(transcription.txt_document_path,
+                                self.chunk_tokens),
+                    proofread_prompt.prompt, str(transcription.id), file, on_progress)
+            os.replace(partial_path, output_path)
             return True, output_path, None
 
         except Exception as e:
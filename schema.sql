@@ -28,6 +28,8 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE TABLE transcriptions (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id INTEGER REFERENCES users(id),
+    parent_id UUID REFERENCES transcriptions(id) ON DELETE CASCADE,
+    segment_index INTEGER,
     audio_file_path TEXT,
     google_drive_url TEXT,
     txt_document_path TEXT,
@@ -37,6 +39,10 @@ CREATE TABLE transcriptions (
     transcribe_prompt TEXT,
     proofread_prompt TEXT,
     inference_duration INTEGER,
+    proofread_chunks_done INTEGER,
+    proofread_chunks_total INTEGER,
+    status_changed_at TIMESTAMP WITH TIME ZONE,
+    completed_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -78,6 +84,24 @@ CREATE TABLE system_settings (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create Jobs table (durable job queue claimed by worker.py)
+CREATE TABLE jobs (
+    id SERIAL PRIMARY KEY,
+    transcription_id UUID REFERENCES transcriptions(id) ON DELETE CASCADE,
+    job_type TEXT NOT NULL,
+    payload JSONB DEFAULT '{}'::jsonb,
+    status TEXT DEFAULT 'queued',
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER DEFAULT 3,
+    run_after TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    locked_by TEXT,
+    locked_at TIMESTAMP WITH TIME ZONE,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create index on transcribe_prompts table for faster version lookups
 CREATE INDEX idx_transcribe_prompts_version ON transcribe_prompts(version);
 
@@ -90,9 +114,26 @@ CREATE INDEX idx_users_username ON users(username);
 -- Create index on transcriptions table for faster user-specific queries
 CREATE INDEX idx_transcriptions_user_id ON transcriptions(user_id);
 
+-- Create partial index on transcriptions table for finding the segments of a transcription
+CREATE INDEX idx_transcriptions_parent_id ON transcriptions(parent_id, segment_index) WHERE parent_id IS NOT NULL;
+
+-- Create partial indexes on transcriptions table for keyset-paginated listings (segments are never listed)
+CREATE INDEX idx_transcriptions_listing ON transcriptions(created_at DESC, id DESC) WHERE parent_id IS NULL;
+CREATE INDEX idx_transcriptions_user_listing ON transcriptions(user_id, created_at DESC, id DESC) WHERE parent_id IS NULL;
+CREATE INDEX idx_transcriptions_status_listing ON transcriptions(status, created_at DESC, id DESC) WHERE parent_id IS NULL;
+
 -- Create index on error_logs table for faster user-specific queries
 CREATE INDEX idx_error_logs_user_id ON error_logs(user_id);
 
+-- Create partial index on jobs table so claiming only scans runnable jobs
+CREATE INDEX idx_jobs_queued ON jobs(job_type, run_after, id) WHERE status = 'queued';
+
+-- Create partial index on jobs table for finding jobs whose worker stopped sending heartbeats
+CREATE INDEX idx_jobs_running_heartbeat ON jobs(heartbeat_at) WHERE status = 'running';
+
+-- Create index on jobs table for faster transcription-specific queries
+CREATE INDEX idx_jobs_transcription_id ON jobs(transcription_id);
+
 -- Create a function to update the 'updated_at' column
 CREATE OR REPLACE FUNCTION update_modified_column()
 RETURNS TRIGGER AS $$
@@ -114,6 +155,221 @@ BEFORE UPDATE ON system_settings
 FOR EACH ROW
 EXECUTE FUNCTION update_modified_column();
 
+-- Create a function to notify listeners when a transcription status changes
+CREATE OR REPLACE FUNCTION notify_transcription_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('transcription_status', NEW.id::text || ':' || COALESCE(NEW.status, ''));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Create a trigger to wake up workers waiting on a transcription (see status_listener.py)
+CREATE TRIGGER notify_transcriptions_status
+AFTER UPDATE OF status ON transcriptions
+FOR EACH ROW
+WHEN (OLD.status IS DISTINCT FROM NEW.status)
+EXECUTE FUNCTION notify_transcription_status();
+
+-- Create a trigger to automatically update the 'updated_at' column in the jobs table
+CREATE TRIGGER update_jobs_modtime
+BEFORE UPDATE ON jobs
+FOR EACH ROW
+EXECUTE FUNCTION update_modified_column();
+
+-- Create stats summary tables read by GET /admin/stats, kept up to date by the triggers below.
+-- The triggers only append delta rows and never update one, so concurrent transactions never wait
+-- on each other's counters (nor deadlock taking them in different orders). fold_stats(), run by the
+-- worker, periodically sums the deltas back into one row per key; readers sum whatever is there.
+
+-- Totals (users, transcriptions, error_logs)
+CREATE TABLE stats_counters (
+    id BIGSERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_stats_counters_name ON stats_counters(name);
+
+-- Number of transcriptions currently in each status
+CREATE TABLE stats_status_counts (
+    id BIGSERIAL PRIMARY KEY,
+    status TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_stats_status_counts_status ON stats_status_counts(status);
+
+-- Jobs created, done and failed per stage and hour/day (UTC)
+CREATE TABLE stats_job_buckets (
+    id BIGSERIAL PRIMARY KEY,
+    granularity TEXT NOT NULL,
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    job_type TEXT NOT NULL,
+    created BIGINT NOT NULL DEFAULT 0,
+    done BIGINT NOT NULL DEFAULT 0,
+    failed BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_stats_job_buckets_bucket ON stats_job_buckets(granularity, bucket_start, job_type);
+
+-- Histogram of the time transcriptions spent in each status ('total' is submission to first completion).
+-- Bucket b holds durations from 2^(b/4) up to 2^((b+1)/4) seconds, see stats.py
+CREATE TABLE stats_status_durations (
+    id BIGSERIAL PRIMARY KEY,
+    status TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0
+);
+CREATE INDEX idx_stats_status_durations_status ON stats_status_durations(status, bucket);
+
+CREATE OR REPLACE FUNCTION bump_stats_counter(counter_name TEXT, delta BIGINT)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO stats_counters (name, value) VALUES (counter_name, delta);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bump_stats_status_count(counted_status TEXT, delta BIGINT)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO stats_status_counts (status, count) VALUES (COALESCE(counted_status, 'unknown'), delta);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION record_stats_duration(counted_status TEXT, duration INTERVAL)
+RETURNS VOID AS $$
+BEGIN
+    INSERT INTO stats_status_durations (status, bucket, count)
+    VALUES (COALESCE(counted_status, 'unknown'),
+            FLOOR(LN(GREATEST(EXTRACT(EPOCH FROM duration)::DOUBLE PRECISION, 1.0)) / LN(2.0) * 4)::INTEGER, 1);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Sums the delta rows into one row per key. Returns false without waiting when another session is
+-- already folding. Rows appended while it runs are not visible to it and are left for the next fold.
+CREATE OR REPLACE FUNCTION fold_stats()
+RETURNS BOOLEAN AS $$
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('fold_stats')) THEN
+        RETURN FALSE;
+    END IF;
+
+    WITH folded AS (DELETE FROM stats_counters RETURNING name, value)
+    INSERT INTO stats_counters (name, value)
+    SELECT name, SUM(value) FROM folded GROUP BY name;
+
+    WITH folded AS (DELETE FROM stats_status_counts RETURNING status, count)
+    INSERT INTO stats_status_counts (status, count)
+    SELECT status, SUM(count) FROM folded GROUP BY status HAVING SUM(count) <> 0;
+
+    WITH folded AS (DELETE FROM stats_job_buckets RETURNING granularity, bucket_start, job_type, created, done, failed)
+    INSERT INTO stats_job_buckets (granularity, bucket_start, job_type, created, done, failed)
+    SELECT granularity, bucket_start, job_type, SUM(created), SUM(done), SUM(failed)
+    FROM folded GROUP BY granularity, bucket_start, job_type;
+
+    WITH folded AS (DELETE FROM stats_status_durations RETURNING status, bucket, count)
+    INSERT INTO stats_status_durations (status, bucket, count)
+    SELECT status, bucket, SUM(count) FROM folded GROUP BY status, bucket;
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Counts inserted and deleted rows in the stats counter named by the trigger argument
+CREATE OR REPLACE FUNCTION count_stats_rows()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM bump_stats_counter(TG_ARGV[0], CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE -1 END);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION set_transcription_status_changed_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' OR OLD.status IS DISTINCT FROM NEW.status THEN
+        -- Wall clock rather than transaction start, so long transactions do not skew durations
+        NEW.status_changed_at = clock_timestamp();
+    END IF;
+    -- Kept when a resumed transcription completes again, so it is only timed once
+    IF NEW.status = 'completed' AND NEW.completed_at IS NULL THEN
+        NEW.completed_at = NEW.status_changed_at;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Segments of a split recording are internal and not counted
+CREATE OR REPLACE FUNCTION count_transcription_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.parent_id IS NULL THEN
+        PERFORM bump_stats_status_count(OLD.status, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.parent_id IS NULL THEN
+        PERFORM bump_stats_status_count(NEW.status, 1);
+    END IF;
+
+    IF TG_OP = 'INSERT' AND NEW.parent_id IS NULL THEN
+        PERFORM bump_stats_counter('transcriptions', 1);
+    ELSIF TG_OP = 'DELETE' AND OLD.parent_id IS NULL THEN
+        PERFORM bump_stats_counter('transcriptions', -1);
+    ELSIF TG_OP = 'UPDATE' AND NEW.parent_id IS NULL THEN
+        IF OLD.status_changed_at IS NOT NULL THEN
+            PERFORM record_stats_duration(OLD.status, NEW.status_changed_at - OLD.status_changed_at);
+        END IF;
+        IF OLD.completed_at IS NULL AND NEW.completed_at IS NOT NULL AND NEW.created_at IS NOT NULL THEN
+            PERFORM record_stats_duration('total', NEW.completed_at - NEW.created_at);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION count_job_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND (OLD.status IS NOT DISTINCT FROM NEW.status OR NEW.status NOT IN ('done', 'failed')) THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO stats_job_buckets (granularity, bucket_start, job_type, created, done, failed)
+    SELECT g.granularity, date_trunc(g.granularity, clock_timestamp(), 'UTC'), NEW.job_type,
+           CASE WHEN TG_OP = 'INSERT' THEN 1 ELSE 0 END,
+           CASE WHEN TG_OP = 'UPDATE' AND NEW.status = 'done' THEN 1 ELSE 0 END,
+           CASE WHEN TG_OP = 'UPDATE' AND NEW.status = 'failed' THEN 1 ELSE 0 END
+    FROM (VALUES ('hour'), ('day')) AS g(granularity);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER count_users_stats
+AFTER INSERT OR DELETE ON users
+FOR EACH ROW
+EXECUTE FUNCTION count_stats_rows('users');
+
+CREATE TRIGGER count_error_logs_stats
+AFTER INSERT OR DELETE ON error_logs
+FOR EACH ROW
+EXECUTE FUNCTION count_stats_rows('error_logs');
+
+CREATE TRIGGER set_transcriptions_status_changed_at
+BEFORE INSERT OR UPDATE OF status ON transcriptions
+FOR EACH ROW
+EXECUTE FUNCTION set_transcription_status_changed_at();
+
+CREATE TRIGGER count_transcriptions_stats
+AFTER INSERT OR DELETE OR UPDATE OF status ON transcriptions
+FOR EACH ROW
+EXECUTE FUNCTION count_transcription_stats();
+
+CREATE TRIGGER count_jobs_stats
+AFTER INSERT OR UPDATE OF status ON jobs
+FOR EACH ROW
+EXECUTE FUNCTION count_job_stats();
+
 ---------------------------------------------------------------------------------------------------
 
 GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO ezra_user;
@@ -136,3 +392,12 @@ VALUES ('active_transcribe_prompt_id', '1', 'The ID of the currently active tran
 
 INSERT INTO system_settings (setting_key, setting_value, description)
 VALUES ('active_proofread_prompt_id', '1', 'The ID of the currently active proofread prompt');
+
+INSERT INTO system_settings (setting_key, setting_value, description)
+VALUES ('speech_preprocessing_enabled', 'false', 'Re-encode audio as 16 kHz mono Opus before uploading it for transcription');
+
+INSERT INTO system_settings (setting_key, setting_value, description)
+VALUES ('silence_removal_enabled', 'false', 'Cut silent regions before transcription and map transcript timestamps back to the original audio');
+
+INSERT INTO system_settings (setting_key, setting_value, description)
+VALUES ('segmented_transcription_enabled', 'false', 'Split long recordings at silences and transcribe the segments in parallel');
@@ -0,0 +1,41 @@
+from typing import Optional
+
+# Must match record_stats_duration() in migrations/009_stats_summary.sql
+DURATION_BUCKETS_PER_DOUBLING = 4
+
+
+def bucket_bounds(bucket: int) -> tuple[float, float]:
+    """Seconds covered by a duration histogram bucket; bucket 0 also holds everything under a second"""
+    lower = 0.0 if bucket == 0 else 2 ** (bucket / DURATION_BUCKETS_PER_DOUBLING)
+    return lower, 2 ** ((bucket + 1) / DURATION_BUCKETS_PER_DOUBLING)
+
+
+def histogram_percentile(bucket_counts: dict[int, int], quantile: float) -> Optional[float]:
+    """Estimates a percentile in seconds from a duration histogram, interpolating inside the bucket.
+    Buckets are about 19% wide, which bounds the error of the estimate."""
+    total = sum(bucket_counts.values())
+    if not total:
+        return None
+
+    target = quantile * total
+    cumulative = 0
+    for bucket in sorted(bucket_counts):
+        count = bucket_counts[bucket]
+        if count and cumulative + count >= target:
+            lower, upper = bucket_bounds(bucket)
+            return round(lower + (upper - lower) * (target - cumulative) / count, 1)
+        cumulative += count
+    return round(bucket_bounds(max(bucket_counts))[1], 1)
+
+
+def summarize_durations(rows) -> dict[str, dict]:
+    """Count, median and p95 seconds per status from (status, bucket, count) histogram rows"""
+    histograms = {}
+    for status, bucket, count in rows:
+        bucket_counts = histograms.setdefault(status, {})
+        bucket_counts[bucket] = bucket_counts.get(bucket, 0) + int(count)
+    return {status: {
+        "count": sum(bucket_counts.values()),
+        "median_seconds": histogram_percentile(bucket_counts, 0.5),
+        "p95_seconds": histogram_percentile(bucket_counts, 0.95)
+    } for status, bucket_counts in sorted(histograms.items())}
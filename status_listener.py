@@ -0,0 +1,97 @@
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy.engine import make_url
+
+# Fired by the notify_transcription_status trigger with payload '<transcription_id>:<status>'
+CHANNEL = 'transcription_status'
+
+
+class StatusListener:
+    """One LISTEN connection per process that wakes up threads waiting for a transcription's status to change."""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.waiters = defaultdict(set)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def register(self, transcription_id) -> threading.Event:
+        """Returns an event that is set whenever the transcription's status changes.
+        Register before reading the status so a change in between is not missed."""
+        event = threading.Event()
+        with self.lock:
+            self.waiters[str(transcription_id)].add(event)
+            if not self.thread or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self._run, name='status-listener', daemon=True)
+                self.thread.start()
+        return event
+
+    def unregister(self, transcription_id, event: threading.Event):
+        with self.lock:
+            events = self.waiters.get(str(transcription_id))
+            if events is None:
+                return
+            events.discard(event)
+            if not events:
+                del self.waiters[str(transcription_id)]
+
+    def _wake(self, transcription_id: str):
+        with self.lock:
+            for event in self.waiters.get(transcription_id, ()):
+                event.set()
+
+    def _wake_all(self):
+        with self.lock:
+            for events in self.waiters.values():
+                for event in events:
+                    event.set()
+
+    def _run(self):
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(self.dsn)
+                connection.set_isolation_level(
+                    psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"""LISTEN {CHANNEL}""")
+                # Notifications sent while we were not listening are lost, so let every waiter re-check
+                self._wake_all()
+
+                while True:
+                    if select.select([connection], [], [], 60) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        self._wake(notify.payload.split(':', 1)[0])
+            except Exception as e:
+                logging.error(
+                    f"""Status listener connection failed: {e}. Reconnecting in 5 seconds...""")
+                self._wake_all()
+                time.sleep(5)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def get_status_listener() -> StatusListener:
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            url = make_url(current_app.config['SQLALCHEMY_DATABASE_URI'])
+            _listener = StatusListener(url.set(drivername='postgresql').render_as_string(
+                hide_password=False))
+        return _listener
@@ -0,0 +1,57 @@
+import io
+import sys
+import types
+import unittest
+from unittest import mock
+
+import audio_service
+from audio_service import AudioService
+
+# One 30 ms frame of 16 kHz 16-bit mono PCM
+FRAME_BYTES = 960
+
+
+class FakeVad:
+    """Treats any non-zero frame as speech, so the test controls what is music and what is voice"""
+
+    def __init__(self, mode):
+        self.mode = mode
+
+    def is_speech(self, frame, sample_rate):
+        return any(frame)
+
+
+class VoiceDetectionTest(unittest.TestCase):
+    def decode(self, frames: list[bool]):
+        pcm = b''.join((b'\x01' if speech else b'\x00') * FRAME_BYTES for speech in frames)
+        process = mock.Mock(stdout=io.BytesIO(pcm), stderr=io.BytesIO(b''))
+        process.wait.return_value = 0
+        return process
+
+    def test_vad_drops_non_speech_and_joins_short_pauses(self):
+        # 1.5 s speech, 0.6 s pause, 0.9 s speech, 3 s non-speech, 0.6 s speech
+        frames = [True] * 50 + [False] * 20 + [True] * 30 + [False] * 100 + [True] * 20
+        with mock.patch.dict(sys.modules, {'webrtcvad': types.SimpleNamespace(Vad=FakeVad)}), \
+                mock.patch.dict(audio_service.os.environ, {'SILENCE_PADDING_SECONDS': '0'}), \
+                mock.patch.object(audio_service.subprocess, 'Popen', return_value=self.decode(frames)):
+            regions, duration = AudioService().detect_speech('/audio/sermon.mp3')
+
+        self.assertAlmostEqual(duration, 6.6)
+        self.assertEqual(len(regions), 2)
+        self.assertAlmostEqual(regions[0][0], 0.0)
+        self.assertAlmostEqual(regions[0][1], 3.0)
+        self.assertAlmostEqual(regions[1][0], 6.0)
+        self.assertAlmostEqual(regions[1][1], 6.6)
+
+    def test_vad_reports_a_failed_decode(self):
+        process = self.decode([True] * 10)
+        process.wait.return_value = 1
+        process.stderr = io.BytesIO(b'Invalid data found when processing input')
+        with mock.patch.dict(sys.modules, {'webrtcvad': types.SimpleNamespace(Vad=FakeVad)}), \
+                mock.patch.object(audio_service.subprocess, 'Popen', return_value=process):
+            with self.assertRaisesRegex(Exception, 'Invalid data'):
+                AudioService().detect_speech('/audio/broken.mp3')
+
+
+if __name__ == '__main__':
+    unittest.main()
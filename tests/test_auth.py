@@ -0,0 +1,41 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://test@localhost/test')
+
+import auth  # noqa: E402
+
+
+class UserCacheTest(unittest.TestCase):
+    def test_expired_entries_are_evicted(self):
+        cache = auth.UserCache(ttl_seconds=60)
+        with mock.patch.object(auth, 'User') as user_model, \
+                mock.patch.object(auth.time, 'monotonic', return_value=1000.0) as monotonic:
+            user_model.query.filter_by.return_value.first.return_value = mock.Mock(id=1, is_admin=False)
+            cache.next_sweep = 1000.0 + 60
+            for index in range(50):
+                cache.get(f"""user{index}""")
+            self.assertEqual(len(cache.entries), 50)
+
+            monotonic.return_value = 1000.0 + 61
+            cache.get('user0')
+        self.assertEqual(list(cache.entries), ['user0'])
+
+
+class AdminClaimTest(unittest.TestCase):
+    def test_promoted_user_is_admin_without_a_new_token(self):
+        with mock.patch.object(auth, 'get_jwt', return_value={'sub': 'ana', 'uid': 1, 'is_admin': False}), \
+                mock.patch.object(auth, 'get_jwt_identity', return_value='ana'), \
+                mock.patch.object(auth.user_cache, 'get', return_value=(1, True)):
+            self.assertTrue(auth.current_user_is_admin())
+
+    def test_admin_claim_needs_no_lookup(self):
+        with mock.patch.object(auth, 'get_jwt', return_value={'sub': 'ana', 'uid': 1, 'is_admin': True}), \
+                mock.patch.object(auth.user_cache, 'get') as get:
+            self.assertTrue(auth.current_user_is_admin())
+        get.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from download_cache import DownloadCache
+from file_cache import FileCache
+
+
+def write_file(folder: str, name: str, size: int) -> str:
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(os.urandom(size))
+    return path
+
+
+class EvictionTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.root = self.folder.name
+        self.downloads = os.path.join(self.root, 'downloads')
+        os.makedirs(self.downloads)
+
+    def test_files_linked_into_job_folders_do_not_count_against_the_budget(self):
+        cache = FileCache(os.path.join(self.root, 'cache'), max_bytes=1500)
+        first = cache.put_file('first', write_file(self.downloads, 'first.mp3', 1000))
+        # The download's own hard link keeps the cached file on disk, so evicting it would free nothing
+        second = cache.put_file('second', write_file(self.downloads, 'second.mp3', 1000))
+        cache.evict(force=True)
+        self.assertEqual({cache.get('first'), cache.get('second')}, {first, second})
+
+        os.remove(os.path.join(self.downloads, 'first.mp3'))
+        os.remove(os.path.join(self.downloads, 'second.mp3'))
+        os.utime(second)
+        cache.evict(force=True)
+        self.assertIsNone(cache.get('first'))
+        self.assertEqual(cache.get('second'), second)
+
+    def test_evicting_a_blob_removes_the_urls_pointing_at_it(self):
+        download_cache = DownloadCache(os.path.join(self.root, 'cache'), max_bytes=1500)
+        first_url = 'https://youtu.be/aaaaaaaaaaa'
+        download_cache.store(first_url, write_file(self.downloads, 'first.mp3', 1000))
+        download_cache.store('https://www.youtube.com/watch?v=aaaaaaaaaaa&t=10',
+                             os.path.join(self.downloads, 'first.mp3'))
+        os.remove(os.path.join(self.downloads, 'first.mp3'))
+        self.assertEqual(len(os.listdir(download_cache.urls_folder)), 1)
+
+        second_url = 'https://youtu.be/bbbbbbbbbbb'
+        download_cache.store(second_url, write_file(self.downloads, 'second.mp3', 1000))
+        os.remove(os.path.join(self.downloads, 'second.mp3'))
+        download_cache.blobs.evict(force=True)
+
+        self.assertIsNone(download_cache.lookup(first_url))
+        self.assertIsNotNone(download_cache.lookup(second_url))
+        self.assertEqual(os.listdir(download_cache.urls_folder),
+                         [os.path.basename(download_cache._url_index_path(second_url))])
+
+    def test_a_new_revision_misses(self):
+        download_cache = DownloadCache(os.path.join(self.root, 'cache'), max_bytes=1500)
+        url = 'https://drive.google.com/file/d/abc123/view'
+        cached_path = download_cache.store(url, write_file(self.downloads, 'talk.mp3', 100), 'first')
+        self.assertEqual(download_cache.lookup(url, 'first'), cached_path)
+        self.assertIsNone(download_cache.lookup(url, 'second'))
+        self.assertIsNone(download_cache.lookup(url))
+
+
+if __name__ == '__main__':
+    unittest.main()
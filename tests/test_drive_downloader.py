@@ -0,0 +1,93 @@
+import http.server
+import os
+import re
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import drive_downloader
+from drive_downloader import DriveDownloader, remove_partial_downloads
+
+CONTENT = os.urandom(3 * 1024 * 1024 + 123)
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    # Bytes sent before the connection is cut, None to send whole ranges
+    cut_after = None
+    last_modified = 'Mon, 05 Oct 2026 10:00:00 GMT'
+    bytes_sent = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)', self.headers['Range']).groups())
+        body = CONTENT[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', f"""bytes {start}-{end}/{len(CONTENT)}""")
+        self.send_header('Content-Disposition', 'attachment; filename="talk.mp3"')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Last-Modified', RangeHandler.last_modified)
+        self.end_headers()
+        if RangeHandler.cut_after is not None and end > 0:
+            body = body[:RangeHandler.cut_after]
+        RangeHandler.bytes_sent += len(body)
+        self.wfile.write(body)
+
+
+class DriveDownloaderTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.folder = tempfile.mkdtemp()
+        url = f"""http://127.0.0.1:{self.server.server_address[1]}/download"""
+        patcher = mock.patch.object(drive_downloader, 'DRIVE_DOWNLOAD_URL', url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.server.shutdown)
+
+    def downloader(self) -> DriveDownloader:
+        downloader = DriveDownloader()
+        downloader.connections = 2
+        downloader.min_range_bytes = 1024 * 1024
+        downloader.max_retries = 0
+        downloader.chunk_size = 64 * 1024
+        downloader.checkpoint_bytes = 64 * 1024
+        return downloader
+
+    def test_retry_resumes_from_checkpoint(self):
+        drive_url = 'https://drive.google.com/file/d/abc123/view'
+        RangeHandler.cut_after = 512 * 1024
+        success, _, _ = self.downloader().download(drive_url, self.folder)
+        self.assertFalse(success)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, 'talk.mp3.part.json')))
+
+        RangeHandler.cut_after = None
+        RangeHandler.bytes_sent = 0
+        success, output_path, error = self.downloader().download(drive_url, self.folder)
+        self.assertTrue(success, error)
+        with open(output_path, 'rb') as f:
+            self.assertEqual(f.read(), CONTENT)
+        # At least the range that failed first kept its 512 KiB, which is not fetched again
+        self.assertLessEqual(RangeHandler.bytes_sent, len(CONTENT) - 512 * 1024 + 1)
+        self.assertEqual(os.listdir(self.folder), ['talk.mp3'])
+
+    def test_revision_changes_when_the_file_is_replaced(self):
+        drive_url = 'https://drive.google.com/file/d/abc123/view'
+        revision = self.downloader().revision(drive_url)
+        self.assertIsNotNone(revision)
+        self.assertEqual(self.downloader().revision(drive_url), revision)
+
+        with mock.patch.object(RangeHandler, 'last_modified', 'Sat, 17 Oct 2026 08:00:00 GMT'):
+            self.assertNotEqual(self.downloader().revision(drive_url), revision)
+
+    def test_remove_partial_downloads(self):
+        for name in ('talk.mp3', 'talk.mp3.part', 'talk.mp3.part.json'):
+            open(os.path.join(self.folder, name), 'wb').close()
+        remove_partial_downloads(self.folder)
+        self.assertEqual(os.listdir(self.folder), ['talk.mp3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://test@localhost/test')
+
+import export_service  # noqa: E402
+from export_service import ExportService  # noqa: E402
+
+
+class ExportLockTest(unittest.TestCase):
+    def test_concurrent_requests_render_an_export_once(self):
+        folder = tempfile.mkdtemp()
+        txt_path = os.path.join(folder, 'sermon.txt')
+        with open(txt_path, 'w', encoding='utf-8') as f:
+            f.write('[00:00] hello\n[00:03] world\n')
+        transcriptions = [mock.Mock(txt_document_path=txt_path) for _ in range(4)]
+
+        renders = []
+        build_srt = ExportService._build_srt
+
+        def slow_build_srt(service, txt_file, output_file):
+            renders.append(output_file)
+            time.sleep(0.2)
+            build_srt(service, txt_file, output_file)
+
+        results = []
+        with mock.patch.object(export_service.ExportService, '_build_srt', slow_build_srt):
+            threads = [threading.Thread(target=lambda t=t: results.append(ExportService().export(t, 'srt')))
+                       for t in transcriptions]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(renders), 1)
+        self.assertEqual({result for result in results}, {results[0]})
+        self.assertTrue(results[0][0])
+        self.assertEqual([name for name in os.listdir(os.path.join(folder, 'exports'))
+                          if not name.startswith('.')], [os.path.basename(results[0][1])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+import uuid
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://test@localhost/test')
+
+from flask import Flask  # noqa: E402
+
+import inference_routes  # noqa: E402
+
+
+class ResultCallbackTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.transcription_id = str(uuid.uuid4())
+        self.transcription = mock.Mock(id=self.transcription_id, status='waiting',
+                                       audio_file_path='/audio/sermon.mp3')
+        self.locked_transcription = mock.Mock(id=self.transcription_id, status='waiting',
+                                              audio_file_path='/audio/sermon.mp3')
+
+        app = Flask(__name__)
+        app.register_blueprint(inference_routes.inference, url_prefix='/inference')
+        self.client = app.test_client()
+
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.dict(os.environ, {'INFERENCE_CALLBACK_API_KEY': 'secret'}).start()
+        mock.patch.object(inference_routes, 'db').start()
+        mock.patch.object(inference_routes, 'get_output_folder', return_value=self.folder.name).start()
+        mock.patch.object(inference_routes.TranscriptionService, '_cache_result').start()
+        mock.patch.object(inference_routes, 'on_transcript_ready').start()
+        mock.patch.object(inference_routes, 'complete_stage').start()
+        transcription_model = mock.patch.object(inference_routes, 'Transcription').start()
+        transcription_model.query.get.return_value = self.transcription
+        transcription_model.query.filter_by.return_value.with_for_update.return_value \
+            .populate_existing.return_value.first.return_value = self.locked_transcription
+
+    def deliver(self, body: bytes):
+        return self.client.post(f"""/inference/transcriptions/{self.transcription_id}/result""",
+                                data=body, headers={'Authorization': 'Bearer secret'})
+
+    def test_result_is_published_after_the_locked_check(self):
+        response = self.deliver(b'[00:00] hello')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.listdir(self.folder.name), ['sermon.txt'])
+        with open(os.path.join(self.folder.name, 'sermon.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'[00:00] hello')
+        inference_routes.on_transcript_ready.assert_called_once()
+        inference_routes.complete_stage.assert_called_once()
+
+    def test_late_delivery_keeps_the_accepted_transcript(self):
+        with open(os.path.join(self.folder.name, 'sermon.txt'), 'wb') as f:
+            f.write(b'accepted')
+        # Another delivery was accepted between the first check and the row lock
+        self.locked_transcription.status = 'proofreading'
+
+        response = self.deliver(b'late')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(os.listdir(self.folder.name), ['sermon.txt'])
+        with open(os.path.join(self.folder.name, 'sermon.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'accepted')
+        inference_routes.on_transcript_ready.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://test@localhost/test')
+
+import job_queue  # noqa: E402
+import pipeline  # noqa: E402
+import worker  # noqa: E402
+from models import Job  # noqa: E402
+
+
+class StageFailureTest(unittest.TestCase):
+    def test_run_stage_reraises_stage_errors(self):
+        transcription = mock.Mock(id='t1')
+        with mock.patch.object(pipeline, 'Transcription') as transcription_model, \
+                mock.patch.object(pipeline, 'db'), \
+                mock.patch.object(pipeline, 'is_stage_done', return_value=False), \
+                mock.patch.object(pipeline, 'fail_transcription') as fail_transcription, \
+                mock.patch.dict(pipeline.STAGE_HANDLERS, {'proofread': mock.Mock(side_effect=RuntimeError('boom'))}):
+            transcription_model.query.get.return_value = transcription
+            with self.assertRaises(RuntimeError):
+                pipeline.run_stage('proofread', 't1', {})
+        fail_transcription.assert_not_called()
+
+    def run_failing_job(self, attempts: int) -> tuple[Job, mock.Mock]:
+        job = Job(id=1, transcription_id='t1', job_type='proofread',
+                  status='running', attempts=attempts, max_attempts=3)
+        stage_worker = worker.Worker({'proofread': 1}, poll_interval=1, heartbeat_interval=1)
+        with mock.patch.object(worker, 'run_stage', side_effect=RuntimeError('boom')), \
+                mock.patch.object(worker, 'db'), \
+                mock.patch.object(job_queue, 'db'), \
+                mock.patch.object(worker, 'Transcription'), \
+                mock.patch.object(worker, 'fail_transcription') as fail_transcription:
+            stage_worker.run_job(job)
+        return job, fail_transcription
+
+    def test_stage_error_requeues_job(self):
+        job, fail_transcription = self.run_failing_job(attempts=1)
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.last_error, 'boom')
+        fail_transcription.assert_not_called()
+
+    def test_last_attempt_fails_transcription(self):
+        job, fail_transcription = self.run_failing_job(attempts=3)
+        self.assertEqual(job.status, 'failed')
+        fail_transcription.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
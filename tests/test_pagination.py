@@ -0,0 +1,54 @@
+import datetime
+import os
+import unittest
+import uuid
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://test@localhost/test')
+
+from models import Transcription  # noqa: E402
+import pagination  # noqa: E402
+
+FIELD_COLUMNS = {'status': [Transcription.status], 'audio_file_name': [Transcription.audio_file_path]}
+
+
+class PaginationTest(unittest.TestCase):
+    def test_listing_without_limit_gets_the_default_page(self):
+        query = mock.Mock()
+        rows = [mock.Mock(created_at=datetime.datetime(2026, 1, 1), id=uuid.uuid4())
+                for _ in range(pagination.DEFAULT_PAGE_SIZE + 1)]
+        query.order_by.return_value.limit.return_value.all.return_value = rows
+        page, next_cursor = pagination.paginate_transcriptions(query, {})
+        self.assertEqual(page, rows[:-1])
+        self.assertEqual(pagination.decode_cursor(next_cursor)[1], rows[-2].id)
+        query.order_by.return_value.limit.assert_called_once_with(pagination.DEFAULT_PAGE_SIZE + 1)
+
+    def test_limit_all_only_opts_out_where_allowed(self):
+        query = mock.Mock()
+        rows = [mock.Mock() for _ in range(3)]
+        query.order_by.return_value.all.return_value = rows
+        self.assertEqual(pagination.paginate_transcriptions(query, {'limit': 'all'}, allow_all=True), (rows, None))
+        query.order_by.return_value.limit.assert_not_called()
+        with self.assertRaisesRegex(ValueError, 'Invalid limit'):
+            pagination.paginate_transcriptions(query, {'limit': 'all'})
+
+    def test_limit_sets_the_page_size(self):
+        query = mock.Mock()
+        query.order_by.return_value.limit.return_value.all.return_value = []
+        self.assertEqual(pagination.paginate_transcriptions(query, {'limit': '2'}), ([], None))
+        query.order_by.return_value.limit.assert_called_once_with(3)
+
+    def test_unknown_fields_are_rejected_before_any_row_is_read(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown fields: nope'):
+            pagination.requested_fields({'fields': 'status,nope'}, FIELD_COLUMNS)
+        self.assertEqual(pagination.requested_fields({}, FIELD_COLUMNS), ['status', 'audio_file_name'])
+
+    def test_only_requested_columns_are_loaded(self):
+        with mock.patch.object(pagination, 'load_only') as load_only:
+            pagination.load_fields(mock.Mock(), ['audio_file_name'], FIELD_COLUMNS)
+        self.assertEqual({column.key for column in load_only.call_args[0]},
+                         {'id', 'created_at', 'audio_file_path'})
+
+
+if __name__ == '__main__':
+    unittest.main()
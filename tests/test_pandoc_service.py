@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+import pandoc_service
+from pandoc_service import PandocServer, PandocService
+
+
+class PandocServiceTest(unittest.TestCase):
+    def service(self, post_error: Exception) -> PandocService:
+        service = PandocService.__new__(PandocService)
+        service.server = mock.Mock()
+        service.process_timeout = 5
+        service.server.ensure_running.return_value = True
+        service.server.post.side_effect = post_error
+        return service
+
+    def test_falls_back_to_process_on_server_errors(self):
+        for error in (requests.ConnectionError('refused'), requests.Timeout('slow'),
+                      RuntimeError('pandoc server error 500: timeout')):
+            service = self.service(error)
+            with mock.patch.object(service, '_request', return_value={}), \
+                    mock.patch.object(service, '_convert_with_process') as convert_with_process:
+                self.assertEqual(service.convert('in.md', 'out.docx', 'docx'), (True, 'out.docx', None))
+            convert_with_process.assert_called_once()
+
+    def test_batch_item_error_falls_back_to_process(self):
+        service = self.service(None)
+        service.server.post.side_effect = None
+        service.server.post.return_value.json.return_value = [
+            {'output': '<p>a</p>', 'base64': False}, {'error': 'timed out'}]
+        folder = tempfile.mkdtemp()
+        conversions = [('a.md', os.path.join(folder, 'a.html')), ('b.md', os.path.join(folder, 'b.html'))]
+        with mock.patch.object(service, '_request', return_value={}), \
+                mock.patch.object(service, '_convert_with_process') as convert_with_process:
+            results = service.convert_batch(conversions, 'html')
+        self.assertEqual(results, [(True, output_file, None) for _, output_file in conversions])
+        convert_with_process.assert_called_once()
+        self.assertEqual(convert_with_process.call_args[0][0], 'b.md')
+
+    def test_process_conversion_is_stopped_at_its_timeout(self):
+        folder = tempfile.mkdtemp()
+        hanging_pandoc = os.path.join(folder, 'pandoc')
+        with open(hanging_pandoc, 'w') as f:
+            f.write('#!/bin/sh\nsleep 30\n')
+        os.chmod(hanging_pandoc, 0o755)
+        service = self.service(None)
+        service.process_timeout = 0.5
+        with mock.patch.object(pandoc_service.pypandoc, 'get_pandoc_path', return_value=hanging_pandoc):
+            started = time.monotonic()
+            success, _, error = service._convert_process_result(
+                'in.md', os.path.join(folder, 'out.pdf'), 'pdf', None, False)
+        self.assertFalse(success)
+        self.assertIn('did not finish', error)
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_autostarted_server_gets_request_timeout(self):
+        server = PandocServer(url=None, autostart=True, request_timeout=90, startup_timeout=0)
+        with mock.patch.object(pandoc_service.subprocess, 'Popen') as popen, \
+                mock.patch.object(pandoc_service.pypandoc, 'get_pandoc_path', return_value='pandoc'):
+            popen.return_value.poll.return_value = 1
+            with self.assertRaises(RuntimeError):
+                server._start()
+        self.assertIn('--timeout', popen.call_args[0][0])
+        self.assertEqual(popen.call_args[0][0][-1], '90')
+
+    def test_failed_start_is_retried_after_a_while(self):
+        server = PandocServer(url=None, autostart=True, retry_seconds=30)
+        with mock.patch.object(server, '_start', side_effect=[RuntimeError('port taken'), None]) as start, \
+                mock.patch.object(pandoc_service.time, 'monotonic', return_value=1000.0) as monotonic:
+            self.assertFalse(server.ensure_running())
+            self.assertFalse(server.ensure_running())
+            self.assertEqual(start.call_count, 1)
+
+            monotonic.return_value = 1031.0
+            self.assertTrue(server.ensure_running())
+            self.assertEqual(start.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
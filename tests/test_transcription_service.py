@@ -0,0 +1,63 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://test@localhost/test')
+
+import transcription_service  # noqa: E402
+
+
+class ExpiringTranscription:
+    """Stands in for a row that the session expires on commit: reading it afterwards would reload
+    the row and open a new transaction"""
+
+    def __init__(self, statuses: list[str]):
+        self.statuses = statuses
+        self.expired = False
+
+    def refresh(self):
+        self._status = self.statuses.pop(0)
+        self.expired = False
+
+    def _read(self, value):
+        if self.expired:
+            raise AssertionError('Attribute read after commit')
+        return value
+
+    @property
+    def status(self):
+        return self._read(self._status)
+
+    @property
+    def id(self):
+        return self._read('t1')
+
+
+class ResultPollingTest(unittest.TestCase):
+    def test_wait_does_not_reopen_a_transaction(self):
+        transcription = ExpiringTranscription(['waiting', 'waiting_for_proofreading'])
+
+        def commit():
+            transcription.expired = True
+
+        response = mock.Mock(status_code=200, headers={'Content-Type': 'text/plain'},
+                             content=b'[00:00] hello')
+        with mock.patch.dict(os.environ, {'TRANSCRIBE_API_KEY': 'secret'}), \
+                mock.patch.object(transcription_service, 'Transcription') as transcription_model, \
+                mock.patch.object(transcription_service, 'db') as db, \
+                mock.patch.object(transcription_service, 'get_status_listener') as get_listener, \
+                mock.patch.object(transcription_service.requests, 'post', return_value=response) as post:
+            transcription_model.query.get.return_value = transcription
+            db.session.refresh.side_effect = lambda _: transcription.refresh()
+            db.session.commit.side_effect = commit
+
+            result = transcription_service.TranscriptionService()._get_transcription_result('t1')
+
+        self.assertEqual(result, b'[00:00] hello')
+        self.assertEqual(post.call_args.kwargs['json'], {'transcription_id': 't1'})
+        get_listener.return_value.register.return_value.wait.assert_called_once()
+        get_listener.return_value.unregister.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+
+import youtube_downloader
+
+
+class EngineReuseTest(unittest.TestCase):
+    def setUp(self):
+        youtube_downloader._idle_engines.clear()
+        self.addCleanup(youtube_downloader._idle_engines.clear)
+
+    def make_youtube_dl(self, params: dict):
+        ydl = mock.Mock(params={**params, 'outtmpl': {'default': 'default'}})
+        ydl.extract_info.side_effect = lambda url, download: {
+            'requested_downloads': [{'filepath': ydl.params['outtmpl']['default'].replace('%(title)s.%(ext)s', 'song.mp3')}]}
+        return ydl
+
+    def test_downloads_share_one_engine_per_cookie_path(self):
+        with mock.patch.object(youtube_downloader.yt_dlp, 'YoutubeDL', side_effect=self.make_youtube_dl) as youtube_dl:
+            downloader = youtube_downloader.YoutubeDownloader('/tmp/cookie.txt')
+            first = downloader.download('https://youtu.be/a', '/audio/1/%(title)s.%(ext)s')
+            second = downloader.download('https://youtu.be/b', '/audio/2/%(title)s.%(ext)s', 10, 20)
+            youtube_downloader.YoutubeDownloader('/tmp/other-cookie.txt').download(
+                'https://youtu.be/c', '/audio/3/%(title)s.%(ext)s')
+
+        self.assertEqual(first, (True, '/audio/1/song.mp3', None))
+        self.assertEqual(second, (True, '/audio/2/song.mp3', None))
+        self.assertEqual(youtube_dl.call_count, 2)
+        engine = youtube_downloader._idle_engines['/tmp/cookie.txt'][0]
+        self.assertIn('download_ranges', engine.ydl.params)
+
+    def test_failed_download_drops_its_engine(self):
+        with mock.patch.object(youtube_downloader.yt_dlp, 'YoutubeDL', side_effect=self.make_youtube_dl):
+            downloader = youtube_downloader.YoutubeDownloader('/tmp/cookie.txt')
+            downloader.download('https://youtu.be/a', '/audio/1/%(title)s.%(ext)s')
+            engine = youtube_downloader._idle_engines['/tmp/cookie.txt'][0]
+            engine.ydl.extract_info.side_effect = Exception('HTTP Error 403')
+
+            self.assertEqual(downloader.download('https://youtu.be/b', '/audio/2/%(title)s.%(ext)s'),
+                             (False, None, 'HTTP Error 403'))
+        engine.ydl.close.assert_called_once()
+        self.assertEqual(youtube_downloader._idle_engines['/tmp/cookie.txt'], [])
+
+
+class UpdateTest(unittest.TestCase):
+    def test_update_waits_for_running_downloads(self):
+        with mock.patch.object(youtube_downloader.subprocess, 'run') as run:
+            with youtube_downloader.yt_dlp_lock():
+                self.assertIsNone(youtube_downloader.update_yt_dlp())
+            run.assert_not_called()
+
+            run.return_value = mock.Mock(returncode=0)
+            self.assertFalse(youtube_downloader.update_yt_dlp())
+            run.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import re
+from typing import Iterator, TextIO
+
+from llm_scheduler import estimate_tokens
+
+# Whitespace after a sentence terminator (optionally followed by closing quotes/brackets)
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])["\'”’)\]]*(\s+)')
+PARAGRAPH_SEPARATOR = '\n\n'
+
+
+def iter_paragraphs(file: TextIO) -> Iterator[str]:
+    """Yields blank-line separated paragraphs, keeping single newlines inside them"""
+    lines = []
+    for line in file:
+        if line.strip():
+            lines.append(line.rstrip())
+        elif lines:
+            yield '\n'.join(lines)
+            lines = []
+    if lines:
+        yield '\n'.join(lines)
+
+
+def iter_sentences(file: TextIO) -> Iterator[tuple[str, str, bool]]:
+    """Yields (sentence, whitespace after it, ends paragraph)"""
+    for paragraph in iter_paragraphs(file):
+        start = 0
+        for match in SENTENCE_BOUNDARY.finditer(paragraph):
+            yield paragraph[start:match.start(1)], match.group(1), False
+            start = match.end()
+        if start < len(paragraph):
+            yield paragraph[start:], PARAGRAPH_SEPARATOR, True
+
+
+def split_oversized(sentence: str, whitespace: str, paragraph_end: bool, max_tokens: int):
+    """Splits a sentence that alone exceeds the budget on word boundaries"""
+    if estimate_tokens(sentence) <= max_tokens:
+        yield sentence, whitespace, paragraph_end
+        return
+
+    words = sentence.split()
+    piece = []
+    for word in words:
+        if piece and estimate_tokens(' '.join(piece + [word])) > max_tokens:
+            yield ' '.join(piece), ' ', False
+            piece = []
+        piece.append(word)
+    if piece:
+        yield ' '.join(piece), whitespace, paragraph_end
+
+
+def iter_chunks(file_path: str, max_tokens: int) -> Iterator[tuple[str, str]]:
+    """Streams the file as (chunk, separator) pairs of at most max_tokens estimated tokens.
+    Chunks end on sentence boundaries and prefer paragraph boundaries; the separator is the
+    whitespace that followed the chunk, so `chunk + separator` pieces rebuild the text."""
+
+    def render(pieces) -> tuple[str, str]:
+        text = ''.join(sentence + whitespace for sentence,
+                       whitespace, _, _ in pieces[:-1]) + pieces[-1][0]
+        return text, pieces[-1][1]
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        pieces = []
+        token_count = 0
+        for sentence, whitespace, paragraph_end in iter_sentences(f):
+            for piece in split_oversized(sentence, whitespace, paragraph_end, max_tokens):
+                piece_tokens = estimate_tokens(piece[0])
+                while pieces and token_count + piece_tokens > max_tokens:
+                    # Cut at the last paragraph end if that still leaves a reasonably full chunk
+                    cut = len(pieces)
+                    running_tokens = 0
+                    for index, (_, _, ends_paragraph, tokens) in enumerate(pieces):
+                        running_tokens += tokens
+                        if ends_paragraph and running_tokens >= max_tokens // 2:
+                            cut = index + 1
+                    yield render(pieces[:cut])
+                    pieces = pieces[cut:]
+                    token_count = sum(tokens for _, _, _, tokens in pieces)
+
+                pieces.append((*piece, piece_tokens))
+                token_count += piece_tokens
+
+        if pieces:
+            yield render(pieces)
+
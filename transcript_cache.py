@@ -0,0 +1,51 @@
+import hashlib
+import os
+import threading
+from typing import Optional
+
+from flask import current_app
+
+from download_cache import sha256_file
+from file_cache import FileCache
+
+
+class TranscriptCache:
+    """Finished transcripts keyed by (audio SHA-256, transcribe prompt hash, model version), so the
+    same audio submitted again under the same prompt skips inference entirely."""
+
+    def __init__(self, root: str, max_bytes: int, model_version: str):
+        self.files = FileCache(root, max_bytes)
+        self.model_version = model_version
+
+    @property
+    def enabled(self) -> bool:
+        return self.files.enabled
+
+    def key_for(self, audio_file_path: str, prompt: str) -> str:
+        prompt_hash = hashlib.sha256((prompt or '').encode('utf-8')).hexdigest()
+        return hashlib.sha256(
+            f"""{sha256_file(audio_file_path)}:{prompt_hash}:{self.model_version}""".encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[str]:
+        return self.files.get(key)
+
+    def store(self, key: str, txt_path: str) -> Optional[str]:
+        return self.files.put_file(key, txt_path)
+
+    def link_to(self, cached_path: str, folder_path: str, file_name: str) -> str:
+        return self.files.link_to(cached_path, folder_path, file_name)
+
+
+_transcript_cache = None
+_transcript_cache_lock = threading.Lock()
+
+
+def get_transcript_cache() -> TranscriptCache:
+    global _transcript_cache
+    with _transcript_cache_lock:
+        if _transcript_cache is None:
+            _transcript_cache = TranscriptCache(
+                os.path.join(current_app.config['CACHE_FOLDER'], 'transcripts'),
+                int(os.environ.get('TRANSCRIPT_CACHE_MAX_BYTES', 2 * 1024 ** 3)),
+                os.environ.get('TRANSCRIBE_MODEL_VERSION', 'default'))
+        return _transcript_cache
@@ -1,15 +1,24 @@
 import logging
 from pathlib import Path
 import random
+import re
 import time
+import uuid
 from typing import Optional
 
 from flask import jsonify
 
 from models import SystemSetting, TranscribePrompt, Transcription
+from multipart_upload import MultipartFileBody
 import requests
 import os
 from database import db
+from status_listener import get_status_listener
+from transcript_cache import get_transcript_cache
+
+WORD = re.compile(r'\S+')
+# Timestamps and punctuation-only tokens, which differ between the two sides of an overlap
+NON_WORD_TOKEN = re.compile(r'[\[\]\d:.,\->]+')
 
 
 class TranscriptionService:
@@ -18,6 +27,17 @@ class TranscriptionService:
         self.transcribe_api_url = os.environ.get('TRANSCRIBE_API_URL')
         self.get_result_transcribe_api_url = os.environ.get(
             'GET_RESULT_TRANSCRIBE_API_URL')
+        self.upload_retries = int(
+            os.environ.get('TRANSCRIBE_UPLOAD_RETRIES', 3))
+        self.status_wait_timeout = int(
+            os.environ.get('STATUS_WAIT_TIMEOUT_SECONDS', 300))
+        # Public base URL of this backend. When set, the inference API pushes the finished
+        # transcript to /inference/transcriptions/<id>/result instead of being polled for it.
+        self.callback_base_url = os.environ.get('INFERENCE_CALLBACK_BASE_URL')
+
+    @property
+    def callback_enabled(self) -> bool:
+        return bool(self.callback_base_url)
 
     def transcribe(self, output_path: str, transcription: Transcription) -> tuple[bool, str, Optional[str]]:
         """Returns (success, output_path, error_message)"""
@@ -27,18 +47,136 @@ class TranscriptionService:
             transcript_file = self._get_transcription_result(transcription.id)
 
             db.session.refresh(transcription)
+            return self.save_result(output_path, transcription, [transcript_file])
+
+        except Exception as e:
+            return False, None, str(e)
+
+    def submit(self, transcription: Transcription) -> tuple[bool, Optional[str]]:
+        """Uploads the audio without waiting for the result. Returns (success, error_message)"""
+        try:
+            self._call_inference_api(transcription)
+            return True, None
+
+        except Exception as e:
+            return False, str(e)
+
+    def get_cached_result(self, output_path: str, transcription: Transcription) -> Optional[str]:
+        """Returns the transcript path when the same audio was already transcribed under the
+        active prompt and model, after copying it into output_path. Returns None on a miss."""
+        transcript_cache = get_transcript_cache()
+        if not transcript_cache.enabled:
+            return None
+
+        transcribe_prompt = self._get_active_transcribe_prompt()
+        cached_path = transcript_cache.lookup(transcript_cache.key_for(
+            transcription.audio_file_path, transcribe_prompt.prompt))
+        if not cached_path:
+            return None
+
+        transcription.transcribe_prompt = transcribe_prompt.prompt
+        db.session.commit()
+        logging.info(
+            f"""Transcript cache hit for transcription {transcription.id}: {cached_path}""")
+        return transcript_cache.link_to(
+            cached_path, output_path, f"""{Path(transcription.audio_file_path).stem}.txt""")
+
+    def _cache_result(self, transcription: Transcription, txt_path: str):
+        transcript_cache = get_transcript_cache()
+        if not transcript_cache.enabled:
+            return
+        try:
+            transcript_cache.store(transcript_cache.key_for(
+                transcription.audio_file_path, transcription.transcribe_prompt), txt_path)
+        except OSError as e:
+            # The cache is an optimisation; a full disk or permission problem must not fail the job
+            logging.warning(f"""Could not cache transcript {txt_path}: {e}""")
+
+    @staticmethod
+    def result_path(output_path: str, transcription: Transcription) -> str:
+        return os.path.join(output_path, f"""{Path(transcription.audio_file_path).stem}.txt""")
+
+    @staticmethod
+    def write_partial_result(txt_path: str, chunks) -> tuple[bool, str, Optional[str]]:
+        """Writes the transcript chunks next to txt_path under a unique name, so concurrent
+        deliveries never write into the same file. Returns (success, partial_path, error_message)"""
+        partial_path = f"""{txt_path}.{uuid.uuid4().hex}.part"""
+        try:
+            with open(partial_path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            return True, partial_path, None
+
+        except Exception as e:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return False, None, str(e)
+
+    def publish_result(self, transcription: Transcription, partial_path: str, txt_path: str):
+        """Moves a transcript written by write_partial_result into place"""
+        os.replace(partial_path, txt_path)
+        self._cache_result(transcription, txt_path)
+
+    def save_result(self, output_path: str, transcription: Transcription, chunks) -> tuple[bool, str, Optional[str]]:
+        """Writes the transcript chunks into output_path. Returns (success, output_path, error_message)"""
+        try:
+            txt_path = self.result_path(output_path, transcription)
+            success, partial_path, error = self.write_partial_result(txt_path, chunks)
+            if not success:
+                return False, None, error
+
+            self.publish_result(transcription, partial_path, txt_path)
+            return True, txt_path, None
+
+        except Exception as e:
+            return False, None, str(e)
+
+    @staticmethod
+    def _normalize_word(token: str) -> str:
+        if NON_WORD_TOKEN.fullmatch(token):
+            return ''
+        return re.sub(r'\W', '', token.lower())
+
+    def _drop_overlap(self, previous_text: str, text: str, max_words: int = 80, min_words: int = 3) -> str:
+        """Removes the start of text that repeats the end of previous_text. Segments share a few
+        seconds of audio, so the longest run of words both sides agree on is transcribed twice."""
+        tail = [word for word in (self._normalize_word(token)
+                                  for token in WORD.findall(previous_text[-max_words * 20:])) if word][-max_words:]
+        head = [(match, word) for match, word in ((match, self._normalize_word(match.group()))
+                                                  for match in WORD.finditer(text[:max_words * 20])) if word][:max_words]
+
+        for overlap in range(min(len(tail), len(head)), min_words - 1, -1):
+            if tail[-overlap:] == [word for _, word in head[:overlap]]:
+                return text[head[overlap - 1][0].end():].lstrip()
+        return text
+
+    def stitch_segments(self, output_path: str, transcription: Transcription, segment_txt_paths: list[str]) -> tuple[bool, str, Optional[str]]:
+        """Joins segment transcripts in order without the text repeated in their overlaps.
+        Returns (success, output_path, error_message)"""
+        try:
             output_path = os.path.join(output_path,
                                        f"""{Path(transcription.audio_file_path).stem}.txt""")
+            partial_path = output_path + '.part'
 
-            with open(output_path, 'wb') as f:
-                f.write(transcript_file)
+            previous_text = ''
+            with open(partial_path, 'w', encoding='utf-8') as output:
+                for index, segment_txt_path in enumerate(segment_txt_paths):
+                    with open(segment_txt_path, 'r', encoding='utf-8') as f:
+                        text = f.read().strip()
+                    if index:
+                        text = self._drop_overlap(previous_text, text)
+                        output.write('\n')
+                    output.write(text)
+                    previous_text = text
+            os.replace(partial_path, output_path)
 
+            self._cache_result(transcription, output_path)
             return True, output_path, None
 
         except Exception as e:
             return False, None, str(e)
 
-    def _call_inference_api(self, transcription: Transcription):
+    def _get_active_transcribe_prompt(self) -> TranscribePrompt:
         active_transcribe_prompt_setting = SystemSetting.query.filter_by(
             setting_key='active_transcribe_prompt_id').first()
         if not active_transcribe_prompt_setting:
@@ -48,6 +186,10 @@ class TranscriptionService:
             active_transcribe_prompt_setting.setting_value)
         if not transcribe_prompt:
             raise ValueError("Active transcribe prompt not found")
+        return transcribe_prompt
+
+    def _call_inference_api(self, transcription: Transcription):
+        transcribe_prompt = self._get_active_transcribe_prompt()
 
         transcription.transcribe_prompt = transcribe_prompt.prompt
         db.session.commit()
@@ -59,17 +201,14 @@ class TranscriptionService:
 
         headers = {"Authorization": f"Bearer {self.transcribe_api_key}"}
         data = {"transcription_id": str(transcription.id)}
+        if self.callback_enabled:
+            data["callback_url"] = f"""{self.callback_base_url.rstrip('/')}/inference/transcriptions/{transcription.id}/result"""
         
         content_type = self._get_content_type(transcription.audio_file_path)
 
         try:
-            with open(transcription.audio_file_path, "rb") as audio_file:
-                files = {
-                    "audio": (os.path.basename(transcription.audio_file_path), audio_file, content_type)
-                }
-
-                response = requests.post(
-                    url=self.transcribe_api_url, headers=headers, data=data, files=files)
+            response = self._upload_audio(
+                transcription.audio_file_path, content_type, headers, data)
 
             response_data = response.json()
 
@@ -85,54 +224,82 @@ class TranscriptionService:
         except Exception as e:
             raise ValueError(f"Exception occurred during API call: {str(e)}")
 
+    def _upload_audio(self, audio_file_path: str, content_type: str, headers: dict, data: dict) -> requests.Response:
+        """Streams the audio as multipart/form-data from disk, so memory use stays bounded whatever
+        the file size. Dropped connections are retried from the start of the file, because the
+        inference API has no resumable upload endpoint to continue from."""
+        attempt = 0
+        while True:
+            with MultipartFileBody(data, "audio", audio_file_path, content_type) as body:
+                try:
+                    return requests.post(url=self.transcribe_api_url, data=body,
+                                         headers={**headers, "Content-Type": body.content_type})
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= self.upload_retries:
+                        raise
+                    attempt += 1
+                    delay = random.uniform(0, min(60, 2 ** attempt))
+                    logging.warning(
+                        f"""Uploading {audio_file_path} failed ({e}), retry {attempt}/{self.upload_retries} in {delay:.1f} seconds""")
+            time.sleep(delay)
+
     def _get_transcription_result(self, transcription_id: str):
         fetch_url = self.get_result_transcribe_api_url
 
         transcription = Transcription.query.get(transcription_id)
-        while True:
-            try:
-                waiting_time = 10
+        # Keep the id and status in locals: reading an attribute after the commit below would
+        # reload the row and open a new transaction that is held for the whole wait
+        listened_id = transcription.id
+        listener = get_status_listener()
+        status_changed = listener.register(listened_id)
+        try:
+            while True:
                 try:
-                    time.sleep(waiting_time)
-                except Exception as sleep_exc:
-                    logging.warning(f"Sleep interrupted: {sleep_exc}. Waiting {waiting_time} seconds using busy-wait.")
-                    start = time.time()
-                    while time.time() - start < waiting_time:
-                        pass
-
-                db.session.refresh(transcription)
-
-                if transcription.status == 'transcribing' or transcription.status == 'waiting':
-                    print(
-                        f"""Status: Transcription {transcription_id} is still in progress""")
-                    continue
-                elif transcription.status == 'waiting_for_proofreading':
-                    response = requests.post(
-                        fetch_url,
-                        json={'transcription_id': str(transcription.id)},
-                        headers={"Authorization": "Bearer " + self.transcribe_api_key})
-
-                    if response.status_code == 200:
-                        # Check if it's a "still in progress" message
-                        if response.headers.get('Content-Type') == 'application/json':
-                            result = response.json()
-                            print(f"""Status: {result.get('message')}""")
-                            continue
-                        else:
-                            # It's a file download - transcription is complete
-                            return response.content
-                    # elif response.status_code == 404 and response.headers.get('Content-Type') == 'application/json' and response.json().get('error') == 'Transcription file not found':
-                    elif response.status_code == 404 and response.json().get('detail') == 'Transcription file not found':
+                    waiting_time = 10
+
+                    status_changed.clear()
+                    db.session.refresh(transcription)
+                    status = transcription.status
+                    # End the read transaction so the connection goes back to the pool while we wait
+                    db.session.commit()
+
+                    if status == 'transcribing' or status == 'waiting':
                         print(
-                            f"""Status: {response.json().get('error')}. Trying again in {waiting_time} seconds...""")
+                            f"""Status: Transcription {transcription_id} is still in progress""")
+                        # Woken up by the status NOTIFY; the timeout only covers a lost listener connection
+                        status_changed.wait(self.status_wait_timeout)
                         continue
+                    elif status == 'waiting_for_proofreading':
+                        response = requests.post(
+                            fetch_url,
+                            json={'transcription_id': str(listened_id)},
+                            headers={"Authorization": "Bearer " + self.transcribe_api_key})
+
+                        if response.status_code == 200:
+                            # Check if it's a "still in progress" message
+                            if response.headers.get('Content-Type') == 'application/json':
+                                result = response.json()
+                                print(f"""Status: {result.get('message')}""")
+                                time.sleep(waiting_time)
+                                continue
+                            else:
+                                # It's a file download - transcription is complete
+                                return response.content
+                        # elif response.status_code == 404 and response.headers.get('Content-Type') == 'application/json' and response.json().get('error') == 'Transcription file not found':
+                        elif response.status_code == 404 and response.json().get('detail') == 'Transcription file not found':
+                            print(
+                                f"""Status: {response.json().get('error')}. Trying again in {waiting_time} seconds...""")
+                            time.sleep(waiting_time)
+                            continue
+                        else:
+                            return f"""Error: {response.status_code} - {response.text}"""
                     else:
-                        return f"""Error: {response.status_code} - {response.text}"""
-                else:
-                    return jsonify({"error": "Getting transcription failed"}), 400
+                        return jsonify({"error": "Getting transcription failed"}), 400
 
-            except Exception as e:
-                return f"""Error occurred: {str(e)}"""
+                except Exception as e:
+                    return f"""Error occurred: {str(e)}"""
+        finally:
+            listener.unregister(listened_id, status_changed)
 
     def _get_content_type(self, file_path: str) -> str:
         """Returns the content type based on the file extension."""
@@ -0,0 +1,162 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import traceback
+from typing import Optional
+
+from app import app
+from database import db
+from job_queue import JobQueue
+from models import Job, Transcription
+from pipeline import STAGES, fail_overdue_callbacks, fail_transcription, run_stage
+from transcription_service import TranscriptionService
+from youtube_downloader import is_yt_dlp_upgraded, update_yt_dlp
+
+# Default number of concurrent jobs per stage, overridable with WORKER_<STAGE>_CONCURRENCY.
+# The transcribe stage mostly waits on the inference API, so it gets the most slots.
+DEFAULT_STAGE_CONCURRENCY = {
+    'download': 2,
+    'transcribe': 10,
+    'proofread': 3
+}
+
+
+class Worker:
+    def __init__(self, stage_concurrency: dict[str, int], poll_interval: float, heartbeat_interval: float,
+                 yt_dlp_update_interval: float = 0):
+        self.stage_concurrency = stage_concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.yt_dlp_update_interval = yt_dlp_update_interval
+        self.queue = JobQueue()
+        self.stop_event = threading.Event()
+        self.running_job_ids = set()
+        self.running_job_ids_lock = threading.Lock()
+
+    def run(self):
+        threads = [threading.Thread(target=self.run_slot, args=(stage,), name=f"""worker-{stage}-{i}""")
+                   for stage, concurrency in self.stage_concurrency.items()
+                   for i in range(concurrency)]
+        threads.append(threading.Thread(
+            target=self.run_maintenance, name='worker-maintenance', daemon=True))
+        if 'download' in self.stage_concurrency and self.yt_dlp_update_interval > 0:
+            threads.append(threading.Thread(
+                target=self.run_yt_dlp_updates, name='worker-yt-dlp-update', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        logging.info(
+            f"""Worker {self.queue.worker_id} started with slots {self.stage_concurrency}""")
+        while not self.stop_event.is_set():
+            self.stop_event.wait(1)
+
+        logging.info(
+            f"""Worker {self.queue.worker_id} stopping, waiting for running jobs to finish""")
+        for thread in threads:
+            if not thread.daemon:
+                thread.join()
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+    def run_slot(self, stage: str):
+        while not self.stop_event.is_set():
+            with app.app_context():
+                job = self.queue.claim([stage])
+                if job:
+                    self.run_job(job)
+                    continue
+            self.stop_event.wait(self.poll_interval)
+
+    def run_job(self, job: Job):
+        with self.running_job_ids_lock:
+            self.running_job_ids.add(job.id)
+        try:
+            logging.info(
+                f"""Running job {job.id} ({job.job_type}) for transcription {job.transcription_id}""")
+            run_stage(job.job_type, job.transcription_id, job.payload or {})
+            self.queue.complete(job)
+        except Exception as e:
+            logging.error(f"""Job {job.id} failed: {e}""")
+            stack_trace = traceback.format_exc()
+            db.session.rollback()
+            self.queue.fail(job, str(e))
+            if job.status == 'failed':
+                self.give_up(job, stack_trace)
+        finally:
+            with self.running_job_ids_lock:
+                self.running_job_ids.discard(job.id)
+
+    def give_up(self, job: Job, stack_trace: Optional[str] = None):
+        """The job is out of attempts, so its transcription will not get any further on its own"""
+        transcription = Transcription.query.get(job.transcription_id)
+        if transcription:
+            fail_transcription(
+                transcription, f"""Job {job.job_type} gave up after {job.attempts} attempts: {job.last_error}""", stack_trace)
+
+    def run_maintenance(self):
+        while not self.stop_event.wait(self.heartbeat_interval):
+            with app.app_context():
+                try:
+                    with self.running_job_ids_lock:
+                        job_ids = list(self.running_job_ids)
+                    self.queue.heartbeat(job_ids)
+
+                    for job in self.queue.requeue_stale():
+                        self.give_up(job)
+                    if TranscriptionService().callback_enabled:
+                        fail_overdue_callbacks()
+                    # Sum the stats delta rows appended by the database triggers
+                    db.session.execute(db.text('SELECT fold_stats()'))
+                    db.session.commit()
+
+                    if 'download' in self.stage_concurrency and is_yt_dlp_upgraded():
+                        # Upgraded by another worker sharing the installation (or by hand)
+                        logging.info(
+                            f"""Worker {self.queue.worker_id} restarting to load the updated yt-dlp""")
+                        self.stop()
+                except Exception as e:
+                    logging.error(f"""Worker maintenance failed: {e}""")
+                    db.session.rollback()
+
+    def run_yt_dlp_updates(self):
+        """Keep yt-dlp current outside the job path. pip only runs while no download of any worker
+        sharing the installation is running. A new version only takes effect in a new process, so
+        the worker stops gracefully (see run_maintenance) and relies on its supervisor to restart it."""
+        while not self.stop_event.is_set():
+            updated = update_yt_dlp()
+            if updated is None:
+                # Downloads are running; try again once they may be done
+                self.stop_event.wait(min(self.yt_dlp_update_interval, 60))
+                continue
+            if updated:
+                logging.info(
+                    f"""Worker {self.queue.worker_id} restarting to load the updated yt-dlp""")
+                self.stop()
+                return
+            self.stop_event.wait(self.yt_dlp_update_interval)
+
+
+if __name__ == "__main__":
+    # Optionally restrict this process to some stages, e.g. `python worker.py transcribe proofread`
+    stages = sys.argv[1:] or STAGES
+    unknown_stages = set(stages) - set(STAGES)
+    if unknown_stages:
+        sys.exit(f"""Unknown stages: {', '.join(sorted(unknown_stages))}. Valid stages: {', '.join(STAGES)}""")
+
+    worker = Worker(
+        stage_concurrency={
+            stage: int(os.environ.get(
+                f"""WORKER_{stage.upper()}_CONCURRENCY""", DEFAULT_STAGE_CONCURRENCY[stage]))
+            for stage in stages
+        },
+        poll_interval=float(os.environ.get('WORKER_POLL_INTERVAL', 5)),
+        heartbeat_interval=float(os.environ.get('WORKER_HEARTBEAT_INTERVAL', 30)),
+        yt_dlp_update_interval=float(
+            os.environ.get('YTDLP_UPDATE_INTERVAL_HOURS', 24)) * 3600
+    )
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    worker.run()
@@ -0,0 +1,158 @@
+from contextlib import contextmanager, suppress
+import fcntl
+import importlib.metadata
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Optional
+
+import yt_dlp
+from yt_dlp.utils import download_range_func
+
+# Version of the yt-dlp code imported by this process, as pip reports it
+LOADED_YT_DLP_VERSION = importlib.metadata.version('yt-dlp')
+# Downloads hold it shared and upgrades exclusively, across every process using this installation
+YT_DLP_LOCK_PATH = os.path.join(tempfile.gettempdir(), 'yt-dlp.lock')
+
+
+@contextmanager
+def yt_dlp_lock(exclusive: bool = False, blocking: bool = True):
+    """Yields whether the lock was taken; without blocking it gives up when the lock is busy"""
+    with open(YT_DLP_LOCK_PATH, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) |
+                        (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def is_yt_dlp_upgraded() -> bool:
+    """True when the installed yt-dlp is not the one this process imported, whoever upgraded it"""
+    return importlib.metadata.version('yt-dlp') != LOADED_YT_DLP_VERSION
+
+
+class Engine:
+    """A yt_dlp.YoutubeDL kept between downloads, with its extractors, cookie jar and HTTP
+    connections. It serves one download at a time, since YoutubeDL is not thread-safe."""
+
+    def __init__(self, cookie_path: str):
+        self.on_progress = None
+        self.ydl = yt_dlp.YoutubeDL({
+            'format': 'bestaudio/best',
+            'cookiefile': cookie_path,
+            'noplaylist': True,  # Only download the specific video, not the entire playlist
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredquality': '192'
+            }],
+            'progress_hooks': [self._progress],
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True
+        })
+
+    def _progress(self, progress: dict):
+        if self.on_progress:
+            self.on_progress(progress)
+
+
+# Idle engines by cookie path, so each download slot of the process reuses one
+_idle_engines: dict[str, list[Engine]] = {}
+_idle_engines_lock = threading.Lock()
+
+
+class YoutubeDownloader:
+    """Downloads YouTube audio with the yt_dlp library inside this process. Engines (see Engine)
+    are reused between jobs, progress arrives through hooks instead of parsed output, and the final
+    file path comes straight from the download result."""
+
+    def __init__(self, cookie_path: str, progress_log_interval: float = 10.0):
+        self.cookie_path = cookie_path
+        self.progress_log_interval = progress_log_interval
+
+    def download(self, url: str, output_template: str, start_seconds: Optional[float] = None,
+                 end_seconds: Optional[float] = None) -> tuple[bool, str, Optional[str]]:
+        """Downloads the best audio to output_template (a yt-dlp template such as
+        `<folder>/%(title)s.%(ext)s`), optionally only the given time range.
+        Returns (success, output_path, error_message)"""
+        last_logged = [0.0]
+
+        def log_progress(progress: dict):
+            if progress['status'] == 'downloading' and time.monotonic() - last_logged[0] >= self.progress_log_interval:
+                last_logged[0] = time.monotonic()
+                total_bytes = progress.get(
+                    'total_bytes') or progress.get('total_bytes_estimate')
+                percent = f"""{100 * progress.get('downloaded_bytes', 0) / total_bytes:.0f}%""" if total_bytes else f"""{progress.get('downloaded_bytes', 0)} bytes"""
+                logging.info(f"""Downloading {url}: {percent}""")
+            elif progress['status'] == 'finished':
+                logging.info(
+                    f"""Downloaded {url} to {progress.get('filename')}""")
+
+        with _idle_engines_lock:
+            idle = _idle_engines.setdefault(self.cookie_path, [])
+            engine = idle.pop() if idle else None
+        try:
+            with yt_dlp_lock():
+                if is_yt_dlp_upgraded():
+                    # Lazily imported extractors would come from the new version; the worker restarts
+                    raise Exception("yt-dlp was upgraded, waiting for the worker to restart")
+                engine = engine or Engine(self.cookie_path)
+                engine.on_progress = log_progress
+                engine.ydl.params['outtmpl']['default'] = output_template
+                if start_seconds is not None or end_seconds is not None:
+                    # Fetch only the requested window instead of the whole (possibly hours long) video
+                    engine.ydl.params['download_ranges'] = download_range_func(
+                        None, [(start_seconds or 0, end_seconds if end_seconds is not None else float('inf'))])
+                else:
+                    engine.ydl.params.pop('download_ranges', None)
+
+                info = engine.ydl.extract_info(url, download=True)
+                engine.ydl.save_cookies()
+            requested_downloads = info.get('requested_downloads') or []
+            if not requested_downloads:
+                raise Exception("yt-dlp did not download anything")
+            return True, requested_downloads[-1]['filepath'], None
+
+        except Exception as e:
+            if engine:
+                # A failed download may leave the engine in a bad state, so the next one starts afresh
+                with suppress(Exception):
+                    engine.ydl.close()
+                engine = None
+            return False, None, str(e)
+
+        finally:
+            if engine:
+                engine.on_progress = None
+                with _idle_engines_lock:
+                    _idle_engines[self.cookie_path].append(engine)
+
+
+def update_yt_dlp() -> Optional[bool]:
+    """Upgrades the installed yt-dlp package while no download of any process uses it. Returns True
+    when a newer version was installed, or None when downloads are running and it should be tried
+    again later. Processes keep the old code until they restart."""
+    with yt_dlp_lock(exclusive=True, blocking=False) as locked:
+        if not locked:
+            return None
+        result = subprocess.run([sys.executable, '-m', 'pip', 'install', '--quiet', '--upgrade', 'yt-dlp'],
+                                capture_output=True, text=True)
+    if result.returncode != 0:
+        logging.warning(f"""yt-dlp update failed: {result.stderr}""")
+        return False
+
+    installed_version = importlib.metadata.version('yt-dlp')
+    if installed_version == LOADED_YT_DLP_VERSION:
+        return False
+    logging.info(
+        f"""yt-dlp updated from {LOADED_YT_DLP_VERSION} to {installed_version}""")
+    return True